@@ -1,463 +1,387 @@
-import pandas as pd
 import streamlit as st
 import os
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
-from langchain.callbacks.base import BaseCallbackHandler
-import re 
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, time as day_time, timedelta
+from functools import partial
 from html_template_1 import logo 
-# Load environment variables
-load_dotenv()
+from response_cache import ResponseCache, prompt_fingerprint
+from call_metrics import MetricsSink, record_cache_hit, record_escalation, record_local_answer
+from chat_history import ChatHistory, summary
+from job_queue import JobQueue
+from pqrs_store import (DIRECCION_TITLES, EXPORT_FORMATS, SEARCH_COLUMNS, SEARCH_COUNT_CAP, SEARCH_PAGE_ROWS,
+                        RecordStore, SearchFilters, export)
+from pqrs_record import ENUMS
+from attachments import ATTACHMENT_TYPES, AttachmentReader, ExtractionCache, document_fields, document_text
+from rate_limiter import COMPLETION_ESTIMATE, CircuitOpenError, call_with_retries, get_rate_limiter
+# LangChain, pandas and the PQRS pipeline are imported inside the functions
+# that classify, so the first render does not wait for them
+
+# "local" calls the model from this process; "queue" hands requests to pqrs_worker.py
+BACKEND = os.getenv("PQRS_BACKEND", "local")
+
+@st.cache_resource
+def get_api_key():
+    """OpenAI API key, read once per process from the environment or .env."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return os.getenv("OPENAI_API_KEY")
+
+@st.cache_resource
+def get_response_cache():
+    """Process-wide response cache shared by every session."""
+    return ResponseCache()
+
+@st.cache_resource
+def get_metrics_sink():
+    """Process-wide sink for per-call latency and token metrics."""
+    return MetricsSink()
+
+@st.cache_resource
+def get_job_queue():
+    """Connection to the job queue shared with the worker processes."""
+    return JobQueue()
+
+@st.cache_resource
+def get_attachment_reader():
+    """Process pool that extracts text from uploaded PDFs and scans."""
+    return AttachmentReader(ExtractionCache())
+
+@st.cache_resource
+def get_record_store():
+    """Append-only store of classified PQRS, used for search and exports."""
+    return RecordStore()
+
+def get_chat_response(prompt, temperature=0.3, is_pqrs=False, history=(), document_fields=None):
+    """Generate chat response using the selected LLM.
+
+    `history` holds the chat entries before this prompt, oldest first, and
+    `document_fields` the campos known from an uploaded document.
+    """
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from chat_rendering import display_response, render_table
+    from context_window import build_context
+    from model_cascade import LARGE_MODEL, first_model, model_identity, review
+    from pqrs_pipeline import local_record, prepare_pqrs
+    from pqrs_record import OUTPUT_MODE
+    from prompt_assembly import STATIC_PROMPT
+    from prompt_retrieval import prompt_cache_identity
 
-# Get API key from environment variables
-API_KEY = os.getenv("OPENAI_API_KEY")
-if API_KEY is None:
-    st.error("Error: OPENAI_API_KEY not found in environment variables")
-    st.stop()
-
-# System prompt for PQRS processing
-SYSTEM_PROMPT = """
-You Cundi, a specialized assistant for processing PQRS (Petitions, Queries, Claims, and Requests) for CAR Colombia.
-
-## Direcciones CAR y sus Competencias:
-
-1. Dirección General (DGEN):
-• Definir políticas generales y estratégicas de la Corporación.
-
-• Orientar, dirigir y controlar la gestión integral de la Corporación.
-
-• Representar legalmente a la Corporación.
-
-• Gestionar la cooperación internacional y las alianzas estratégicas.
-
-• Asegurar la coordinación interinstitucional para el cumplimiento de objetivos ambientales.
-
-2. Dirección de Laboratorio e Innovación Ambiental (DLIA):
-• Análisis y evaluación científica y tecnológica en laboratorios ambientales bajo Normas ISO 17025.
-
-• Formulación y modelamiento financiero de proyectos I+D+I ambientales.
-
-• Coordinación y participación en fondos de financiamiento para proyectos de innovación ambiental.
-
-• Implementación de estrategias para difusión del conocimiento generado por investigación y análisis ambientales.
-
-• Estudios de tendencias del mercado en servicios de laboratorio e innovación ambiental.
-
-3. Dirección de Cultura Ambiental y Servicio al Ciudadano (DCASC):
-• Desarrollo de políticas en atención ciudadana, educación ambiental y participación social.
-
-• Asesoría a entidades territoriales en educación ambiental y participación ciudadana.
-
-• Impulsar participación comunitaria en programas ambientales.
-
-• Implementación de mecanismos de participación ciudadana en la gestión ambiental.
-
-• Difusión de proyectos comunitarios en educación y cultura ambiental.
-
-4. Oficina de las Tecnologías de la Información y las Comunicaciones (OTIC):
-• Asesoría estratégica en TIC a la Dirección General y dependencias.
-
-• Planeación integral del uso de TIC en la gestión institucional.
-
-• Liderazgo en la implementación de sistemas de información para gobierno en línea.
-
-• Soporte técnico en adquisición y mantenimiento de tecnología y bases de datos.
-
-• Evaluación continua de sistemas informáticos para mejora tecnológica y organizacional.
-
-5. Oficina Asesora de Comunicaciones (OAC):
-• Definir y asesorar políticas de comunicación interna y externa.
-
-• Diseñar estrategias para manejo de medios e imagen institucional.
-
-• Coordinar y desarrollar eventos protocolarios y comunicacionales.
-
-• Administrar registros de prensa y materiales audiovisuales institucionales.
-
-• Desarrollar y mantener actualizado el manual de imagen corporativa
-
-6. Oficina Asesora de Planeación (OAP):
-• Formular, asesorar y evaluar políticas y estrategias para la planeación integral de la Corporación.
-
-• Coordinar la elaboración y seguimiento al Plan de Acción y Planes Estratégicos Institucionales.
-
-• Elaborar estudios e investigaciones sobre planeación estratégica institucional.
-
-• Apoyar técnicamente procesos de formulación, evaluación y ajuste del presupuesto.
-
-• Realizar seguimiento sistemático a la ejecución física y financiera de los planes institucionales.
-
-7. Dirección de Recursos Naturales (DRN):
-• Dirigir y asegurar la planeación para el adecuado cumplimiento de las funciones sobre recursos naturales.
-
-• Controlar el talento humano asignado para la gestión ambiental y de recursos naturales.
-
-• Representar a la Corporación ante comités y juntas ambientales.
-
-• Establecer y perfeccionar el sistema de control interno relacionado con recursos naturales.
-
-8. Dirección de Gestión del Ordenamiento Ambiental Territorial (DGOAT):
-• Elaborar modelos y estrategias para el desarrollo urbano sostenible.
-
-• Evaluar técnicamente planes de ordenamiento territorial de los municipios.
-
-• Asistir técnicamente a municipios en planificación territorial con enfoque ambiental.
-
-• Realizar seguimiento ambiental de planes parciales y proyectos municipales.
-
-• Coordinar asistencia técnica a los Comités Ambientales Municipales.
-
-9. Dirección Jurídica (DJUR):
-• Gestionar trámites legales y jurídicos institucionales.
-
-• Proyectar actos administrativos relacionados con licencias y sanciones ambientales.
-
-• Responder solicitudes jurídicas externas y peticiones ambientales.
-
-• Apoyar a las direcciones regionales en trámites ambientales jurídicos.
-
-• Elaborar informes legales requeridos por otras entidades y autoridades.
-
-10. Dirección de Evaluación, Seguimiento y Control Ambiental (DESCA):
-• Coordinar la formulación y aplicación de directrices técnicas ambientales para los trámites administrativos.
-
-• Supervisar técnicamente expedientes ambientales gestionados por las direcciones regionales.
-
-• Coordinar el acompañamiento técnico para procesos de evaluación y seguimiento ambiental.
-
-• Desarrollar instrumentos económicos para evaluación y seguimiento ambiental.
-
-• Liderar proyectos específicos de protección y recuperación ambiental.
-
-Ahora procederé a buscar las responsabilidades de las direcciones restantes (DIA, FIAB, OTH, DAF, SGEN, OCIN, SC y todas las direcciones regionales).
-
-Continuando con la estructura solicitada, aquí tienes más direcciones claramente especificadas según el documento oficial:
-
-11. Dirección de Infraestructura Ambiental (DIA):
-• Formular, ejecutar, controlar y evaluar políticas, planes y proyectos relacionados con infraestructura ambiental y saneamiento básico.
-
-• Supervisar contratos y convenios relacionados con la infraestructura y saneamiento básico.
-
-• Coordinar con entidades territoriales la ejecución de obras ambientales necesarias para la jurisdicción.
-
-• Evaluar técnicamente proyectos relacionados con saneamiento básico e infraestructura ambiental.
-
-• Emitir conceptos técnicos y participar activamente en reuniones relacionadas con infraestructura ambiental.
-
-12. Fondo de Inversiones Ambientales de la Cuenca del Río Bogotá (FIAB):
-• Apoyar la definición y evaluación técnica de planes y proyectos ambientales específicos para la cuenca del río Bogotá.
-
-• Coordinar la elaboración técnica de procesos contractuales y proyectos ambientales relacionados con la cuenca.
-
-• Supervisar y controlar contratos relacionados con proyectos de inversión ambiental en la cuenca.
-
-• Coordinar programas y proyectos de infraestructura sostenible y ambiental.
-
-• Gestionar denuncias y quejas ambientales relacionadas con la cuenca del Río Bogotá.
-
-13. Oficina de Talento Humano (OTH):
-• Gestionar procesos de selección y vinculación de personal voluntario y practicante.
-
-• Apoyar procesos de negociación y solución de conflictos laborales.
-
-• Proyectar actos administrativos relacionados con acuerdos laborales sindicales.
-
-• Manejar temas relacionados con aportes parafiscales y seguridad social.
-
-• Operar sistemas de información del área y elaborar informes de gestión del talento humano.
-
-14. Dirección Administrativa y Financiera (DAF):
-• Formular e implementar políticas administrativas, económicas y financieras.
-
-• Realizar seguimiento integral a la contratación pública y ejecución presupuestal.
-
-• Supervisar la gestión contable, financiera y la programación de recursos provenientes del presupuesto nacional.
-
-• Analizar portafolio de inversiones institucionales y flujo de caja.
-
-• Dirigir procesos internos relacionados con calidad, gestión contractual y financiera.
-
-15. Secretaría General (SGEN):
-• Liderar y controlar procesos de contratación administrativa de acuerdo con leyes vigentes.
-
-• Asesorar jurídicamente en materia de contratación pública a las diferentes dependencias.
-
-• Administrar procesos relacionados con adquisición, enajenación y negocios jurídicos sobre predios institucionales.
-
-• Coordinar funciones administrativas del Consejo Directivo y Asamblea Corporativa.
-
-• Hacer seguimiento y control riguroso al cumplimiento de contratos y convenios suscrito
-
-16. Oficina de Control Interno (OCIN):
-• Verificación y evaluación del sistema de control interno de la Corporación.
-
-• Supervisión del cumplimiento normativo y procedimental interno.
-
-• Evaluación periódica de riesgos administrativos, financieros y operacionales.
-
-• Auditorías internas para asegurar eficiencia y transparencia.
-
-• Reporte directo a la Dirección General sobre hallazgos y recomendaciones.
-
-17. Dependencias Sede Central (SC):
-• Coordinar la logística operativa y administrativa en la sede central.
-
-• Garantizar la comunicación efectiva entre todas las áreas administrativas y técnicas.
-
-• Supervisar procesos internos de gestión documental y archivo.
-
-• Apoyar en procesos transversales relacionados con talento humano y servicios generales.
-
-• Asegurar el cumplimiento de políticas administrativas institucionales.
-
-18. Direcciones Regionales (DR):
-• Implementar y supervisar localmente políticas ambientales definidas por la sede central.
-
-• Tramitar permisos, concesiones y licencias ambientales dentro de su jurisdicción regional.
-
-• Monitorear, evaluar y controlar el cumplimiento normativo ambiental en la región.
-
-• Atender denuncias, quejas y solicitudes ambientales de ciudadanos locales.
-
-• Desarrollar y coordinar actividades de educación y sensibilización ambiental en la región.
-
-Cada Dirección Regional adicionalmente puede especializarse en aspectos particulares según su territorio específico:
-
-19. Dirección Regional Almeidas y Guatavita (DRAG):
-• Monitoreo y conservación de ecosistemas estratégicos (páramos, humedales).
-
-• Protección de recursos hídricos específicos del territorio regional.
-
-20. Dirección Regional Alto Magdalena (DRAM):
-• Gestión integral del recurso hídrico en la cuenca del Alto Magdalena.
-
-• Programas de reforestación y recuperación de suelos degradados.
-
-21. Dirección Regional Bogotá la Calera (DRBC):
-• Control ambiental sobre urbanización y expansión urbana.
-
-• Protección de ecosistemas cercanos a la capital, como bosques y quebradas.
-
-22. Dirección Regional Chiquinquirá (DRCH):
-• Protección y gestión sostenible de ecosistemas rurales y agrícolas.
-
-• Manejo ambiental de actividades mineras y artesanales.
-
-23. Dirección Regional Gualivá (DRGU):
-• Monitoreo de cuencas hidrográficas menores y su recuperación ambiental.
-
-• Educación ambiental y participación comunitaria regional.
-
-24. Dirección Regional Magdalena Centro (DRMC):
-• Gestión ambiental integral de zonas de actividad industrial y minera.
-
-• Monitoreo y control de contaminación hídrica.
-
-25. Dirección Regional Rio Negro (DRRN):
-• Monitoreo ambiental de áreas forestales y conservación de biodiversidad.
-
-• Implementación de programas regionales contra la deforestación.
-
-26. Dirección Regional Sabana Occidente (DRSO):
-• Control ambiental a actividades industriales y agropecuarias.
-
-• Monitoreo de calidad de aire y agua en la región.
-
-27. Dirección Regional Soacha (DRSOA):
-• Gestión ambiental en zonas urbanas vulnerables.
-
-• Programas ambientales específicos para comunidades periurbanas.
-
-28. Dirección Regional Sumapaz (DRSU):
-• Conservación integral del páramo y cuenca hídrica del Sumapaz.
-
-• Educación ambiental con énfasis en la preservación del recurso hídrico.
-
-29. Dirección Regional Tequendama (DRTE):
-• Control ambiental turístico y manejo sostenible del recurso paisajístico.
-
-• Protección de recursos hídricos regionales.
-
-30. Dirección Regional Ubaté (DRUB):
-• Gestión y monitoreo ambiental en actividades agropecuarias intensivas.
-
-Conservación de humedales y ecosistemas acuáticos.
-
-When receiving a PQRS request (prefix 'PQRS:'), analyze the content and respond with a markdown table using this exact format:
-
-| Campo                        | Valor                                                                                         |
-|------------------------------|-----------------------------------------------------------------------------------------------|
-| Nombre                       | [Full Name]                                                                                  |
-| Cédula                       | [ID Number]                                                                                  |
-| Teléfono                     | [Phone Number]                                                                              
-| Correo                       | [Email]                                                                                      
-| Municipio                    | [Location]                                                                                   
-| Asunto                       | [PQRS Description]                                                                          
-| Dirección Asignada           | [Relevant CAR Direction based on the subject]                                                 |
-| Justificación                | [Brief explanation of why this direction was selected]                                         |
-| Tipo de Respuesta            | [NO APLICA, INTERPONER RECURSO, RESPUESTA A OFICIO (citación, notificación, invitación, etc.)]                                                                           |
-| Tipo Remitente               | [Juridica, Natural, Anonima]                                                                  |
-| Fecha                        | [Date identified in the text]                                                                  |
-| Proceso especial             | [No Aplica, Thomas van der Hammen, Río Bogotá, Cerros Orientales, Auditorías - Entes de Control, DRMI Fúquene, Reporte de licencias de parcelación y construcción] |
-| Tipo de Tramite              | [Acciones Constitucionales, Certificación Ambiental para propuesta de Concesión Minera, Curadurías, DP Congreso de la República Ley 5/92 10 días, DP Congreso de la República Ley 5/92 48h, DP Interes Particular Autorizaciones ,  DP Congreso de la República Ley 5/92 5 días, Dp de Consulta, DP en Cumplimiento de Deber Legal ,Dp de interés Particular (Solicitud Certificaciones Cto, pasantias laborales) , Dp, de oficio Permisivos, Dp Defensoria del Pueblo Ley 5/92 5 días, Dp En cumplimiento de un deber legal (Permisos), DP PERMISIVOS, Dp Queja Ambiental (Afectación ambiental), Dp Queja por atención al servicio), DP Queja por Olores Ofensivos, DP Reclamo (Contra Funciones/Funcionarios CAR), DP Recursos - Acuerdos 10 y 09, DP Recursos(15 Días), DP Recursos (60 Días), DP Recursos Exenciones Cobro Coactivo, DP Solicitud de Copias, DP Solicitud de Exepciones de Cobro Coactivo - Estatuto Tributario, DP Solicitud de Exepciones y Reclamaciones Facturación, Documento Informacion Respuesta, Documento Remicion, Procesos Contractuales , Documento Remision Informacion, Documentos para información Institucional - Remisión Información, Ingreso por Redes Sociales, Ingreso PQR, Memorando Interno, Observaciones y/o recomendaciones POMCAS Decreto 2076-2015, Radicación Pago Copias, Radicación Trámites de Oficio o inicidados por CAR, Trámite Res 511 de 2012 Reserva Forestal Cuenca Alta Río Bogotá, Trámites Autodeclaración de Vertimientos Res. 1792 de 2013] |
-| Departamento                  | [Department Name]                                                                              |
-| Vereda                       | [If applicable, name of the vereda]                                                          |
-| Predio                       | [If the property(predio) name is provided, include it]                                                |
-| Medio de documento           | Oficio                                                                                        
-| Numero de Folios             | 1                                                                                            
-| Anexos                        | VACIO                                                                                         
-| Observaciones                | [Summary of what the person is asking in the PQRS]                                            |
-| Copia a                      | VACIO                                                                                         
-| Quien Entrega                | [Empresa de mensajería, Persona Natural]                                                       |
-| Atención Preferencial        | [Aulto Mayor, Desplazado (Víctimas de violencia/conflicto armado), Discapacidad física, Discapacidad Mental, Discapacidad Sensorial, Grupos Étnicos Minoritarios, Mujer Embarazada, Niños o Adolescentes, Periodista, Veterano de la Fuerza Pública] |
+    try:
+        # PQRS classifications are cached and may use the slimmed retrieval prompt
+        cache = get_response_cache() if is_pqrs else None
+        fingerprint = prompt_fingerprint(prompt_cache_identity(), model_identity(), temperature, document_fields)
+        if cache is not None:
+            # Exact repeats of a PQRS are answered without calling the model
+            lookup_start = time.perf_counter()
+            cached = cache.get(prompt, fingerprint)
+            if cached is not None:
+                record_cache_hit(get_metrics_sink(), "app", model_identity(), time.perf_counter() - lookup_start)
+                display_response(cached, st)
+                return cached
+            duplicate = cache.find_near_duplicate(prompt)
+            if duplicate is not None:
+                radicado, similarity, created_at = duplicate
+                stored = datetime.fromtimestamp(created_at).strftime("%Y-%m-%d %H:%M")
+                if radicado:
+                    st.info(f"Probable duplicado del radicado {radicado}, clasificado el {stored} "
+                            f"(similitud {similarity:.0%})")
+                else:
+                    st.info(f"Probable duplicado de una PQRS clasificada el {stored} (similitud {similarity:.0%})")
 
+        if BACKEND == "queue":
+            return get_queued_response(prompt, temperature, is_pqrs, history, document_fields)
 
-Rules for direction assignment:
-1. Carefully analyze the subject matter of the PQRS
-2. Select the most appropriate direction based on their competencies
-3. Provide a brief justification for the assignment
-4. If the subject involves multiple directions, select the primary one most relevant to the main issue 
-5. The answer should ALWAYS be in Spanish 
-5. If the request doesn't explicitly mention CAR, still process and classify it.
-6. Regardless of the request size, always respond with a table. 
-7. You can select multiple options for the "Tipo de Tramite" field 
-8. If the PQRS has a specific location (municipality, vereda, predio), cross it with the local directions to determine the appropriate one.
+        # Routing and pattern-matchable campos are resolved locally, not by the model
+        local_start = time.perf_counter()
+        prepared = prepare_pqrs(prompt, document_fields) if is_pqrs else None
 
-For regular conversation (no 'PQRS:' prefix), respond naturally as a helpful assistant with knowledge about CAR's structure and functions.
-"""
+        # Routine PQRS the pre-classifier is confident about skip the model
+        record = local_record(prepared) if prepared else None
+        if record is not None:
+            record_local_answer(get_metrics_sink(), "app", time.perf_counter() - local_start)
+            render_table(record.to_rows(), "", st)
+            st.caption(record.justificacion)
+            return record.to_markdown()
 
-class StreamHandler(BaseCallbackHandler):
-    def __init__(self, container):
-        self.container = container
-        self.text = ""
-        
-    def on_llm_new_token(self, token: str, **kwargs) -> None:
-        self.text += token
-        # Process and display the response
-        display_response(self.text, self.container)
-
-def extract_table_data(markdown_text):
-    """Extract table data from markdown and convert to DataFrame."""
-    try:
-        # Find table in text using regex
-        table_pattern = r'\|.*\|'
-        table_rows = re.findall(table_pattern, markdown_text)
-        
-        if not table_rows:
-            return None, None
-            
-        # Process table rows
-        headers = ['Campo', 'Valor']  # Fixed headers for consistent display
-        data = []
-        
-        # Skip separator row (|---|---|)
-        for row in table_rows[2:]:
-            values = [col.strip() for col in row.split('|')[1:-1]]
-            if len(values) == 2:  # Ensure we have both campo and valor
-                data.append(values)
-        
-        # Create DataFrame
-        df = pd.DataFrame(data, columns=headers)
-        
-        # Extract non-table text
-        pre_table = markdown_text.split('|')[0].strip()
-        post_table = markdown_text.split('|')[-1].strip()
-        other_text = f"{pre_table}\n\n{post_table}".strip()
-        
-        return df, other_text
-    except Exception as e:
-        st.error(f"Error processing table: {str(e)}")
-        return None, None
-
-def display_response(response_text, container):
-    """Display the response using Streamlit components."""
-    if '|' in response_text:  # Check if response contains a table
-        df, other_text = extract_table_data(response_text)
-        if df is not None:
-            # Display any text before the table
-            if other_text:
-                container.markdown(other_text)
-            
-            # Display the DataFrame with enhanced styling
-            container.markdown("### Información PQRS")
-            
-            # Apply custom styling to the DataFrame
-            styled_df = df.style.set_properties(**{
-                'background-color': '#f0f2f6',
-                'color': '#1f1f1f',
-                'border': '2px solid #add8e6'
-            })
-            
-            # Display using st.dataframe with enhanced configuration
-            container.dataframe(
-                styled_df,
-                use_container_width=True,
-                hide_index=True,
-                column_config={
-                    "Campo": st.column_config.TextColumn(
-                        "Campo",
-                        help="Categoría de la información",
-                        width="medium",
-                    ),
-                    "Valor": st.column_config.TextColumn(
-                        "Valor",
-                        help="Información proporcionada",
-                        width="large",
-                    )
-                }
-            )
-        else:
-            container.markdown(response_text)
-    else:
-        container.markdown(response_text)
+        # Structured mode returns a typed record instead of a markdown table
+        structured = prepared is not None and OUTPUT_MODE == "json"
 
-def get_chat_response(prompt, temperature=0.3):
-    """Generate chat response using the selected LLM."""
-    try:
         response_placeholder = st.empty()
-        stream_handler = StreamHandler(response_placeholder)
-        
-        # Initialize chat model with API key from environment
-       
-        chat_model = ChatOpenAI(
-            model="gpt-4o",
-            temperature= temperature,
-            api_key=API_KEY,
-            streaming=True,
-            callbacks=[stream_handler]
-        )
         
+        # Previous turns go before the prompt, trimmed to the context token budget
         messages = [
-            SystemMessage(content=SYSTEM_PROMPT),
-            HumanMessage(content=prompt)
+            SystemMessage(content=prepared.system_prompt if prepared else STATIC_PROMPT),
+            *build_context(history, is_pqrs),
+            HumanMessage(content=prepared.human_message if prepared else prompt)
         ]
         
-        # Add context from previous messages
-        if "messages" in st.session_state:
-            for msg in st.session_state.messages[-3:]:
-                if msg["role"] == "user":
-                    messages.append(HumanMessage(content=msg["content"]))
-                else:
-                    messages.append(SystemMessage(content=msg["content"]))
-        
-        response = chat_model.invoke(messages)
-        return stream_handler.text
+        # Plain chat and simple PQRS start on the small model
+        model = first_model(prepared)
+        text = stream_answer(model, messages, temperature, structured, is_pqrs, response_placeholder)
+        response_text, record = text, None
+        if prepared is not None:
+            # History, cache and export keep working on the markdown rendering
+            response_text, record, reason = review(text, prepared, structured)
+            if reason is not None and model != LARGE_MODEL:
+                # Incomplete, invalid or doubtful: the large model answers again
+                record_escalation(get_metrics_sink(), "app", model, reason)
+                st.caption(f"Respuesta revisada con {LARGE_MODEL}: {reason}")
+                text = stream_answer(LARGE_MODEL, messages, temperature, structured, is_pqrs, response_placeholder)
+                response_text, record, reason = review(text, prepared, structured)
+            if structured and record is None:
+                raise ValueError(f"Respuesta del modelo no válida: {reason}")
+        if record is not None:
+            render_table(record.to_rows(), "", response_placeholder.container())
+            for error in record.validate():
+                st.warning(error)
+        elif response_text != text:
+            display_response(response_text, response_placeholder.container())
+        if cache is not None:
+            cache.put(prompt, fingerprint, response_text)
+        return response_text
         
+    except CircuitOpenError as e:
+        st.warning(f"El servicio del modelo no está respondiendo. Intente de nuevo en {e.retry_in:.0f} s.")
+        return "Lo siento, el servicio no está disponible en este momento."
     except Exception as e:
         st.error(f"Error generating response: {str(e)}")
         return "Lo siento, ocurrió un error al procesar su solicitud."
 
 
+def stream_answer(model, messages, temperature, structured, is_pqrs, placeholder):
+    """Stream one model's answer into `placeholder`; return its raw text."""
+    from chat_rendering import RecordStreamHandler, StreamHandler
+    from context_window import message_tokens
+    from llm_client import get_chat_model
+    from metrics_callback import MetricsCallback
+    from model_cascade import tier
+    from pqrs_record import bind_structured
+
+    # Shared chat model with pooled connections; callbacks are per call
+    chat_model = get_chat_model(model, temperature, api_key=get_api_key())
+    if structured:
+        chat_model = bind_structured(chat_model)
+    handlers = []
+
+    def call(attempt):
+        # A fresh handler per attempt, so a retry does not append to a failed stream
+        placeholder.empty()
+        handler = RecordStreamHandler(placeholder) if structured else StreamHandler(placeholder)
+        handlers.append(handler)
+        metrics_handler = MetricsCallback(get_metrics_sink(), "app", model, int(attempt > 0), pqrs=is_pqrs,
+                                          tier=tier(model))
+        chat_model.invoke(messages, config={"callbacks": [handler, metrics_handler]})
+        return handler
+
+    def show_queue(position, eta, attempt):
+        retry = f"Reintento {attempt}. " if attempt else ""
+        placeholder.info(f"{retry}En cola para el modelo: posición {position}, unos {eta:.0f} s")
+
+    # Every session of the process queues behind the same rate limit; only
+    # calls that failed before their first token are retried
+    return call_with_retries(
+        call, message_tokens(messages) + COMPLETION_ESTIMATE, on_wait=show_queue,
+        can_retry=lambda exc: not handlers[-1].text,
+    ).text
+
+
+def get_queued_response(prompt, temperature, is_pqrs, history, document_fields=None):
+    """Submit the request to the worker service and stream its tokens back."""
+    from chat_rendering import RecordStreamHandler, StreamHandler, display_response
+    from context_window import build_context, to_pairs
+    from pqrs_record import OUTPUT_MODE
+
+    queue = get_job_queue()
+    context = to_pairs(build_context(history, is_pqrs))
+    job_id = queue.submit("pqrs" if is_pqrs else "chat", prompt, context, temperature, document_fields)
+
+    structured = is_pqrs and OUTPUT_MODE == "json"
+    response_placeholder = st.empty()
+    handlers = []
+
+    def start_answer(notice=None):
+        # An escalated answer replaces the small model's, as in get_chat_response()
+        if notice:
+            st.caption(notice)
+        response_placeholder.empty()
+        handlers.append(RecordStreamHandler(response_placeholder) if structured
+                        else StreamHandler(response_placeholder))
+
+    start_answer()
+    for token in queue.stream(job_id, on_restart=start_answer):
+        handlers[-1].on_llm_new_token(token)
+    stream_handler = handlers[-1]
+    if not structured:
+        stream_handler.on_llm_end(None)
+
+    # The worker already applied routing and prefill and filled the cache
+    response_text = queue.result(job_id)
+    if response_text != stream_handler.text:
+        display_response(response_text, response_placeholder.container())
+    return response_text
+
+
+def export_file(fmt, session, since, until):
+    """Stream the export to a temporary file; runs only when a download button is clicked."""
+    f = tempfile.TemporaryFile()
+    export(get_record_store(), fmt, f, session, since, until)
+    f.seek(0)
+    return f
+
+
+def render_export_panel(container):
+    """Download buttons for the classified PQRS of this session or of a date range."""
+    with container:
+        st.markdown("**Descargar PQRS clasificadas**")
+        scope = st.radio("Registros", ["Esta sesión", "Rango de fechas"], horizontal=True)
+        session, since, until = None, None, None
+        if scope == "Esta sesión":
+            session = st.session_state.session_id
+        else:
+            dates = st.date_input("Fechas", value=(date.today() - timedelta(days=30), date.today()))
+            if len(dates) < 2:
+                return
+            since = datetime.combine(dates[0], day_time.min).timestamp()
+            until = datetime.combine(dates[1] + timedelta(days=1), day_time.min).timestamp()
+        count = get_record_store().count(session, since, until)
+        for fmt, (_, mime) in EXPORT_FORMATS.items():
+            st.download_button(
+                f"{fmt.upper()} ({count} PQRS)",
+                data=partial(export_file, fmt, session, since, until),
+                file_name=f"pqrs_{date.today():%Y%m%d}.{fmt}",
+                mime=mime,
+                on_click="ignore",
+                disabled=not count,
+            )
+
+
+def run_search():
+    """Callback of the search form: count the matches and load their first page."""
+    state = st.session_state
+    fechas = state.search_fechas
+    filters = SearchFilters(
+        state.search_texto, state.search_cedula, state.search_municipio, state.search_direccion,
+        state.search_tramite, fechas[0] if fechas else None, fechas[1] if len(fechas) == 2 else None,
+    )
+    rows = get_record_store().search(filters)
+    state.search = {
+        "filters": filters,
+        "count": get_record_store().search_count(filters),
+        "rows": rows,
+        "more": len(rows) == SEARCH_PAGE_ROWS,
+    }
+
+
+def load_more_results():
+    """Callback of "Cargar más": append the next page, starting below the last id shown."""
+    search = st.session_state.search
+    rows = get_record_store().search(search["filters"], search["rows"][-1][0])
+    search["rows"] += rows
+    search["more"] = len(rows) == SEARCH_PAGE_ROWS
+
+
+def render_search_panel():
+    """Search the PQRS classified in every session; results load a page at a time."""
+    with st.expander("Buscar PQRS clasificadas"):
+        with st.form("search_form", border=False):
+            st.text_input("Texto", key="search_texto", placeholder="Palabras del PQRS, el nombre o el asunto")
+            left, right = st.columns(2)
+            left.text_input("Cédula", key="search_cedula")
+            right.text_input("Municipio", key="search_municipio")
+            left.selectbox("Dirección Asignada", [None, *DIRECCION_TITLES], key="search_direccion",
+                           format_func=lambda code: "Todas" if code is None else f"{code} - {DIRECCION_TITLES[code]}")
+            right.selectbox("Tipo de Tramite", [None, *ENUMS["tipo_tramite"]], key="search_tramite",
+                            format_func=lambda option: "Todos" if option is None else option)
+            st.date_input("Fecha del PQRS", value=(), key="search_fechas")
+            st.form_submit_button("Buscar", on_click=run_search)
+        # Nothing is queried until the form is submitted
+        search = st.session_state.get("search")
+        if search is None:
+            return
+        count = search["count"]
+        st.caption(f"{'Más de ' if count >= SEARCH_COUNT_CAP else ''}{count} PQRS, {len(search['rows'])} cargadas")
+        if search["rows"]:
+            st.dataframe([dict(zip(SEARCH_COLUMNS, row)) for row in search["rows"]], hide_index=True)
+        if search["more"]:
+            st.button("Cargar más", on_click=load_more_results)
+
+
+def remember_response(response, pqrs_text=None):
+    """Add the answer to the history and, for a classified PQRS, to the record store."""
+    st.session_state.messages.append("assistant", response)
+    entry = st.session_state.messages.recent(1)[0]
+    if pqrs_text is not None and entry.rows:
+        # Written by the store's background thread, with the rows the history already parsed
+        get_record_store().append(dict(entry.rows), pqrs_text, st.session_state.session_id)
+
+
+def classify_uploads(uploads):
+    """Extract the oficio's text page by page and classify it as a PQRS."""
+    from context_window import CONTEXT_MAX_MESSAGES
+
+    reader = get_attachment_reader()
+    documents = []
+    for upload in uploads:
+        # An encrypted, truncated or unreadable file is skipped, not the whole turn
+        try:
+            documents.append(reader.open(upload.name, upload.getvalue()))
+        except Exception:
+            st.warning(f"No se pudo leer {upload.name}")
+    if not documents:
+        return
+    fields = document_fields(documents)
+    previous = st.session_state.messages.recent(CONTEXT_MAX_MESSAGES)
+    label = f"PQRS adjunta: {', '.join(d.name for d in documents)} ({fields['Numero de Folios']} folios)"
+    st.session_state.messages.append("user", label)
+    with st.chat_message("User", avatar="👨‍💼"):
+        st.markdown(label)
+
+    with st.chat_message("ai", avatar="🌳"):
+        oficio = documents[0]
+        pages = []
+        with st.status(f"Leyendo {oficio.name}…") as status:
+            # Pages arrive in order as the pool finishes them
+            try:
+                for page in reader.pages(oficio):
+                    pages.append(page)
+                    status.update(label=f"Leyendo {oficio.name}: página {page.page} de {oficio.page_count}"
+                                        + (" (OCR)" if page.ocr else ""))
+            except Exception:
+                # Classify the pages read before the damaged one
+                st.warning(f"No se pudo leer {oficio.name}")
+            status.update(label=f"{oficio.name}: {len(pages)} de {oficio.page_count} páginas leídas",
+                          state="complete")
+        text = document_text(pages)
+        if not text:
+            response = "No se pudo extraer texto del documento. Si es un escaneo, se necesita OCR (Tesseract)."
+            st.warning(response)
+            st.session_state.messages.append("assistant", response)
+            return
+        response = get_chat_response(text, is_pqrs=True, history=previous, document_fields=fields)
+        remember_response(response, text)
+
+
 def main():
     st.set_page_config(page_title="CARresponde", layout="centered")
+    if get_api_key() is None:
+        st.error("Error: OPENAI_API_KEY not found in environment variables")
+        st.stop()
     st.write(logo, unsafe_allow_html=True)
     st.title("CAResponde", anchor=False)
     st.markdown("**Soy CAResponde, tú asistente virtual para la CAR. Entiende tus Peticiones, Quejas, Reclamos y Solicitudes (PQRS)**")
+    # Chat input (pinned to the bottom of the page), shown before any heavy work
+    prompt = st.chat_input("Escribe tu mensaje acá ... )")
     
     # Initialize session state
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = ChatHistory()
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    if "upload_round" not in st.session_state:
+        st.session_state.upload_round = 0
 
     # Add a button to clear chat history
     # Add a button to clear chat history
@@ -473,22 +397,73 @@ Esta herramienta está diseñada para ayudarte a clasificar y gestionar eficient
                 """)
         
         if st.button("Borra Historial del Chat"):
-            st.session_state.messages = []
-            st.experimental_rerun()            
-
-    # Display chat history
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            if message["role"] == "assistant" and '|' in message["content"]:
-                # Process and display stored PQRS responses using DataFrame
-                display_response(message["content"], st)
-            else:
-                st.markdown(message["content"])
+            st.session_state.messages.clear()
+            st.rerun()
 
-    # Chat input
-    if prompt := st.chat_input("Escribe tu mensaje acá ... )"):
+        cache_metrics = get_response_cache().metrics()
+        st.caption(
+            f"Caché de respuestas: {cache_metrics['hits']} aciertos, "
+            f"{cache_metrics['misses']} fallos, {cache_metrics['entries']} PQRS guardadas"
+        )
+        percentiles = get_metrics_sink().percentiles()
+        for name, label in (("latency", "Latencia"), ("ttft", "Primer token")):
+            if percentiles[name][0.5] is not None:
+                st.caption(f"{label}: p50 {percentiles[name][0.5]:.2f} s, p95 {percentiles[name][0.95]:.2f} s")
+        limits = get_rate_limiter().status()
+        if limits["queued"] or limits["paused_for"] or limits["breaker"] != "closed":
+            breaker = {"closed": "", "open": ", circuito abierto", "half_open": ", probando el servicio"}
+            st.caption(f"Proveedor: {limits['queued']} solicitudes en cola, ritmo {limits['pace']:.0%}"
+                       f"{breaker[limits['breaker']]}")
+        tiers = get_metrics_sink().tier_percentiles()
+        if "small" in tiers:
+            escalation_rate = get_metrics_sink().escalation_rate()
+            st.caption(
+                f"Modelo pequeño: p50 {tiers['small'][0.5]:.2f} s"
+                + (f"; grande: p50 {tiers['large'][0.5]:.2f} s" if "large" in tiers else "")
+                + (f"; escalado {escalation_rate:.0%}" if escalation_rate is not None else "")
+            )
+        cached_share = get_metrics_sink().cached_share()
+        if cached_share is not None:
+            st.caption(f"Tokens de prompt en caché del proveedor: {cached_share:.0%}")
+        # Filled at the end of the run, so it counts the PQRS answered in it
+        export_container = st.container()
+
+    render_search_panel()
+
+    # Display chat history: older messages collapsed, the last few in full
+    history = st.session_state.messages
+    collapsed, rendered = history.split()
+    if history.dropped:
+        st.caption(f"{history.dropped} mensajes anteriores fuera del historial")
+    for message in collapsed:
+        with st.expander(f"{'Tú' if message.role == 'user' else 'CAResponde'}: {summary(message)}"):
+            st.markdown(message.content)
+    for message in rendered:
+        with st.chat_message(message.role):
+            if message.rows:
+                from chat_rendering import render_table
+
+                # Stored PQRS responses are parsed once, when they are added
+                render_table(message.rows, message.other_text, st)
+            else:
+                st.markdown(message.content)
+
+    # PQRS received as documents: PDF oficios or scans
+    uploads = st.file_uploader(
+        "Adjunta una PQRS en PDF o imagen (el primer archivo es el oficio, los demás sus anexos)",
+        type=ATTACHMENT_TYPES, accept_multiple_files=True, key=f"uploads_{st.session_state.upload_round}",
+    )
+    if uploads and st.button("Clasificar documento"):
+        classify_uploads(uploads)
+        # A fresh uploader, so the same files are not classified twice
+        st.session_state.upload_round += 1
+
+    if prompt:
+        from context_window import CONTEXT_MAX_MESSAGES
+
+        previous = st.session_state.messages.recent(CONTEXT_MAX_MESSAGES)
         # Add user message to chat
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        st.session_state.messages.append("user", prompt)
         with st.chat_message("User",avatar="👨‍💼" ):
             st.markdown(prompt)
         
@@ -497,12 +472,14 @@ Esta herramienta está diseñada para ayudarte a clasificar y gestionar eficient
             is_pqrs = prompt.upper().startswith("PQRS:")
             if is_pqrs:
                 pqrs_content = prompt[5:].strip()
-                response = get_chat_response(pqrs_content)
+                response = get_chat_response(pqrs_content, is_pqrs=True, history=previous)
             else:
-                response = get_chat_response(prompt)
+                response = get_chat_response(prompt, history=previous)
             
             # Store assistant response
-            st.session_state.messages.append({"role": "assistant", "content": response})
+            remember_response(response, pqrs_content if is_pqrs else None)
+
+    render_export_panel(export_container)
 
 if __name__ == "__main__":
     main()
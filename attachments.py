@@ -0,0 +1,200 @@
+"""Text extraction for PQRS received as PDF oficios or scanned images.
+
+Pages are extracted in a process pool, one task per page: the PDF text
+layer with pypdf and, for pages without one (scans), local OCR of the
+page images with Tesseract (pytesseract) when it is installed. pages()
+yields them in order as they become ready and stops once the classifier
+has PQRS_ATTACHMENT_MAX_CHARS of text, so a long oficio with annexes does
+not wait for its last page. Extracted pages are cached by file hash and
+OCR mode, so uploading the same file again is free.
+
+document_fields() turns the uploaded files into the Numero de Folios and
+Anexos campos, which replace the template's "1" and "VACIO".
+"""
+import hashlib
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import get_context
+
+EXTRACT_CACHE_PATH = os.getenv("PQRS_EXTRACT_CACHE_PATH", os.path.join(".cache", "pqrs_extracted.sqlite3"))
+EXTRACT_WORKERS = int(os.getenv("PQRS_EXTRACT_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# "auto" uses OCR when pytesseract and the tesseract binary are available
+OCR_MODE = os.getenv("PQRS_OCR", "auto")  # "auto", "on" or "off"
+OCR_LANG = os.getenv("PQRS_OCR_LANG", "spa")
+# Text sent to the classifier; later pages only count as folios
+MAX_CHARS = int(os.getenv("PQRS_ATTACHMENT_MAX_CHARS", "8000"))
+# Pages with less text than this are treated as scans
+MIN_PAGE_CHARS = 20
+
+IMAGE_TYPES = ["png", "jpg", "jpeg", "tif", "tiff"]
+ATTACHMENT_TYPES = ["pdf"] + IMAGE_TYPES
+
+# page is 1-based; ocr tells whether the text came from OCR
+Page = namedtuple("Page", ["page", "text", "ocr"])
+# embedded lists the names of files attached inside a PDF
+Document = namedtuple("Document", ["name", "sha", "path", "kind", "page_count", "embedded"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    ocr INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (key, page)
+);
+"""
+
+
+def ocr_available():
+    if OCR_MODE == "off":
+        return False
+    try:
+        import pytesseract  # noqa: F401
+    except ImportError:
+        if OCR_MODE == "on":
+            raise
+        return False
+    return shutil.which("tesseract") is not None or OCR_MODE == "on"
+
+
+def ocr_image(image):
+    import pytesseract
+
+    return pytesseract.image_to_string(image, lang=OCR_LANG)
+
+
+@lru_cache(maxsize=8)
+def _pdf_reader(path):
+    # One parse per file and worker process, reused for every page it gets
+    from pypdf import PdfReader
+
+    return PdfReader(path)
+
+
+def extract_pdf_page(path, index, ocr):
+    """Runs in a worker process: the text of page `index` of the PDF at `path`."""
+    page = _pdf_reader(path).pages[index]
+    text = page.extract_text() or ""
+    if ocr and len(text.strip()) < MIN_PAGE_CHARS:
+        scanned = "\n".join(ocr_image(image.image) for image in page.images)
+        if scanned.strip():
+            return Page(index + 1, scanned, True)
+    return Page(index + 1, text, False)
+
+
+def extract_image_frame(path, index, ocr):
+    """Runs in a worker process: OCR of frame `index` of an image (multi-page TIFFs have several)."""
+    if not ocr:
+        return Page(index + 1, "", False)
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.seek(index)
+        return Page(index + 1, ocr_image(image.convert("L")), True)
+
+
+class ExtractionCache:
+    def __init__(self, path=EXTRACT_CACHE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, key):
+        """Cached pages of `key`, in order (possibly only the first ones)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT page, text, ocr FROM pages WHERE key = ? ORDER BY page", (key,))
+            return [Page(page, text, bool(ocr)) for page, text, ocr in rows]
+
+    def put(self, key, page):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, page, text, ocr, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, page.page, page.text, int(page.ocr), time.time()),
+            )
+
+
+class AttachmentReader:
+    def __init__(self, cache=None, workers=EXTRACT_WORKERS, ocr=None):
+        self.cache = cache
+        self.ocr = ocr_available() if ocr is None else ocr
+        self.directory = tempfile.mkdtemp(prefix="pqrs_attachments_")
+        # spawn, not fork: the Streamlit server process is multithreaded
+        self.pool = ProcessPoolExecutor(workers, mp_context=get_context("spawn"))
+
+    def open(self, name, data):
+        """Store an uploaded file for extraction and count its pages."""
+        sha = hashlib.sha256(data).hexdigest()
+        kind = "pdf" if data[:5] == b"%PDF-" else "image"
+        path = os.path.join(self.directory, f"{sha}.{kind}")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(data)
+        if kind == "pdf":
+            from pypdf import PdfReader
+
+            reader = PdfReader(io.BytesIO(data))
+            return Document(name, sha, path, kind, len(reader.pages), sorted(reader.attachments))
+        from PIL import Image
+
+        with Image.open(io.BytesIO(data)) as image:
+            return Document(name, sha, path, kind, getattr(image, "n_frames", 1), [])
+
+    def pages(self, document, max_chars=MAX_CHARS):
+        """Yield the document's pages in order until `max_chars` of text (None for all pages)."""
+        key = f"{document.sha}:{'ocr' if self.ocr else 'text'}"
+        cached = self.cache.get(key) if self.cache is not None else []
+        chars = 0
+        for page in cached:
+            yield page
+            chars += len(page.text)
+            if max_chars is not None and chars >= max_chars:
+                return
+
+        extract = extract_pdf_page if document.kind == "pdf" else extract_image_frame
+        futures = [
+            self.pool.submit(extract, document.path, index, self.ocr)
+            for index in range(len(cached), document.page_count)
+        ]
+        try:
+            for future in futures:
+                page = future.result()
+                if self.cache is not None:
+                    self.cache.put(key, page)
+                yield page
+                chars += len(page.text)
+                if max_chars is not None and chars >= max_chars:
+                    return
+        finally:
+            # Enough text, or the caller stopped reading: drop the pages not started yet
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def document_text(pages):
+    return "\n\n".join(page.text.strip() for page in pages if page.text.strip())
+
+
+def document_fields(documents):
+    """Numero de Folios and Anexos for the uploaded files; the first one is the oficio."""
+    anexos = [name for document in documents for name in document.embedded]
+    anexos += [f"{document.name} ({document.page_count} folios)" for document in documents[1:]]
+    return {
+        "Numero de Folios": str(sum(document.page_count for document in documents)),
+        "Anexos": "; ".join(anexos) if anexos else "VACIO",
+    }
@@ -0,0 +1,320 @@
+"""Headless batch classification of PQRS backlogs.
+
+Reads a CSV, a JSONL file or a directory of .txt files, classifies every
+PQRS with a bounded pool of asyncio workers and streams the results to a
+CSV or Parquet file as they finish. Finished items are also appended to a
+checkpoint file next to the output, so an interrupted run can be resumed
+with --resume without re-billing work that already completed.
+
+    python batch_classify.py radicados.csv resultados.csv --workers 8
+    python batch_classify.py radicados/ resultados.parquet --resume
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from pqrs_table import CAMPOS
+from response_cache import ResponseCache, prompt_fingerprint
+from call_metrics import MetricsSink, model_name, record_cache_hit, record_escalation, record_local_answer
+from metrics_callback import MetricsCallback
+from prompt_retrieval import prompt_cache_identity
+from pqrs_pipeline import prepare_pqrs, local_record
+from pqrs_record import OUTPUT_MODE, bind_structured
+from model_cascade import CASCADE, LARGE_MODEL, SMALL_MODEL, answer_rows, is_simple, review, tier
+from context_window import message_tokens
+from rate_limiter import COMPLETION_ESTIMATE, acall_with_retries, get_rate_limiter
+
+OUTPUT_COLUMNS = ["id", "status", "error"] + CAMPOS + ["respuesta"]
+
+
+def load_items(path, id_column="id", text_column="texto"):
+    """Yield (id, text) pairs from a CSV, a JSONL file or a directory of .txt files."""
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(".txt"):
+                with open(os.path.join(path, name), encoding="utf-8") as f:
+                    yield os.path.splitext(name)[0], f.read()
+    elif path.lower().endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    row = json.loads(line)
+                    yield str(row.get(id_column, line_number)), row[text_column]
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            for line_number, row in enumerate(csv.DictReader(f), 1):
+                yield str(row.get(id_column) or line_number), row[text_column]
+
+
+def build_messages(prepared):
+    """Build the same system + PQRS messages the chat app sends (the app strips the "PQRS:" prefix too)."""
+    return [SystemMessage(content=prepared.system_prompt), HumanMessage(content=prepared.human_message)]
+
+
+def response_to_row(item_id, response_text):
+    rows = answer_rows(response_text)
+    values = dict(rows) if rows else {}
+    row = {"id": item_id, "status": "ok" if rows else "sin_tabla", "error": ""}
+    row.update({campo: values.get(campo, "") for campo in CAMPOS})
+    row["respuesta"] = response_text
+    return row
+
+
+def record_to_row(item_id, record):
+    """Row for a structured answer; enum violations are reported, not dropped."""
+    errors = record.validate()
+    row = {"id": item_id, "status": "invalido" if errors else "ok", "error": "; ".join(errors)}
+    row.update(record.to_dict())
+    row["respuesta"] = record.to_markdown()
+    return row
+
+
+def local_row(item_id, record):
+    """Row for a PQRS the pre-classifier answered; status "local" keeps it out of retraining."""
+    row = {"id": item_id, "status": "local", "error": ""}
+    row.update(record.to_dict())
+    row["respuesta"] = record.to_markdown()
+    return row
+
+
+def error_row(item_id, exc):
+    row = {column: "" for column in OUTPUT_COLUMNS}
+    row.update({"id": item_id, "status": "error", "error": f"{type(exc).__name__}: {exc}"})
+    return row
+
+
+class CsvResultWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=OUTPUT_COLUMNS)
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetResultWriter:
+    """Writes results in row groups of `chunk_size` rows."""
+
+    def __init__(self, path, chunk_size=500):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([(column, pa.string()) for column in OUTPUT_COLUMNS])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.chunk_size = chunk_size
+        self.buffer = []
+
+    def write(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.writer.write_table(self.pa.Table.from_pylist(self.buffer, schema=self.schema))
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def open_writer(path):
+    if path.lower().endswith(".parquet"):
+        return ParquetResultWriter(path)
+    return CsvResultWriter(path)
+
+
+class Checkpoint:
+    """Append-only log of finished rows, used to resume interrupted runs."""
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.rows = {}
+        if resume and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn write from a crash, that item is redone
+                    if row["status"] != "error":
+                        self.rows[row["id"]] = row
+        self.file = open(path, "a" if resume else "w", encoding="utf-8")
+        if self.file.tell():
+            self.file.write("\n")
+
+    def record(self, row):
+        self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+async def classify_item(chat_model, item_id, text, limiter, max_retries=5, cache=None, fingerprint=None,
+                        metrics=None, small_model=None):
+    """Classify one PQRS; with `small_model`, simple ones start on it and escalate to `chat_model`."""
+    if cache is not None:
+        lookup_start = time.perf_counter()
+        cached = cache.get(text, fingerprint)
+        if cached is not None:
+            if metrics is not None:
+                record_cache_hit(metrics, "batch", model_name(chat_model), time.perf_counter() - lookup_start)
+            return response_to_row(item_id, cached)
+    local_start = time.perf_counter()
+    prepared = prepare_pqrs(text)
+    record = local_record(prepared)
+    if record is not None:
+        if metrics is not None:
+            record_local_answer(metrics, "batch", time.perf_counter() - local_start)
+        return local_row(item_id, record)
+    messages = build_messages(prepared)
+
+    async def ask(model):
+        async def call(attempt):
+            callbacks = []
+            if metrics is not None:
+                # Each retried attempt counts once towards the retry total
+                name = model_name(model)
+                callbacks.append(MetricsCallback(metrics, "batch", name, int(attempt > 0), attempt=attempt, pqrs=True,
+                                                 tier=tier(name)))
+            return await model.ainvoke(messages, config={"callbacks": callbacks})
+
+        # Queued behind the process-wide rate limit, which every worker shares
+        response = await acall_with_retries(call, message_tokens(messages) + COMPLETION_ESTIMATE, limiter,
+                                            max_retries)
+        return response.content
+
+    structured = OUTPUT_MODE == "json"
+    first = small_model if small_model is not None and is_simple(prepared) else chat_model
+    try:
+        response_text, record, reason = review(await ask(first), prepared, structured)
+        if reason is not None and first is not chat_model:
+            if metrics is not None:
+                record_escalation(metrics, "batch", model_name(first), reason)
+            response_text, record, reason = review(await ask(chat_model), prepared, structured)
+        if structured and record is None:
+            raise ValueError(f"Respuesta del modelo no válida: {reason}")
+        row = record_to_row(item_id, record) if structured else response_to_row(item_id, response_text)
+    except Exception as exc:
+        return error_row(item_id, exc)
+    if cache is not None and row["status"] == "ok":
+        cache.put(text, fingerprint, row["respuesta"], radicado=item_id)
+    return row
+
+
+async def run_batch(items, chat_model, writer, checkpoint, workers=8, max_retries=5, on_row=None,
+                    cache=None, fingerprint=None, metrics=None, small_model=None):
+    """Classify `items` with `workers` concurrent calls, writing rows as they finish."""
+    # Replay finished rows so the output is complete after a resume
+    for row in checkpoint.rows.values():
+        writer.write(row)
+
+    queue = asyncio.Queue(maxsize=workers * 2)
+    limiter = get_rate_limiter()
+
+    async def worker():
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                queue.task_done()
+                return
+            row = await classify_item(chat_model, *entry, limiter, max_retries, cache, fingerprint, metrics,
+                                      small_model)
+            checkpoint.record(row)
+            writer.write(row)
+            if on_row:
+                on_row(row)
+            queue.task_done()
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    for item_id, text in items:
+        if item_id not in checkpoint.rows:
+            await queue.put((item_id, text))
+    for _ in tasks:
+        await queue.put(None)
+    await asyncio.gather(*tasks)
+
+
+def build_chat_model(args, model=None):
+    if args.fake_responses:
+        from langchain_core.language_models import FakeListChatModel
+
+        with open(args.fake_responses, encoding="utf-8") as f:
+            responses = ["".join(json.loads(line)["tokens"]) for line in f if line.strip()]
+        return FakeListChatModel(responses=responses)
+
+    from llm_client import get_chat_model
+
+    # Retries go through rate_limiter, with backpressure shared by every worker
+    chat_model = get_chat_model(model or args.model, args.temperature)
+    return bind_structured(chat_model) if OUTPUT_MODE == "json" else chat_model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clasificación de PQRS por lotes")
+    parser.add_argument("input", help="CSV, JSONL o directorio con archivos .txt")
+    parser.add_argument("output", help="Archivo de salida .csv o .parquet")
+    parser.add_argument("--id-column", default="id")
+    parser.add_argument("--text-column", default="texto")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--model", default=LARGE_MODEL)
+    parser.add_argument("--small-model", default=SMALL_MODEL, help="Primer modelo para los PQRS simples")
+    parser.add_argument("--no-cascade", action="store_true", help="Clasificar todo con --model")
+    parser.add_argument("--temperature", type=float, default=0.3)
+    parser.add_argument("--resume", action="store_true", help="Omitir los PQRS ya procesados")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de respuestas")
+    parser.add_argument("--fake-responses", help="JSONL de respuestas grabadas (modelo falso local)")
+    parser.add_argument("--no-metrics", action="store_true", help="No registrar métricas de latencia y tokens")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    chat_model = build_chat_model(args)
+    cascade = CASCADE and not args.no_cascade
+    small_model = build_chat_model(args, args.small_model) if cascade else None
+    checkpoint = Checkpoint(f"{args.output}.checkpoint.jsonl", resume=args.resume)
+    writer = open_writer(args.output)
+    cache = None if args.no_cache else ResponseCache()
+    models = f"{args.small_model}>{args.model}" if cascade else args.model
+    fingerprint = prompt_fingerprint(prompt_cache_identity(), models, args.temperature)
+    metrics = None if args.no_metrics else MetricsSink()
+    counts = {}
+
+    def on_row(row):
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+        print(f"{row['id']}: {row['status']}", file=sys.stderr)
+
+    items = load_items(args.input, args.id_column, args.text_column)
+    try:
+        asyncio.run(run_batch(items, chat_model, writer, checkpoint, args.workers, args.max_retries, on_row,
+                              cache, fingerprint, metrics, small_model))
+    finally:
+        writer.close()
+        checkpoint.close()
+    if cache is not None:
+        counts["cache"] = cache.metrics()
+    if metrics is not None:
+        counts["latency"] = metrics.percentiles()["latency"]
+        counts["tiers"] = metrics.tier_percentiles()
+        counts["escalation_rate"] = metrics.escalation_rate()
+    print(json.dumps(counts), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
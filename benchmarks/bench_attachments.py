@@ -0,0 +1,89 @@
+"""Page extraction throughput of attachments.AttachmentReader.
+
+Extracts every page of a PDF with 1 and with N worker processes, then
+reports the time until the classifier has its text (pages() stops at
+PQRS_ATTACHMENT_MAX_CHARS) and a cached re-upload. Without --pdf a
+synthetic text-layer PDF is generated; scans with OCR are where the pool
+pays off most, since each page costs seconds of Tesseract time.
+
+    python benchmarks/bench_attachments.py [--pages 200] [--workers 4] [--pdf oficio.pdf]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import attachments
+
+PARAGRAPH = ("Señores CAR, en la vereda Panamá de Soacha una planta de subproductos animales genera olores "
+             "ofensivos permanentes. Solicito visita técnica y copia del expediente. ")
+
+
+def synthetic_pdf(pages):
+    """A minimal PDF with `pages` pages of Helvetica text."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(pages))}] /Count {pages} >>".encode()]
+    font = 3 + 2 * pages
+    for i in range(pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 {font} 0 R >> >> >>".encode())
+        text = f"Folio {i + 1}. " + PARAGRAPH * 12
+        lines = " ".join(f"({text[j:j + 90]}) '" for j in range(0, len(text), 90))
+        stream = f"BT /F1 9 Tf 36 760 Td 11 TL {lines} ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    data, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(data)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=attachments.EXTRACT_WORKERS)
+    parser.add_argument('--pdf', help="Real PDF to extract instead of the synthetic one")
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, 'rb') as f:
+            data = f.read()
+    else:
+        data = synthetic_pdf(args.pages)
+
+    for workers in sorted({1, args.workers}):
+        reader = attachments.AttachmentReader(workers=workers)
+        document = reader.open('bench.pdf', data)
+        list(reader.pages(document._replace(page_count=min(workers, document.page_count)), None))  # start the pool
+        elapsed, pages = timed(lambda: list(reader.pages(document, None)))
+        print(f"{workers} workers: all {len(pages)} pages in {elapsed:.2f} s "
+              f"({len(pages) / elapsed:,.0f} pages/s)")
+        elapsed, pages = timed(lambda: list(reader.pages(document)))
+        print(f"{workers} workers: classifier text ({len(pages)} pages) in {elapsed * 1000:.0f} ms")
+        reader.close()
+
+    cache = attachments.ExtractionCache(os.path.join(tempfile.mkdtemp(), 'extracted.sqlite3'))
+    reader = attachments.AttachmentReader(cache, workers=args.workers)
+    document = reader.open('bench.pdf', data)
+    first, _ = timed(lambda: list(reader.pages(document)))
+    again, _ = timed(lambda: list(reader.pages(reader.open('bench.pdf', data))))
+    print(f"cached re-upload: {again * 1000:.1f} ms (first upload {first * 1000:.0f} ms)")
+    reader.close()
+
+
+if __name__ == '__main__':
+    main()
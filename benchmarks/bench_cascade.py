@@ -0,0 +1,148 @@
+"""Benchmark the model cascade against serving every PQRS with the large model.
+
+Starts two mock servers (mock_openai.py): a fast "small" one, of which a
+--bad-rate share of answers is cut off before the table is complete, and
+a slower "large" one. The labelled PQRS are then classified with
+batch_classify.run_batch twice:
+
+  large    every PQRS on PQRS_MODEL, as before the cascade
+  cascade  simple PQRS on PQRS_SMALL_MODEL first, escalated to PQRS_MODEL
+           when model_cascade.review() rejects the answer
+
+and for each run it reports the wall time, per-tier p50/p95 call latency,
+the escalation rate, failed rows and the token cost at the --price-* list
+prices (USD per million input/output tokens). The recorded answers are
+not about the labelled PQRS, so the pre-classifier agreement check is
+off unless --agree-confidence is lowered to 1 or less.
+
+    python benchmarks/bench_cascade.py [--requests 48] [--bad-rate 0.2] [--workers 8]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+import batch_classify
+import model_cascade
+from call_metrics import MetricsSink
+from llm_client import close_clients, get_chat_model
+from mock_openai import MockOpenAIServer, load_responses
+from model_cascade import LARGE_MODEL, SMALL_MODEL
+
+PQRS_FILE = os.path.join(BENCH_DIR, 'data', 'labelled_pqrs.jsonl')
+
+
+class TierSink(MetricsSink):
+    """MetricsSink that also totals the tokens of each tier, without writing a file."""
+
+    def __init__(self):
+        super().__init__(path=None, prometheus_path=None)
+        self.tier_tokens = {}
+
+    def record(self, event):
+        super().record(event)
+        if event.get('tier'):
+            prompt, completion = self.tier_tokens.get(event['tier'], (0, 0))
+            self.tier_tokens[event['tier']] = (prompt + (event.get('prompt_tokens') or 0),
+                                               completion + (event.get('completion_tokens') or 0))
+
+
+class NullWriter:
+    def write(self, row):
+        pass
+
+
+class NullCheckpoint:
+    rows = {}
+
+    def record(self, row):
+        pass
+
+
+def pqrs_texts(count):
+    with open(PQRS_FILE, encoding='utf-8') as f:
+        texts = [json.loads(line)['texto'] for line in f if line.strip()]
+    return [f"{texts[i % len(texts)]} (caso {i})" for i in range(count)]
+
+
+def table_responses():
+    """The recorded answers that classify a PQRS (the others answer a plain question)."""
+    return [tokens for tokens in load_responses() if '| Campo' in ''.join(tokens)]
+
+
+def small_responses(bad_rate, size=20):
+    """Recorded PQRS answers, `bad_rate` of them cut off halfway through the table."""
+    recorded = table_responses()
+    responses = [recorded[i % len(recorded)] for i in range(size)]
+    for i in range(round(bad_rate * size)):
+        # Spread the bad answers over the cycle
+        index = i * size // max(1, round(bad_rate * size))
+        responses[index] = responses[index][:len(responses[index]) // 2]
+    return responses
+
+
+def run(texts, workers, large, small, prices):
+    metrics = TierSink()
+    rows = []
+    items = [(str(i), text) for i, text in enumerate(texts)]
+    start = time.perf_counter()
+    asyncio.run(batch_classify.run_batch(items, large, NullWriter(), NullCheckpoint(), workers, 2,
+                                         on_row=rows.append, metrics=metrics, small_model=small))
+    seconds = time.perf_counter() - start
+    cost = sum((prompt * prices[tier][0] + completion * prices[tier][1]) / 1e6
+               for tier, (prompt, completion) in metrics.tier_tokens.items())
+    return {
+        'seconds': seconds,
+        'failed': sum(row['status'] == 'error' for row in rows),
+        'tiers': metrics.tier_percentiles(),
+        'calls': {tier: len(values) for tier, values in metrics.tier_latencies.items()},
+        'escalation_rate': metrics.escalation_rate(),
+        'cost': cost,
+    }
+
+
+def report(name, result):
+    tiers = "  ".join(f"{tier} {result['calls'][tier]:3d} calls p50 {points[0.5]:.2f} s p95 {points[0.95]:.2f} s"
+                      for tier, points in sorted(result['tiers'].items()))
+    escalation = result['escalation_rate']
+    print(f"{name:<8} wall {result['seconds']:5.1f} s  failed {result['failed']:2d}  "
+          f"escalated {'-' if escalation is None else f'{escalation:4.0%}'}  "
+          f"cost ${result['cost']:.4f}  {tiers}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=48)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--bad-rate', type=float, default=0.2)
+    parser.add_argument('--small-token-delay', type=float, default=0.002)
+    parser.add_argument('--large-token-delay', type=float, default=0.006)
+    parser.add_argument('--price-small', type=float, nargs=2, default=[0.15, 0.60])
+    parser.add_argument('--price-large', type=float, nargs=2, default=[2.50, 10.00])
+    parser.add_argument('--agree-confidence', type=float, default=1.01)
+    args = parser.parse_args()
+    model_cascade.AGREE_CONFIDENCE = args.agree_confidence
+    texts = pqrs_texts(args.requests)
+    prices = {'small': args.price_small, 'large': args.price_large}
+    print(f"{len(texts)} PQRS, {args.workers} workers, {args.bad_rate:.0%} of small-model answers cut off")
+
+    large_server = MockOpenAIServer(token_delay=args.large_token_delay, responses=table_responses()).start()
+    small_server = MockOpenAIServer(token_delay=args.small_token_delay,
+                                    responses=small_responses(args.bad_rate)).start()
+    large = get_chat_model(LARGE_MODEL, 0.3, api_key='mock', base_url=large_server.base_url, max_retries=0)
+    small = get_chat_model(SMALL_MODEL, 0.3, api_key='mock', base_url=small_server.base_url, max_retries=0)
+    report('large', run(texts, args.workers, large, None, prices))
+    report('cascade', run(texts, args.workers, large, small, prices))
+    large_server.shutdown()
+    small_server.shutdown()
+    close_clients()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Time-to-first-token with a cold vs. a warm (pooled) ChatOpenAI client.
+
+Cold: a new ChatOpenAI and HTTP connection for every request, which is what
+get_chat_response used to do. Warm: the shared client from llm_client.
+Both run against the local mock server, which adds `--connect-delay` per
+new connection to stand in for TLS setup. Each answer is read to the end,
+so the warm client can return its connection to the pool; the connections
+the mock accepted are reported for each client.
+
+    python benchmarks/bench_client_ttft.py --requests 20 --connect-delay 0.1
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+import llm_client
+from mock_openai import MockOpenAIServer
+
+
+def time_to_first_token(chat_model):
+    start = time.perf_counter()
+    first = None
+    for _ in chat_model.stream([HumanMessage(content="PQRS: prueba")]):
+        if first is None:
+            first = time.perf_counter() - start
+    return first
+
+
+def cold_client(base_url):
+    return ChatOpenAI(model="gpt-4o", api_key="mock", base_url=base_url, streaming=True)
+
+
+def warm_client(base_url):
+    return llm_client.get_chat_model("gpt-4o", api_key="mock", base_url=base_url)
+
+
+def run(factory, base_url, requests):
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        chat_model = factory(base_url)
+        samples.append(time.perf_counter() - start + time_to_first_token(chat_model))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--connect-delay', type=float, default=0.1)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(connect_delay=args.connect_delay).start()
+    try:
+        for name, factory in (('cold', cold_client), ('warm', warm_client)):
+            connections = server.connections
+            samples = run(factory, server.base_url, args.requests)
+            print(f"{name}: median TTFT {statistics.median(samples) * 1000:.1f} ms, "
+                  f"p95 {sorted(samples)[int(len(samples) * 0.95) - 1] * 1000:.1f} ms, "
+                  f"{server.connections - connections} connections for {args.requests} requests")
+    finally:
+        llm_client.close_clients()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
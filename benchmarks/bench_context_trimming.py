@@ -0,0 +1,74 @@
+"""Prompt tokens spent on conversation context: fixed last-3 replay vs. trimming.
+
+Simulates an operator session over data/labelled_pqrs.jsonl, each PQRS
+followed by one follow-up question, with answers taken from
+data/recorded_streams.jsonl. For every turn it counts the context tokens
+the old replay sent (the last three messages, tables in full, including
+a duplicate of the current prompt) and what context_window.build_context
+sends, for PQRS and follow-up turns separately.
+
+    python benchmarks/bench_context_trimming.py [--budget 1500]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from chat_history import ChatHistory
+from context_window import CONTEXT_MAX_MESSAGES, MESSAGE_OVERHEAD, _encoding, build_context, count_tokens
+from prompt_assembly import STATIC_PROMPT
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+FOLLOW_UP = "¿Por qué se asignó esa dirección y qué plazo tiene la respuesta?"
+FOLLOW_UP_ANSWER = ("Se asignó por el municipio y el tipo de trámite descritos en la PQRS; "
+                    "el plazo depende del Tipo de Respuesta indicado en la tabla.")
+
+
+def load_jsonl(name):
+    with open(os.path.join(DATA_DIR, name), encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def content_tokens(contents):
+    return sum(count_tokens(content) + MESSAGE_OVERHEAD for content in contents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=int, default=None, help="Context token budget (default from env)")
+    args = parser.parse_args()
+
+    pqrs = [item['texto'] for item in load_jsonl('labelled_pqrs.jsonl')]
+    answers = ["".join(item['tokens']) for item in load_jsonl('recorded_streams.jsonl')]
+    turns = []
+    for i, text in enumerate(pqrs):
+        turns.append((f"PQRS: {text}", answers[i % len(answers)], True))
+        turns.append((FOLLOW_UP, FOLLOW_UP_ANSWER, False))
+
+    history = ChatHistory(max_messages=len(turns) * 2)
+    totals = {True: [0, 0, 0], False: [0, 0, 0]}  # turns, old tokens, new tokens
+    for prompt, answer, is_pqrs in turns:
+        previous = history.recent(CONTEXT_MAX_MESSAGES)
+        history.append("user", prompt)
+        old = content_tokens(entry.content for entry in history.recent(3))
+        new = sum(count_tokens(m.content) + MESSAGE_OVERHEAD for m in build_context(previous, is_pqrs, args.budget))
+        totals[is_pqrs][0] += 1
+        totals[is_pqrs][1] += old
+        totals[is_pqrs][2] += new
+        history.append("assistant", answer)
+
+    tokenizer = "tiktoken o200k_base" if _encoding() is not None else "offline estimate"
+    print(f"tokenizer: {tokenizer}; system prompt: {count_tokens(STATIC_PROMPT)} tokens")
+    print(f"{'turn':<10} {'turns':>5} {'old ctx/turn':>13} {'new ctx/turn':>13} {'saved':>7}")
+    for is_pqrs, (count, old, new) in totals.items():
+        saved = (old - new) / old if old else 0
+        print(f"{'PQRS' if is_pqrs else 'follow-up':<10} {count:>5} {old / count:>13.0f} {new / count:>13.0f} {saved:>7.0%}")
+    old_total = sum(t[1] for t in totals.values())
+    new_total = sum(t[2] for t in totals.values())
+    print(f"context tokens over the session: {old_total} -> {new_total} ({(old_total - new_total) / old_total:.0%} saved)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Streaming export from the record store versus re-parsing chat markdown.
+
+Fills a temporary RecordStore with N classified PQRS (the recorded
+answer's campos) and exports it to CSV, XLSX and Parquet in chunks,
+reporting seconds and peak Python heap per format. The baseline is what
+an export had to do before the store existed: run extract_table_data
+over N stored markdown answers and build one DataFrame.
+
+    python benchmarks/bench_export.py [--rows 20000] [--chunk-rows 1000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pandas as pd
+
+import pqrs_store
+from pqrs_table import extract_table_data, table_to_record
+
+STREAMS_FILE = os.path.join(os.path.dirname(__file__), 'data', 'recorded_streams.jsonl')
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--chunk-rows', type=int, default=pqrs_store.EXPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    with open(STREAMS_FILE, encoding='utf-8') as f:
+        markdown = "".join(json.loads(f.readline())['tokens'])
+    df, _ = extract_table_data(markdown)
+    values = table_to_record(df)
+
+    directory = tempfile.mkdtemp()
+    store = pqrs_store.RecordStore(os.path.join(directory, 'records.sqlite3'))
+    start = time.perf_counter()
+    for i in range(args.rows):
+        store.append(values, f"PQRS de prueba {i}", session="bench")
+    print(f"append: {args.rows / (time.perf_counter() - start):,.0f} records/s")
+
+    def reparse():
+        rows = [table_to_record(extract_table_data(markdown)[0]) for _ in range(args.rows)]
+        pd.DataFrame(rows).to_csv(os.path.join(directory, 'baseline.csv'), index=False)
+
+    elapsed, peak = measure(reparse)
+    print(f"{'baseline csv':<14} {elapsed:7.2f} s  peak {peak:7.1f} MiB")
+    for fmt in pqrs_store.EXPORT_FORMATS:
+        path = os.path.join(directory, f'export.{fmt}')
+
+        def run():
+            with open(path, 'wb') as f:
+                pqrs_store.export(store, fmt, f, chunk_rows=args.chunk_rows)
+
+        elapsed, peak = measure(run)
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f"{fmt:<14} {elapsed:7.2f} s  peak {peak:7.1f} MiB  ({size:.1f} MiB file)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Accuracy and throughput of the Cédula/Teléfono/Correo/Fecha pre-extractor.
+
+Checks every entry of data/extractor_corpus.jsonl against its expected
+fields (exits non-zero on a mismatch) and reports texts per second for
+single and columnar extraction.
+
+    python benchmarks/bench_field_extractors.py [--repeat 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from field_extractors import PREFILLED_CAMPOS, extract_fields, extract_fields_many
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'extractor_corpus.jsonl')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(DATA_FILE, encoding='utf-8') as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    correct = {campo: 0 for campo in PREFILLED_CAMPOS}
+    failures = 0
+    for item in corpus:
+        got = extract_fields(item['texto'])
+        for campo in PREFILLED_CAMPOS:
+            correct[campo] += got.get(campo) == item['esperado'].get(campo)
+        if got != item['esperado']:
+            failures += 1
+            print(f"MISMATCH {item['texto'][:60]!r}\n  got      {got}\n  expected {item['esperado']}")
+    for campo, hits in correct.items():
+        print(f"{campo:<10} {hits}/{len(corpus)}")
+
+    texts = [item['texto'] for item in corpus]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            extract_fields(text)
+    single = args.repeat * len(texts) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        extract_fields_many(texts)
+    columnar = args.repeat * len(texts) / (time.perf_counter() - start)
+    print(f"extract_fields:      {single:,.0f} texts/s ({1e6 / single:.1f} µs/text)")
+    print(f"extract_fields_many: {columnar:,.0f} texts/s")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
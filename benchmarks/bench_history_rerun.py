@@ -0,0 +1,76 @@
+"""Streamlit rerun latency as the chat history grows.
+
+Loads the app with AppTest, seeds the session with N alternating PQRS /
+answer messages taken from data/recorded_streams.jsonl and times a plain
+rerun. "lazy" is the default (only the last PQRS_HISTORY_RENDER_LAST
+messages drawn as tables); "full" draws every stored table, which is
+roughly what the app did before the history was bounded.
+
+    python benchmarks/bench_history_rerun.py --sizes 10 100 500 --reruns 3
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'recorded_streams.jsonl')
+
+
+def seeded_history(size, answers):
+    from chat_history import ChatHistory
+
+    history = ChatHistory(max_messages=size)
+    for i in range(size // 2):
+        history.append("user", f"PQRS: solicitud de prueba número {i}")
+        history.append("assistant", answers[i % len(answers)])
+    return history
+
+
+def rerun_time(app_test, history, reruns):
+    app_test.session_state["messages"] = history
+    samples = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app_test.run()
+        samples.append(time.perf_counter() - start)
+    if app_test.exception:
+        raise RuntimeError(app_test.exception[0].value)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--reruns', type=int, default=3)
+    args = parser.parse_args()
+
+    # The app stops without a key; no request is made during a plain rerun
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ["PQRS_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "cache.sqlite3")
+    from streamlit.testing.v1 import AppTest
+    import chat_history
+
+    with open(DATA_FILE, encoding='utf-8') as f:
+        answers = ["".join(json.loads(line)["tokens"]) for line in f if line.strip()]
+
+    app_test = AppTest.from_file(os.path.abspath(os.path.join(ROOT, 'app.py')), default_timeout=600)
+    app_test.run()
+    lazy_last = chat_history.RENDER_LAST
+    print(f"{'messages':>8} {'lazy (s)':>10} {'full (s)':>10}")
+    for size in args.sizes:
+        chat_history.RENDER_LAST = lazy_last
+        lazy = rerun_time(app_test, seeded_history(size, answers), args.reruns)
+        chat_history.RENDER_LAST = size
+        full = rerun_time(app_test, seeded_history(size, answers), args.reruns)
+        print(f"{size:>8} {lazy:>10.3f} {full:>10.3f}")
+    chat_history.RENDER_LAST = lazy_last
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Accuracy versus offload of the local pre-classifier (pqrs_classifier.py).
+
+Cross-validates the TF-IDF model over the labelled PQRS samples: each
+fold is trained on the other folds and its PQRS go through
+pqrs_pipeline.local_record(), as in the app. For every confidence
+threshold it reports the share of PQRS answered locally (offload) and how
+many of those got both the Dirección and the Tipo de Tramite right, then
+the load time of a saved model and the per-PQRS prediction latency.
+
+    python benchmarks/bench_preclassifier.py [--folds 5] [--data extra.jsonl ...]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pqrs_classifier
+from pqrs_pipeline import local_record, prepare_pqrs
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+DATA_FILES = [os.path.join(DATA_DIR, 'routine_pqrs.jsonl'), os.path.join(DATA_DIR, 'labelled_pqrs.jsonl')]
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95]
+
+
+def exact_labels(path):
+    """(text, direccion code, tramite), keeping regional codes: the pipeline must recover them."""
+    for row in pqrs_classifier._read_rows(path):
+        code = pqrs_classifier.DIRECCION_CODE_PATTERN.search(row['direccion'])
+        yield row['texto'], code.group(1) if code else None, pqrs_classifier.tramite_label(row['tipo_tramite'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', nargs='+', default=DATA_FILES, help="JSONL with texto, direccion, tipo_tramite")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    samples = [sample for path in args.data for sample in exact_labels(path)]
+    examples = [(text, pqrs_classifier.direccion_label(code), tramite) for text, code, tramite in samples]
+    prepared = [prepare_pqrs(text) for text, _, _ in samples]
+    folds = np.random.default_rng(0).permutation(len(samples)) % args.folds
+
+    outcomes = []  # (confidence, correct) per PQRS, None when it can never be answered locally
+    for fold in range(args.folds):
+        classifier = pqrs_classifier.train_examples([e for e, f in zip(examples, folds) if f != fold])
+        for i in np.flatnonzero(folds == fold):
+            candidate = prepared[i]._replace(prediction=classifier.predict(samples[i][0]))
+            record = local_record(candidate, threshold=0.0)
+            if record is None:
+                outcomes.append(None)
+                continue
+            _, code, tramite = samples[i]
+            assigned = pqrs_classifier.DIRECCION_CODE_PATTERN.search(record.direccion_asignada).group(1)
+            correct = assigned == code and ", ".join(record.tipo_tramite) == tramite
+            outcomes.append((candidate.prediction.confidence, correct))
+
+    print(f"{len(samples)} PQRS, {args.folds}-fold cross-validation")
+    print(f"{'threshold':>9} {'offload':>8} {'accuracy':>9}")
+    for threshold in THRESHOLDS:
+        answered = [correct for confidence, correct in filter(None, outcomes) if confidence >= threshold]
+        accuracy = f"{sum(answered) / len(answered):.0%}" if answered else '-'
+        print(f"{threshold:>9} {len(answered) / len(outcomes):>8.0%} {accuracy:>9}")
+
+    classifier = pqrs_classifier.train_examples(examples)
+    path = os.path.join(tempfile.mkdtemp(), 'classifier.npz')
+    classifier.save(path)
+    start = time.perf_counter()
+    pqrs_classifier.PQRSClassifier.load(path)
+    print(f"\nmodel load: {(time.perf_counter() - start) * 1000:.1f} ms ({os.path.getsize(path) / 1024:.0f} KiB)")
+    texts = [text for text, _, _ in samples]
+    latencies = []
+    for i in range(args.calls):
+        start = time.perf_counter()
+        classifier.predict(texts[i % len(texts)])
+        latencies.append(time.perf_counter() - start)
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+    print(f"predict: p50 {p50:.0f} us, p99 {p99:.0f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Token reduction and agreement of the retrieval (slim) prompt vs. the full prompt.
+
+Offline it reports prompt tokens per PQRS and how often the labelled
+Dirección / Tipo de Trámite survive retrieval (recall@k). With --llm it
+also classifies the labelled sample with both prompts and reports how
+often the Dirección Asignada and Tipo de Tramite agree (needs an API key,
+or OPENAI_BASE_URL pointing at a compatible server).
+
+    python benchmarks/bench_prompt_retrieval.py [--k 5] [--k-tramites 10] [--llm]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import prompt_retrieval
+from prompt_assembly import STATIC_PROMPT
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'labelled_pqrs.jsonl')
+
+
+def token_counter():
+    try:
+        import tiktoken
+
+        encoding = tiktoken.encoding_for_model('gpt-4o')
+        return lambda text: len(encoding.encode(text))
+    except Exception:
+        # Rough offline estimate when tiktoken or its encoding files are unavailable
+        return lambda text: len(text) // 4
+
+
+def classify(system_prompt, text):
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    from llm_client import get_chat_model
+    from pqrs_table import extract_table_data, table_to_record
+
+    response = get_chat_model().invoke([SystemMessage(content=system_prompt), HumanMessage(content=f"PQRS: {text}")])
+    df, _ = extract_table_data(response.content)
+    return table_to_record(df) if df is not None else {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--k', type=int, default=prompt_retrieval.TOP_K_DIRECCIONES)
+    parser.add_argument('--k-tramites', type=int, default=prompt_retrieval.TOP_K_TRAMITES)
+    parser.add_argument('--llm', action='store_true', help='also measure classification agreement')
+    args = parser.parse_args()
+
+    count_tokens = token_counter()
+    with open(DATA_FILE, encoding='utf-8') as f:
+        sample = [json.loads(line) for line in f if line.strip()]
+
+    full_tokens = count_tokens(STATIC_PROMPT)
+    slim_tokens, direccion_hits, tramite_hits = [], 0, 0
+    regionales = {record.code for record in prompt_retrieval.REGIONALES}
+    agreement = {'Dirección Asignada': 0, 'Tipo de Tramite': 0}
+    for item in sample:
+        slim = prompt_retrieval.build_slim_prompt(item['texto'], args.k, args.k_tramites)
+        slim_tokens.append(count_tokens(slim))
+        candidates = {r.code for r in prompt_retrieval.candidate_direcciones(item['texto'], args.k)}
+        direccion_hits += item['direccion'] in candidates | regionales
+        tramites = [r.text for r in prompt_retrieval.candidate_tramites(item['texto'], args.k_tramites)]
+        tramite_hits += not args.k_tramites or item['tipo_tramite'] in tramites
+        if args.llm:
+            full = classify(STATIC_PROMPT, item['texto'])
+            reduced = classify(slim, item['texto'])
+            for campo in agreement:
+                agreement[campo] += full.get(campo, '').strip() == reduced.get(campo, '').strip()
+
+    mean_slim = statistics.mean(slim_tokens)
+    print(f"sample size:            {len(sample)}")
+    print(f"full prompt tokens:     {full_tokens}")
+    print(f"slim prompt tokens:     {mean_slim:.0f} (mean), {max(slim_tokens)} (max)")
+    print(f"token reduction:        {1 - mean_slim / full_tokens:.1%}")
+    print(f"dirección recall@{args.k}:    {direccion_hits / len(sample):.1%}")
+    print(f"trámite recall@{args.k_tramites}:     {tramite_hits / len(sample):.1%}")
+    if args.llm:
+        for campo, agreed in agreement.items():
+            print(f"agreement {campo}: {agreed / len(sample):.1%}")
+
+
+if __name__ == '__main__':
+    main()
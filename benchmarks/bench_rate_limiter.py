@@ -0,0 +1,125 @@
+"""Benchmark the shared rate limiter against a mock server that enforces a rate limit.
+
+Starts mock_openai.py with --rpm and sends --requests chat calls from
+--sessions threads, as concurrent Streamlit sessions would:
+
+  limited  every call through rate_limiter.call_with_retries, which learns
+           the limit from the x-ratelimit-* headers and queues the calls
+  naive    one direct call per request, as before: every 429 is a failed
+           classification the operator has to resubmit
+
+and then checks the circuit breaker against a server that answers every
+request with a 503: after PQRS_BREAKER_FAILURES failures the remaining
+calls must fail fast without reaching it.
+
+    python benchmarks/bench_rate_limiter.py [--requests 90] [--rpm 60] [--sessions 16]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from langchain_core.messages import HumanMessage
+
+from llm_client import close_clients, get_chat_model
+from mock_openai import MockOpenAIServer
+from rate_limiter import CircuitBreaker, CircuitOpenError, RateLimiter, call_with_retries, get_rate_limiter
+
+MESSAGES = [HumanMessage(content="PQRS: Solicito copia del expediente sancionatorio de la vereda El Rosal")]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))] if values else 0.0
+
+
+def run_sessions(requests, sessions, send):
+    """Run `send()` `requests` times from `sessions` threads; return (latencies, failures, seconds)."""
+    latencies, failures = [], []
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def session():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                send()
+            except Exception as exc:
+                with lock:
+                    failures.append(type(exc).__name__)
+            else:
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures, time.perf_counter() - start
+
+
+def report(name, server, latencies, failures, seconds):
+    print(f"{name:<8} ok {len(latencies):3d}  failed {len(failures):3d}  429s sent {server.rate_limited:3d}  "
+          f"wall {seconds:5.1f} s  latency p50 {percentile(latencies, 0.5):5.2f} s  "
+          f"p95 {percentile(latencies, 0.95):5.2f} s  max {max(latencies, default=0.0):5.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=90)
+    parser.add_argument('--rpm', type=int, default=60)
+    parser.add_argument('--sessions', type=int, default=16)
+    parser.add_argument('--token-delay', type=float, default=0.001)
+    args = parser.parse_args()
+    print(f"{args.requests} requests from {args.sessions} sessions, mock limit {args.rpm} requests/min")
+
+    # The process-wide limiter, fed by llm_client's response hook
+    server = MockOpenAIServer(token_delay=args.token_delay, rpm=args.rpm).start()
+    chat_model = get_chat_model("gpt-4o", api_key="mock", base_url=server.base_url)
+    queued = []
+
+    def limited():
+        call_with_retries(lambda attempt: chat_model.invoke(MESSAGES),
+                          on_wait=lambda position, eta, attempt: queued.append(eta))
+
+    report('limited', server, *run_sessions(args.requests, args.sessions, limited))
+    status = get_rate_limiter().status()
+    print(f"         learnt {status['rpm']:.0f} requests/min, pace {status['pace']:.0%}, "
+          f"longest queue wait announced {max(queued, default=0.0):.1f} s")
+    server.shutdown()
+
+    server = MockOpenAIServer(token_delay=args.token_delay, rpm=args.rpm).start()
+    chat_model = get_chat_model("gpt-4o", api_key="mock", base_url=server.base_url)
+    report('naive', server, *run_sessions(args.requests, args.sessions, lambda: chat_model.invoke(MESSAGES)))
+    server.shutdown()
+
+    server = MockOpenAIServer(failure_rate=1.0, failure_status=503).start()
+    chat_model = get_chat_model("gpt-4o", api_key="mock", base_url=server.base_url)
+    breaker = CircuitBreaker(failures=5, cooldown=60)
+    limiter = RateLimiter(breaker=breaker)
+    fast_failures = 0
+    for _ in range(20):
+        try:
+            call_with_retries(lambda attempt: chat_model.invoke(MESSAGES), limiter=limiter, max_retries=0)
+        except CircuitOpenError:
+            fast_failures += 1
+        except Exception:
+            pass
+    print(f"outage   20 calls: {server.requests} reached the server, {fast_failures} failed fast, "
+          f"breaker {breaker.state()}")
+    server.shutdown()
+    close_clients()
+
+
+if __name__ == '__main__':
+    main()
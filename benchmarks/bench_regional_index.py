@@ -0,0 +1,54 @@
+"""Throughput of the municipio → Dirección Regional index.
+
+Reports lookups per second for exact names, for names that need
+accent/case normalization, and full-text scans per second over the
+labelled PQRS sample, plus how many labelled regionals the scan recovers.
+
+    python benchmarks/bench_regional_index.py [--calls 2000000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import regional_index
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'labelled_pqrs.jsonl')
+
+
+def rate(fn, inputs, calls):
+    n = len(inputs)
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(inputs[i % n])
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    exact = [m for municipios in regional_index.MUNICIPIOS.values() for m in municipios]
+    unnormalized = [name.upper() for name in exact]
+    with open(DATA_FILE, encoding='utf-8') as f:
+        sample = [json.loads(line) for line in f if line.strip()]
+    texts = [item['texto'] for item in sample]
+
+    print(f"exact lookups/s:       {rate(regional_index.lookup_municipio, exact, args.calls):,.0f}")
+    print(f"normalized lookups/s:  {rate(regional_index.lookup_municipio, unnormalized, args.calls // 10):,.0f}")
+    print(f"PQRS text scans/s:     {rate(regional_index.find_regional, texts, args.calls // 100):,.0f}")
+
+    regional_labels = [item for item in sample if item['direccion'] in regional_index.REGIONALES]
+    recovered = sum(
+        (regional_index.find_regional(item['texto']) or (None, None))[1] == item['direccion']
+        for item in regional_labels
+    )
+    print(f"labelled regionals recovered: {recovered}/{len(regional_labels)}")
+
+
+if __name__ == '__main__':
+    main()
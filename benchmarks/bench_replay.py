@@ -0,0 +1,220 @@
+"""End-to-end replay benchmark of the chat app and the batch pipeline.
+
+Drives the real code against the local mock server (mock_openai.py), which
+replays the recorded answers token by token with a configurable
+inter-token delay and an injectable failure rate:
+
+  app    the Streamlit app run headless with AppTest, one PQRS per chat
+         input, through get_chat_response, StreamHandler and rendering
+  batch  batch_classify.run_batch with the pooled client and N workers
+
+Each scenario runs in its own process, so peak memory is not shared, and
+reports requests/s, CPU seconds per request, peak RSS, failed requests
+and, for the app, throttled table renders per response. Results are
+written as JSON (by default benchmarks/results/replay-<commit>.json) and
+--compare prints the change against an earlier result file.
+
+    python benchmarks/bench_replay.py --requests 30 --token-delay 0.002
+    python benchmarks/bench_replay.py --failure-rate 0.1 --compare benchmarks/results/replay-abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+PQRS_FILE = os.path.join(BENCH_DIR, 'data', 'labelled_pqrs.jsonl')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+SCENARIOS = ['app', 'batch']
+# Higher is better for these; lower is better for everything else
+HIGHER_IS_BETTER = {'requests_per_s'}
+
+
+def pqrs_texts(count):
+    """`count` distinct PQRS texts, so the response cache never short-circuits a request."""
+    with open(PQRS_FILE, encoding='utf-8') as f:
+        texts = [json.loads(line)['texto'] for line in f if line.strip()]
+    return [f"{texts[i % len(texts)]} (caso {i})" for i in range(count)]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_mock(args):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'mock_openai.py'), '--port', str(port),
+         '--token-delay', str(args.token_delay), '--failure-rate', str(args.failure_rate),
+         '--failure-status', str(args.failure_status), '--seed', str(args.seed)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    process.stdout.readline()  # "Serving on ..."
+    return process, f"http://127.0.0.1:{port}/v1"
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_app(texts):
+    from streamlit.testing.v1 import AppTest
+    import table_stream
+
+    renders = 0
+    should_render = table_stream.RenderThrottle.should_render
+
+    def counting_should_render(self, new_rows):
+        nonlocal renders
+        result = should_render(self, new_rows)
+        renders += result
+        return result
+
+    table_stream.RenderThrottle.should_render = counting_should_render
+    app_test = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=600)
+    app_test.run()
+    failed = 0
+    cpu_start, start = time.process_time(), time.perf_counter()
+    for text in texts:
+        app_test.chat_input[0].set_value(f"PQRS: {text}").run()
+        failed += bool(app_test.error) or bool(app_test.exception)
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    table_stream.RenderThrottle.should_render = should_render
+    return elapsed, cpu, failed, {'renders_per_response': renders / len(texts)}
+
+
+def run_batch(texts, workers, max_retries):
+    import batch_classify
+    from llm_client import get_chat_model
+
+    class NullWriter:
+        def write(self, row):
+            pass
+
+    class NullCheckpoint:
+        rows = {}
+
+        def record(self, row):
+            pass
+
+    rows = []
+    chat_model = get_chat_model("gpt-4o", 0.3, max_retries=0)
+    items = [(str(i), text) for i, text in enumerate(texts)]
+    cpu_start, start = time.process_time(), time.perf_counter()
+    asyncio.run(batch_classify.run_batch(items, chat_model, NullWriter(), NullCheckpoint(), workers, max_retries,
+                                         on_row=rows.append))
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    failed = sum(row['status'] == 'error' for row in rows)
+    return elapsed, cpu, failed, {}
+
+
+def run_scenario(args):
+    """Child process: run one scenario and print its result as JSON."""
+    texts = pqrs_texts(args.requests)
+    if args.run_scenario == 'app':
+        elapsed, cpu, failed, extra = run_app(texts)
+    else:
+        elapsed, cpu, failed, extra = run_batch(texts, args.workers, args.max_retries)
+    print(json.dumps({
+        'requests': len(texts),
+        'failed': failed,
+        'seconds': round(elapsed, 3),
+        'requests_per_s': round(len(texts) / elapsed, 2),
+        'cpu_ms_per_request': round(cpu * 1000 / len(texts), 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        **extra,
+    }))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline.get('commit')})")
+    for scenario, metrics in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(scenario, {})
+        for name, value in metrics.items():
+            old = before.get(name)
+            if not isinstance(value, (int, float)) or not old:
+                continue
+            change = (value - old) / old * 100
+            better = change > 0 if name in HIGHER_IS_BETTER else change < 0
+            marker = '' if abs(change) < 5 else ('  better' if better else '  WORSE')
+            print(f"  {scenario:<6} {name:<22} {old:>10} -> {value:<10} {change:+6.1f}%{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--requests', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--token-delay', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--failure-status', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Result file (default benchmarks/results/replay-<commit>.json)")
+    parser.add_argument('--compare', help="Earlier result file to compare against")
+    parser.add_argument('--run-scenario', choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        run_scenario(args)
+        return
+
+    commit = git_commit()
+    results = {'commit': commit, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'config': {
+        name: getattr(args, name)
+        for name in ('requests', 'workers', 'max_retries', 'token_delay', 'failure_rate', 'failure_status', 'seed')
+    }, 'scenarios': {}}
+    mock, base_url = start_mock(args)
+    try:
+        for scenario in args.scenarios:
+            # Every file the scenario writes or reads goes to its own directory, not .cache/
+            scratch = tempfile.mkdtemp()
+            env = dict(os.environ, OPENAI_API_KEY='mock', OPENAI_BASE_URL=base_url,
+                       PQRS_CACHE_PATH=os.path.join(scratch, 'cache.sqlite3'),
+                       PQRS_METRICS_PATH=os.path.join(scratch, 'metrics.jsonl'),
+                       PQRS_STORE_PATH=os.path.join(scratch, 'records.sqlite3'),
+                       PQRS_CLASSIFIER_PATH=os.path.join(scratch, 'classifier.npz'))
+            child = subprocess.run(
+                [sys.executable, __file__, '--run-scenario', scenario] + sys.argv[1:],
+                env=env, cwd=ROOT, capture_output=True, text=True,
+            )
+            if child.returncode != 0:
+                sys.exit(f"{scenario} failed:\n{child.stderr[-2000:]}")
+            results['scenarios'][scenario] = json.loads(child.stdout.strip().splitlines()[-1])
+            print(f"{scenario:<6} {results['scenarios'][scenario]}")
+    finally:
+        mock.terminate()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"replay-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
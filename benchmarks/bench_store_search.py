@@ -0,0 +1,176 @@
+"""Load benchmark of the PQRS store's indexed search with synthetic records.
+
+Fills a fresh store with --records synthetic classified PQRS through
+RecordStore.append (so through the background writer, reported as rows/s),
+then times the searches the panel runs: each filter alone, the
+"Soacha, DRSOA, last month" combination, full-text words (rare, common
+and combined with a filter), the next page and a page deep into the
+results, and the capped counts. Every query runs --runs times; p50 and
+p95 are reported and the run fails when a p95 exceeds --budget-ms.
+
+    python benchmarks/bench_store_search.py [--records 1000000] [--budget-ms 50]
+    python benchmarks/bench_store_search.py --store /tmp/pqrs_1m.sqlite3 --keep   # reuse on the next run
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from pqrs_record import ENUMS
+from pqrs_store import DIRECCION_TITLES, RecordStore, SearchFilters
+from regional_index import MUNICIPIOS, REGIONALES
+
+NOMBRES = ["María", "José", "Luis", "Ana", "Carlos", "Diana", "Jorge", "Sandra", "Andrés", "Paola", "Édgar", "Lucía"]
+APELLIDOS = ["Rodríguez", "Gómez", "Martínez", "López", "Díaz", "Pérez", "Sánchez", "Ramírez", "Torres", "Peña"]
+ASUNTOS = [
+    ("Queja por olores ofensivos de {}", "olores planta porcícola vecinos ofensivos"),
+    ("Solicitud de copia del expediente de concesión de aguas en {}", "expediente concesión aguas superficiales copia"),
+    ("Denuncia por tala de árboles en {}", "tala árboles bosque nativo motosierra"),
+    ("Queja por vertimientos al río en {}", "vertimientos río quebrada aguas residuales"),
+    ("Solicitud de permiso de aprovechamiento forestal en {}", "permiso aprovechamiento forestal guadua"),
+    ("Denuncia por minería ilegal en {}", "minería extracción arena volquetas"),
+    ("Queja por ruido de establecimiento en {}", "ruido música discoteca noche"),
+    ("Petición de visita técnica por humedal en {}", "humedal relleno escombros visita técnica"),
+]
+FILLER = ("la comunidad solicita a la Corporación atender la situación que afecta el predio y la vereda desde hace "
+          "varios meses sin respuesta de las autoridades municipales").split()
+
+
+def synthetic_records(count, seed=0):
+    """(values, texto) pairs spread over three years, every municipio and Tipo de Tramite.
+
+    Records arrive in date order, but each oficio is dated up to three weeks
+    before it is classified; one in ten has two Tipo de Tramite options.
+    """
+    rng = random.Random(seed)
+    places = [(municipio, code) for code, municipios in MUNICIPIOS.items() for municipio in municipios]
+    central = [code for code in DIRECCION_TITLES if code not in REGIONALES]
+    tramites = ENUMS["tipo_tramite"]
+    first_day = date.today() - timedelta(days=3 * 365)
+    for i in range(count):
+        municipio, regional = rng.choice(places)
+        asunto, words = rng.choice(ASUNTOS)
+        nombre = f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+        cedula = f"{rng.randrange(1_000_000, 99_999_999):,}".replace(",", ".")
+        direccion = regional if rng.random() < 0.8 else rng.choice(central)
+        fecha = first_day + timedelta(days=i * 3 * 365 // count - rng.randrange(21))
+        texto = " ".join([asunto.format(municipio), words, *rng.sample(FILLER, 12), f"C.C. {cedula}", nombre,
+                          f"caso {i}"])
+        yield {
+            "Nombre": nombre,
+            "Cédula": cedula,
+            "Municipio": municipio,
+            "Asunto": asunto.format(municipio),
+            "Dirección Asignada": f"{direccion} - {DIRECCION_TITLES[direccion]}",
+            "Tipo de Tramite": ", ".join(rng.sample(tramites, 2 if rng.random() < 0.1 else 1)),
+            "Fecha": fecha.isoformat(),
+            "Observaciones": "Atención preferencial" if rng.random() < 0.05 else "",
+        }, texto
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def timed(call, runs):
+    call()  # warm the page cache
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = call()
+        times.append((time.perf_counter() - start) * 1000)
+    return times, result
+
+
+def deep_page(store, filters, pages):
+    """Follow `pages` pages of results; return the last one."""
+    rows, before = [], None
+    for _ in range(pages):
+        rows = store.search(filters, before)
+        if not rows:
+            break
+        before = rows[-1][0]
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=1_000_000)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    parser.add_argument('--store', help="Store path (default: a temporary file)")
+    parser.add_argument('--keep', action='store_true', help="Keep the store, and reuse it if it is already full")
+    args = parser.parse_args()
+
+    path = args.store or os.path.join(tempfile.mkdtemp(), 'pqrs_records.sqlite3')
+    store = RecordStore(path)
+    stored = store.count()
+    if stored < args.records:
+        start = time.perf_counter()
+        for values, texto in synthetic_records(args.records - stored, seed=stored):
+            store.append(values, texto, session="bench", source="bench")
+        store.flush()
+        seconds = time.perf_counter() - start
+        print(f"wrote {args.records - stored} records in {seconds:.1f} s "
+              f"({(args.records - stored) / seconds:,.0f} rows/s through the background writer)")
+    stored = store.count()
+    print(f"{stored} records, {os.path.getsize(path) / 2**20:,.0f} MB")
+
+    last_month = date.today() - timedelta(days=30)
+    year_ago = date.today() - timedelta(days=365)
+    sample = store.search(SearchFilters(municipio="Soacha"), limit=1)[0]
+    cedula = sample[3]
+    common = SearchFilters(direccion="DRSOA")
+    first_page = store.search(common)
+    queries = [
+        ("cédula", lambda: store.search(SearchFilters(cedula=cedula.replace(".", "")))),
+        ("municipio", lambda: store.search(SearchFilters(municipio="soacha"))),
+        ("dirección", lambda: store.search(common)),
+        ("tipo de trámite", lambda: store.search(SearchFilters(tramite=ENUMS["tipo_tramite"][3]))),
+        ("fecha (último mes)", lambda: store.search(SearchFilters(desde=last_month))),
+        ("Soacha + DRSOA + último mes", lambda: store.search(
+            SearchFilters(municipio="Soacha", direccion="DRSOA", desde=last_month))),
+        ("municipio + mes de hace un año", lambda: store.search(
+            SearchFilters(municipio="Soacha", desde=year_ago, hasta=year_ago + timedelta(days=30)))),
+        ("texto poco común", lambda: store.search(SearchFilters(texto=f"caso {stored // 2}"))),
+        ("texto común", lambda: store.search(SearchFilters(texto="comunidad"))),
+        ("texto + municipio", lambda: store.search(SearchFilters(texto="olores", municipio="Chocontá"))),
+        ("texto + tipo de trámite", lambda: store.search(
+            SearchFilters(texto="comunidad", tramite=ENUMS["tipo_tramite"][3]))),
+        ("texto + fecha antigua", lambda: store.search(
+            SearchFilters(texto="minería", hasta=date.today() - timedelta(days=2 * 365)))),
+        ("página siguiente", lambda: store.search(common, first_page[-1][0])),
+        ("página 100", lambda: deep_page(store, SearchFilters(texto="comunidad"), 100)),
+        ("conteo municipio", lambda: store.search_count(SearchFilters(municipio="Soacha"))),
+        ("conteo texto común", lambda: store.search_count(SearchFilters(texto="comunidad"))),
+    ]
+    failures = []
+    for name, call in queries:
+        times, result = timed(call, args.runs)
+        rows = result if isinstance(result, int) else len(result)
+        p50, p95 = percentile(times, 0.5), percentile(times, 0.95)
+        print(f"{name:<30} {rows:6d} {'filas' if not isinstance(result, int) else ''}"
+              f"{'':<5} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+        # A deep page is the sum of its pages
+        budget = args.budget_ms * (100 if name == "página 100" else 1)
+        if p95 > budget:
+            failures.append(f"{name}: p95 {p95:.1f} ms over {budget:.0f} ms")
+    if not args.keep:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
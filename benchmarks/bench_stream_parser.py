@@ -0,0 +1,91 @@
+"""Micro-benchmark: incremental table parsing vs. per-token full re-render.
+
+Replays the recorded token streams in data/recorded_streams.jsonl through
+the legacy path (regex + DataFrame + Styler on every token) and through
+TableStreamParser + RenderThrottle, and reports time and render counts.
+
+    python benchmarks/bench_stream_parser.py [--repeat 20]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pandas as pd
+
+from table_stream import TableStreamParser, RenderThrottle
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'recorded_streams.jsonl')
+
+
+def load_streams(path=DATA_FILE):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_frame(rows):
+    """Stand-in for the Streamlit render: DataFrame + Styler."""
+    df = pd.DataFrame(rows, columns=['Campo', 'Valor'])
+    return df.style.set_properties(**{'background-color': '#f0f2f6'})
+
+
+def legacy_path(tokens):
+    """What StreamHandler used to do: re-parse the whole text on every token."""
+    text = ""
+    renders = 0
+    for token in tokens:
+        text += token
+        if '|' in text:
+            table_rows = re.findall(r'\|.*\|', text)
+            data = []
+            for row in table_rows[2:]:
+                values = [col.strip() for col in row.split('|')[1:-1]]
+                if len(values) == 2:
+                    data.append(values)
+            build_frame(data)
+        renders += 1
+    return renders
+
+
+def incremental_path(tokens, clock=time.monotonic):
+    parser = TableStreamParser()
+    throttle = RenderThrottle(clock=clock)
+    renders = 0
+    for token in tokens:
+        new_rows = parser.feed(token)
+        if throttle.should_render(len(new_rows)):
+            if parser.has_table:
+                build_frame(parser.rows)
+            renders += 1
+    parser.close()
+    build_frame(parser.rows)
+    return renders + 1
+
+
+def timed(fn, tokens, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        renders = fn(tokens)
+    return (time.perf_counter() - start) / repeat, renders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'stream':<24}{'tokens':>8}{'legacy ms':>12}{'renders':>9}{'incr ms':>10}{'renders':>9}{'speedup':>9}")
+    for stream in load_streams():
+        tokens = stream['tokens']
+        legacy_s, legacy_renders = timed(legacy_path, tokens, args.repeat)
+        incr_s, incr_renders = timed(incremental_path, tokens, args.repeat)
+        print(f"{stream['name']:<24}{len(tokens):>8}{legacy_s * 1000:>12.2f}{legacy_renders:>9}"
+              f"{incr_s * 1000:>10.2f}{incr_renders:>9}{legacy_s / incr_s:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Check that app.py starts without the heavy imports, within an import-time budget.
+
+1. Runs `python -X importtime -c "import app"` in a fresh interpreter and
+   fails when the cumulative import time exceeds --budget-ms or when a
+   deferred module (LangChain, OpenAI, pandas, NumPy) is imported.
+2. Runs the first render of the app with streamlit.testing's AppTest in a
+   fresh interpreter and fails unless the logo, title and chat input are
+   shown with none of the deferred modules loaded.
+3. Reports what the deferred modules cost when the first PQRS is
+   classified, for comparison.
+
+Exits non-zero on any violation. The import time is the best of --runs.
+
+    python benchmarks/check_import_budget.py [--budget-ms 1000] [--runs 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+# Top-level packages that must only load on the first classification
+DEFERRED = ['langchain', 'langchain_core', 'langchain_openai', 'openai', 'pandas', 'numpy', 'pyarrow', 'pypdf']
+FIRST_CLASSIFICATION = 'import chat_rendering, llm_client, metrics_callback, pqrs_pipeline, context_window'
+RENDER_CODE = '''
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=60).run()
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "exception": [str(e.value) for e in at.exception],
+    "title": [t.value for t in at.title],
+    "logo": any("<img" in str(m.value) for m in at.markdown),
+    "chat_input": len(at.chat_input),
+    "modules": sorted({m.split(".")[0] for m in sys.modules}),
+}))
+'''
+
+
+def child_env():
+    # A placeholder key, so the app renders instead of stopping at the key check
+    return dict(os.environ, OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'sk-import-budget'))
+
+
+def import_profile(code):
+    """[(depth, module, cumulative seconds)] for every module `code` imports in a fresh interpreter."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=child_env(),
+                            capture_output=True, text=True, check=True)
+    profile = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented two spaces per level below their parent
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        profile.append((depth, name.strip(), int(cumulative) / 1e6))
+    return profile
+
+
+def total_seconds(profile):
+    return sum(seconds for depth, _, seconds in profile if depth == 0)
+
+
+def deferred_loaded(names):
+    return sorted({name.split('.')[0] for name in names} & set(DEFERRED))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=1000.0)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+    failures = []
+
+    profile = min((import_profile('import app') for _ in range(args.runs)), key=total_seconds)
+    total_ms = total_seconds(profile) * 1000
+    print(f"import app: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms), {len(profile)} modules")
+    # What app.py itself imports, slowest first
+    for _, name, seconds in sorted((entry for entry in profile if entry[0] == 1), key=lambda entry: -entry[2])[:5]:
+        print(f"  {name:<28} {seconds * 1000:7.1f} ms")
+    if total_ms > args.budget_ms:
+        failures.append(f"import app took {total_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    loaded = deferred_loaded(name for _, name, _ in profile)
+    if loaded:
+        failures.append(f"import app loads deferred modules: {', '.join(loaded)}")
+
+    result = subprocess.run([sys.executable, '-c', RENDER_CODE], cwd=ROOT, env=child_env(),
+                            capture_output=True, text=True, check=True)
+    render = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f"first render: {render['seconds'] * 1000:.0f} ms, title {render['title']}, "
+          f"logo {'yes' if render['logo'] else 'no'}, chat input {'yes' if render['chat_input'] else 'no'}")
+    if render['exception']:
+        failures.append(f"first render raised: {render['exception']}")
+    if not (render['title'] and render['logo'] and render['chat_input']):
+        failures.append("first render is missing the logo, the title or the chat input")
+    loaded = deferred_loaded(render['modules'])
+    if loaded:
+        failures.append(f"first render loads deferred modules: {', '.join(loaded)}")
+
+    deferred_ms = total_seconds(import_profile(FIRST_CLASSIFICATION)) * 1000
+    print(f"deferred to the first classification: {deferred_ms:.0f} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Check that the static prompt prefix is byte-identical everywhere, and how much of it caches.
+
+1. Builds prompt_assembly.STATIC_PROMPT in this process and in several
+   fresh interpreters (different PYTHONHASHSEED, working directory and
+   PQRS_* settings) and fails unless every copy has the same SHA-256.
+2. Reports the shared prefix of the retrieval-mode prompts over
+   data/labelled_pqrs.jsonl, i.e. what a provider cache can reuse there.
+3. With --mock, classifies the labelled PQRS against the local mock
+   server and reports the cached_tokens that call_metrics records.
+
+Exits non-zero when the prefix is not stable.
+
+    python benchmarks/check_prompt_prefix.py [--processes 4] [--mock]
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+import prompt_assembly
+import prompt_retrieval
+from context_window import count_tokens
+
+PQRS_FILE = os.path.join(BENCH_DIR, 'data', 'labelled_pqrs.jsonl')
+CHILD_CODE = (
+    "import hashlib, sys; sys.path.insert(0, sys.argv[1]); import prompt_assembly; "
+    "print(hashlib.sha256(prompt_assembly.STATIC_PROMPT.encode('utf-8')).hexdigest())"
+)
+
+
+def digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def child_digests(processes):
+    digests = []
+    for i in range(processes):
+        env = dict(os.environ, PYTHONHASHSEED=str(i + 1), PQRS_PROMPT_MODE=('retrieval' if i % 2 else 'full'),
+                   PQRS_OUTPUT_MODE=('json' if i % 2 else 'markdown'))
+        result = subprocess.run([sys.executable, '-c', CHILD_CODE, ROOT], env=env, cwd=tempfile.gettempdir(),
+                                capture_output=True, text=True, check=True)
+        digests.append(result.stdout.strip())
+    return digests
+
+
+def mock_run(texts):
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    from call_metrics import MetricsSink
+    from llm_client import get_chat_model
+    from metrics_callback import MetricsCallback
+    from mock_openai import MockOpenAIServer
+
+    server = MockOpenAIServer().start()
+    sink = MetricsSink(path=None, prometheus_path=None)
+    chat_model = get_chat_model("gpt-4o", api_key="mock", base_url=server.base_url)
+    for mode in ("full", "retrieval"):
+        before = (sink.prompt_tokens, sink.cached_tokens)
+        for text in texts:
+            system_prompt = prompt_assembly.STATIC_PROMPT if mode == "full" else prompt_retrieval.build_slim_prompt(text)
+            messages = [SystemMessage(content=system_prompt), HumanMessage(content=f"PQRS: {text}")]
+            chat_model.invoke(messages, config={"callbacks": [MetricsCallback(sink, "check", "gpt-4o")]})
+        prompt, cached = sink.prompt_tokens - before[0], sink.cached_tokens - before[1]
+        print(f"mock {mode:<9} prompt tokens {prompt:>6}, cached {cached:>6} ({cached / prompt:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--mock', action='store_true', help="Also measure cached_tokens against the mock server")
+    args = parser.parse_args()
+
+    expected = digest(prompt_assembly.STATIC_PROMPT)
+    digests = child_digests(args.processes)
+    stable = all(d == expected for d in digests)
+    print(f"{prompt_assembly.PROMPT_ID}: {len(prompt_assembly.STATIC_PROMPT.encode('utf-8'))} bytes, "
+          f"{count_tokens(prompt_assembly.STATIC_PROMPT)} tokens")
+    print(f"byte-identical in {args.processes} fresh processes: {'yes' if stable else 'NO'}")
+
+    with open(PQRS_FILE, encoding='utf-8') as f:
+        texts = [json.loads(line)['texto'] for line in f if line.strip()]
+    slim = [prompt_retrieval.build_slim_prompt(text) for text in texts]
+    shared = os.path.commonprefix(slim)
+    print(f"retrieval mode: shared prefix {count_tokens(shared)} of {count_tokens(slim[0])} tokens")
+    if args.mock:
+        mock_run(texts)
+    sys.exit(0 if stable else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""Local OpenAI-compatible mock server for benchmarks.
+
+Serves POST /v1/chat/completions (streaming and non-streaming) by replaying
+the recorded answers in data/recorded_streams.jsonl token by token.
+`connect_delay` emulates TLS/connection setup cost on every new connection,
+so pooled and unpooled clients can be compared locally (`connections`
+counts the connections accepted). Usage reports
+`cached_tokens` like OpenAI's prompt cache: the longest prefix shared
+with an earlier request, from 1024 tokens in 128-token steps (tokens
+estimated as four characters). `failure_rate`
+answers that share of requests with `failure_status` instead, drawn from
+a seeded generator so runs are reproducible. `rpm` enforces a requests
+per minute limit like OpenAI's: a token bucket reported in x-ratelimit-*
+headers on every response, with 429s and retry-after-ms once it is empty.
+
+    python benchmarks/mock_openai.py --port 8765 --connect-delay 0.1
+    python benchmarks/mock_openai.py --failure-rate 0.1 --failure-status 429
+    python benchmarks/mock_openai.py --rpm 60
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), 'data', 'recorded_streams.jsonl')
+
+
+def load_responses(path=DATA_FILE):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['tokens'] for line in f if line.strip()]
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Small SSE writes on a kept-alive connection would otherwise wait on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.connect_delay)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        tokens = next(self.server.responses)
+        self.server.requests += 1
+        limited, headers = self.server.take_request()
+        if limited:
+            self._fail(429, headers)
+        elif self.server.should_fail():
+            self._fail(self.server.failure_status)
+        elif request.get('stream'):
+            self._stream(request, tokens, headers)
+        else:
+            self._complete(request, tokens, headers)
+
+    def _send_headers(self, headers):
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def _fail(self, status, headers=None):
+        body = json.dumps({'error': {'message': 'Injected failure', 'type': 'mock_error', 'code': status}}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 429 and not headers:
+            self.send_header('Retry-After', '0')
+        self._send_headers(headers)
+        self.wfile.write(body)
+
+    def _chunk(self, request, delta, finish_reason=None):
+        return {
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+        }
+
+    def _write_chunk(self, payload, last=False):
+        data = f"data: {payload}\n\n".encode()
+        # The terminator goes out with the last event: clients stop reading at
+        # [DONE] and only pool the connection if the body is already complete
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n" + (b"0\r\n\r\n" if last else b""))
+        self.wfile.flush()
+
+    def _usage(self, request, tokens):
+        # Rough prompt size (about four characters per token)
+        prompt = "".join(str(m.get('content', '')) for m in request.get('messages', []))
+        prompt_tokens = len(prompt) // 4
+        return {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                'total_tokens': prompt_tokens + len(tokens),
+                'prompt_tokens_details': {'cached_tokens': self.server.cached_tokens(prompt)}}
+
+    def _stream(self, request, tokens, headers=None):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self._send_headers(headers)
+        self._write_chunk(json.dumps(self._chunk(request, {'role': 'assistant', 'content': ''})))
+        for token in tokens:
+            time.sleep(self.server.token_delay)
+            self._write_chunk(json.dumps(self._chunk(request, {'content': token})))
+        self._write_chunk(json.dumps(self._chunk(request, {}, 'stop')))
+        if request.get('stream_options', {}).get('include_usage'):
+            usage = self._chunk(request, {})
+            usage['choices'] = []
+            usage['usage'] = self._usage(request, tokens)
+            self._write_chunk(json.dumps(usage))
+        self._write_chunk('[DONE]', last=True)
+
+    def _complete(self, request, tokens, headers=None):
+        body = json.dumps({
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                'finish_reason': 'stop',
+            }],
+            'usage': self._usage(request, tokens),
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self._send_headers(headers)
+        self.wfile.write(body)
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, connect_delay=0.0, token_delay=0.0, responses=None,
+                 failure_rate=0.0, failure_status=500, seed=0, rpm=0):
+        super().__init__(('127.0.0.1', port), MockOpenAIHandler)
+        self.connect_delay = connect_delay
+        self.token_delay = token_delay
+        self.responses = itertools.cycle(responses or load_responses())
+        self.requests = 0
+        self.connections = 0
+        self.failures = 0
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.prompts = []
+        self.rpm = rpm
+        self.level = rpm
+        self.updated = time.monotonic()
+        self.rate_limited = 0
+
+    def cached_tokens(self, prompt):
+        with self.lock:
+            shared = max((len(os.path.commonprefix([prompt, seen])) for seen in self.prompts), default=0)
+            self.prompts = (self.prompts + [prompt])[-64:]
+        tokens = shared // 4
+        return tokens // 128 * 128 if tokens >= 1024 else 0
+
+    def take_request(self):
+        """(over the --rpm limit, x-ratelimit headers) for one request; (False, {}) without a limit."""
+        if not self.rpm:
+            return False, {}
+        with self.lock:
+            now = time.monotonic()
+            self.level = min(self.rpm, self.level + (now - self.updated) * self.rpm / 60)
+            self.updated = now
+            limited = self.level < 1
+            if limited:
+                self.rate_limited += 1
+            else:
+                self.level -= 1
+            headers = {
+                'x-ratelimit-limit-requests': str(self.rpm),
+                'x-ratelimit-remaining-requests': str(int(self.level)),
+                'x-ratelimit-reset-requests': f"{(self.rpm - self.level) * 60 / self.rpm:.3f}s",
+            }
+            if limited:
+                headers['retry-after-ms'] = str(int((1 - self.level) * 60000 / self.rpm))
+        return limited, headers
+
+    def should_fail(self):
+        with self.lock:
+            failed = self.failure_rate > 0 and self.rng.random() < self.failure_rate
+            self.failures += failed
+            return failed
+
+    def handle_error(self, request, client_address):
+        # Clients dropping pooled keep-alive connections is expected
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--connect-delay', type=float, default=0.0)
+    parser.add_argument('--token-delay', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--failure-status', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rpm', type=int, default=0, help="Requests per minute before answering 429")
+    args = parser.parse_args()
+    server = MockOpenAIServer(args.port, args.connect_delay, args.token_delay, failure_rate=args.failure_rate,
+                              failure_status=args.failure_status, seed=args.seed, rpm=args.rpm)
+    print(f"Serving on {server.base_url}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Per-call latency and token metrics for every model request.
+
+MetricsCallback (metrics_callback.py) is passed next to StreamHandler in
+the `config` of each call. It measures time to first token, total
+latency, tokens per second and the prompt, cached-prompt and completion
+token counts OpenAI reports, and hands one event per request to a
+MetricsSink. The sink appends events to a size-rotated JSONL file, keeps
+a window of recent latencies for p50/p95 and, when PQRS_METRICS_PROM_PATH
+is set, rewrites a Prometheus text file (node_exporter textfile collector
+format) after every event. It imports neither LangChain nor NumPy, so the
+app can show its sidebar metrics before either is loaded. Calls made by
+the model cascade carry their tier ("small" or "large"), which gets its own
+latency window, and each rejected small-model answer is an "escalated"
+event.
+
+    python call_metrics.py            # print the Prometheus text
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+METRICS_PATH = os.getenv("PQRS_METRICS_PATH", os.path.join(".cache", "pqrs_metrics.jsonl"))
+METRICS_MAX_BYTES = int(os.getenv("PQRS_METRICS_MAX_BYTES", str(5 * 1024 * 1024)))
+METRICS_BACKUPS = int(os.getenv("PQRS_METRICS_BACKUPS", "3"))
+PROMETHEUS_PATH = os.getenv("PQRS_METRICS_PROM_PATH")
+# Number of recent calls the percentiles are computed over
+WINDOW = int(os.getenv("PQRS_METRICS_WINDOW", "1000"))
+
+QUANTILES = (0.5, 0.95)
+
+
+def _quantile(ordered, q):
+    """Linearly interpolated quantile of sorted values (numpy.percentile's default)."""
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class MetricsSink:
+    def __init__(self, path=METRICS_PATH, max_bytes=METRICS_MAX_BYTES, backups=METRICS_BACKUPS,
+                 prometheus_path=PROMETHEUS_PATH, window=WINDOW):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.prometheus_path = prometheus_path
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.ttfts = deque(maxlen=window)
+        self.counts = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.retries = 0
+        self.tier_latencies = {}
+        self.small_pqrs = 0
+        self.escalations = 0
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def record(self, event):
+        """Store one call event ({"status": "ok" | "error" | "cache_hit", ...})."""
+        event = {"ts": round(time.time(), 3), **event}
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self.lock:
+            status = event["status"]
+            self.counts[status] = self.counts.get(status, 0) + 1
+            self.prompt_tokens += event.get("prompt_tokens") or 0
+            self.completion_tokens += event.get("completion_tokens") or 0
+            self.cached_tokens += event.get("cached_tokens") or 0
+            self.retries += event.get("retries") or 0
+            if status == "ok":
+                self.latencies.append(event["latency"])
+                if event.get("ttft") is not None:
+                    self.ttfts.append(event["ttft"])
+                if event.get("tier"):
+                    window = self.tier_latencies.setdefault(event["tier"], deque(maxlen=self.latencies.maxlen))
+                    window.append(event["latency"])
+                    self.small_pqrs += event["tier"] == "small" and bool(event.get("pqrs"))
+            elif status == "escalated":
+                self.escalations += 1
+            if self.path:
+                self._rotate(len(line.encode("utf-8")))
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+        if self.prometheus_path:
+            self._write_prometheus()
+
+    def _rotate(self, incoming):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size + incoming <= self.max_bytes:
+            return
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def cached_share(self):
+        """Share of prompt tokens served from the provider's prompt cache (None before any call)."""
+        with self.lock:
+            return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else None
+
+    def escalation_rate(self):
+        """Share of small-model PQRS answers re-run on the large model (None before any)."""
+        with self.lock:
+            return self.escalations / self.small_pqrs if self.small_pqrs else None
+
+    def tier_percentiles(self):
+        """{tier: {0.5: s, 0.95: s}} latency over each tier's recent calls."""
+        with self.lock:
+            series = {tier: sorted(values) for tier, values in self.tier_latencies.items()}
+        return {tier: {q: _quantile(values, q) for q in QUANTILES} for tier, values in series.items() if values}
+
+    def percentiles(self):
+        """{"latency": {0.5: s, 0.95: s}, "ttft": {...}} over the recent window (None when empty)."""
+        with self.lock:
+            series = {"latency": list(self.latencies), "ttft": list(self.ttfts)}
+        result = {}
+        for name, values in series.items():
+            values.sort()
+            result[name] = {q: _quantile(values, q) if values else None for q in QUANTILES}
+        return result
+
+    def prometheus_text(self):
+        with self.lock:
+            counts = dict(self.counts)
+            tokens = {"prompt": self.prompt_tokens, "cached": self.cached_tokens,
+                      "completion": self.completion_tokens}
+            retries = self.retries
+            escalations = self.escalations
+            windows = {"latency": list(self.latencies), "ttft": list(self.ttfts)}
+        percentiles = self.percentiles()
+        lines = [
+            "# HELP pqrs_llm_requests_total Model requests by outcome.",
+            "# TYPE pqrs_llm_requests_total counter",
+        ]
+        lines += [f'pqrs_llm_requests_total{{status="{status}"}} {count}' for status, count in sorted(counts.items())]
+        lines += [
+            "# HELP pqrs_llm_tokens_total Tokens reported by the API.",
+            "# TYPE pqrs_llm_tokens_total counter",
+        ]
+        lines += [f'pqrs_llm_tokens_total{{kind="{kind}"}} {count}' for kind, count in tokens.items()]
+        lines += [
+            "# HELP pqrs_llm_retries_total Retried model requests.",
+            "# TYPE pqrs_llm_retries_total counter",
+            f"pqrs_llm_retries_total {retries}",
+            "# HELP pqrs_llm_escalations_total Small-model PQRS answers re-run on the large model.",
+            "# TYPE pqrs_llm_escalations_total counter",
+            f"pqrs_llm_escalations_total {escalations}",
+        ]
+        for name, help_text in (("latency", "Total request latency"), ("ttft", "Time to first token")):
+            metric = f"pqrs_llm_{name}_seconds"
+            lines += [f"# HELP {metric} {help_text}, over the recent window.", f"# TYPE {metric} summary"]
+            for quantile, value in percentiles[name].items():
+                if value is not None:
+                    lines.append(f'{metric}{{quantile="{quantile}"}} {value:.6f}')
+            lines.append(f"{metric}_sum {sum(windows[name]):.6f}")
+            lines.append(f"{metric}_count {len(windows[name])}")
+        lines += [
+            "# HELP pqrs_llm_tier_latency_seconds Request latency per cascade tier, over the recent window.",
+            "# TYPE pqrs_llm_tier_latency_seconds gauge",
+        ]
+        for tier, points in sorted(self.tier_percentiles().items()):
+            lines += [f'pqrs_llm_tier_latency_seconds{{tier="{tier}",quantile="{q}"}} {value:.6f}'
+                      for q, value in points.items()]
+        return "\n".join(lines) + "\n"
+
+    def _write_prometheus(self):
+        text = self.prometheus_text()
+        # Written aside and renamed, so a scrape never sees a partial file
+        tmp_path = f"{self.prometheus_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.prometheus_path)
+
+
+def model_name(chat_model):
+    """Model name of a chat model or of a model wrapped by .bind()."""
+    bound = getattr(chat_model, "bound", chat_model)
+    return getattr(bound, "model_name", None) or type(bound).__name__
+
+
+def record_cache_hit(sink, source, model, latency, **fields):
+    sink.record({"source": source, "model": model, "status": "cache_hit", "latency": round(latency, 4), **fields})
+
+
+def record_local_answer(sink, source, latency, **fields):
+    """A PQRS the local pre-classifier answered without calling the model."""
+    sink.record({"source": source, "model": "pqrs_classifier", "status": "local", "latency": round(latency, 4),
+                 **fields})
+
+
+def record_escalation(sink, source, model, reason, **fields):
+    """A small-model PQRS answer the cascade rejected; the large model answers it next."""
+    sink.record({"source": source, "model": model, "status": "escalated", "reason": reason, **fields})
+
+
+if __name__ == "__main__":
+    sink = MetricsSink(prometheus_path=None)
+    if os.path.exists(METRICS_PATH):
+        # Rebuild the aggregates from the current JSONL file without re-appending
+        path, sink.path = sink.path, None
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    sink.record(json.loads(line))
+    print(sink.prometheus_text(), end="")
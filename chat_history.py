@@ -0,0 +1,75 @@
+"""Bounded chat history with responses parsed once, at append time.
+
+Every Streamlit rerun redraws the whole conversation. Storing each answer
+with its table rows already parsed means a rerun only has to draw them,
+and only the last RENDER_LAST messages are drawn as full tables: older
+ones collapse into expanders holding the raw markdown, which is far
+cheaper to send than a styled DataFrame. The history keeps at most
+MAX_MESSAGES entries; older ones are dropped and counted.
+"""
+import os
+from collections import deque, namedtuple
+
+from table_stream import TableStreamParser
+
+MAX_MESSAGES = int(os.getenv("PQRS_HISTORY_MAX_MESSAGES", "200"))
+RENDER_LAST = int(os.getenv("PQRS_HISTORY_RENDER_LAST", "6"))
+
+# rows is a list of (Campo, Valor) pairs, or None when the message has no table
+HistoryEntry = namedtuple("HistoryEntry", ["role", "content", "rows", "other_text"])
+
+
+def parse_entry(role, content):
+    if role != "assistant" or '|' not in content:
+        return HistoryEntry(role, content, None, "")
+    parser = TableStreamParser()
+    parser.feed(content)
+    parser.close()
+    if not parser.rows:
+        return HistoryEntry(role, content, None, "")
+    return HistoryEntry(role, content, [tuple(row) for row in parser.rows], parser.other_text)
+
+
+class ChatHistory:
+    def __init__(self, max_messages=MAX_MESSAGES):
+        self.entries = deque(maxlen=max_messages)
+        self.dropped = 0
+
+    def append(self, role, content):
+        if len(self.entries) == self.entries.maxlen:
+            self.dropped += 1
+        self.entries.append(parse_entry(role, content))
+
+    def clear(self):
+        self.entries.clear()
+        self.dropped = 0
+
+    def recent(self, count):
+        """The last `count` entries, oldest first."""
+        if count <= 0:
+            return []
+        return list(self.entries)[-count:]
+
+    def split(self, render_last=None):
+        """(collapsed, rendered): entries to show as expanders and as full messages."""
+        if render_last is None:
+            render_last = RENDER_LAST
+        entries = list(self.entries)
+        cut = max(len(entries) - render_last, 0)
+        return entries[:cut], entries[cut:]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+
+def summary(entry, width=80):
+    """One-line label for a collapsed entry."""
+    if entry.rows:
+        values = dict(entry.rows)
+        text = " · ".join(v for v in (values.get("Asunto"), values.get("Dirección Asignada")) if v)
+    else:
+        text = " ".join(entry.content.split())
+    return text if len(text) <= width else text[:width - 1] + "…"
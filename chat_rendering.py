@@ -0,0 +1,118 @@
+"""Streamlit rendering of PQRS answers: the styled table and the streaming handlers.
+
+Imported on the first classification rather than at app start-up: it
+loads pandas and LangChain, which dominate the app's cold start.
+"""
+import pandas as pd
+import streamlit as st
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+from pqrs_record import CAMPO_BY_FIELD, parse_partial_record
+from table_stream import RenderThrottle, TableStreamParser
+
+
+class StreamHandler(BaseCallbackHandler):
+    def __init__(self, container):
+        self.container = container
+        self.text = ""
+        self.parser = TableStreamParser()
+        self.throttle = RenderThrottle()
+        
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.text += token
+        # Only re-render when a table row completes or the throttle allows it
+        new_rows = self.parser.feed(token)
+        if self.throttle.should_render(len(new_rows)):
+            self.render()
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        self.parser.close()
+        self.render()
+
+    def render(self):
+        """Render the rows parsed so far into the placeholder."""
+        container = self.container.container()
+        if self.parser.has_table:
+            render_table(self.parser.rows, self.parser.other_text, container)
+        else:
+            container.markdown(self.text)
+
+
+class RecordStreamHandler(BaseCallbackHandler):
+    """Streams a structured (JSON) answer, filling the table field by field."""
+    def __init__(self, container):
+        self.container = container
+        self.text = ""
+        self.fields_seen = 0
+        self.throttle = RenderThrottle()
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.text += token
+        # A field is only rendered once the next one starts, so its value is
+        # complete; that needs a comma, and re-parsing the whole text on every
+        # other token would only find the same fields again
+        if "," not in token:
+            return
+        data = parse_partial_record(self.text)
+        completed = max(len(data) - 1, 0)
+        new_fields = completed - self.fields_seen
+        if new_fields > 0:
+            self.fields_seen = completed
+            if self.throttle.should_render(new_fields):
+                self.render(data, completed)
+
+    def render(self, data, count):
+        rows = []
+        for name, value in list(data.items())[:count]:
+            if name in CAMPO_BY_FIELD:
+                value = ", ".join(value) if isinstance(value, list) else str(value)
+                rows.append((CAMPO_BY_FIELD[name], value))
+        render_table(rows, "", self.container.container())
+
+
+def render_table(rows, other_text, container):
+    """Render parsed (Campo, Valor) rows as a styled DataFrame."""
+    # Display any text before the table
+    if other_text:
+        container.markdown(other_text)
+    
+    # Display the DataFrame with enhanced styling
+    container.markdown("### Información PQRS")
+    df = pd.DataFrame(rows, columns=['Campo', 'Valor'])
+    
+    # Apply custom styling to the DataFrame
+    styled_df = df.style.set_properties(**{
+        'background-color': '#f0f2f6',
+        'color': '#1f1f1f',
+        'border': '2px solid #add8e6'
+    })
+    
+    # Display using st.dataframe with enhanced configuration
+    container.dataframe(
+        styled_df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "Campo": st.column_config.TextColumn(
+                "Campo",
+                help="Categoría de la información",
+                width="medium",
+            ),
+            "Valor": st.column_config.TextColumn(
+                "Valor",
+                help="Información proporcionada",
+                width="large",
+            )
+        }
+    )
+
+
+def display_response(response_text, container):
+    """Display the response using Streamlit components."""
+    parser = TableStreamParser()
+    parser.feed(response_text)
+    parser.close()
+    if parser.rows:
+        render_table(parser.rows, parser.other_text, container)
+    else:
+        container.markdown(response_text)
@@ -0,0 +1,85 @@
+"""Conversation context for follow-up turns, trimmed to a token budget.
+
+A fresh "PQRS:" classification is self-contained and gets no history, so
+its answer depends only on the PQRS text (which is also what the response
+cache assumes). Other turns get the previous messages in chronological
+order, newest kept first, until CONTEXT_TOKEN_BUDGET is spent. Earlier
+PQRS answers are sent as their key campos instead of the full table.
+
+Tokens are counted with tiktoken's o200k_base encoding (the gpt-4o
+tokenizer) when it is available offline, or estimated otherwise.
+"""
+import os
+import re
+from functools import lru_cache
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("PQRS_CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MAX_MESSAGES = int(os.getenv("PQRS_CONTEXT_MAX_MESSAGES", "4"))
+# Campos kept when an earlier PQRS answer is replayed as context
+KEY_CAMPOS = ["Asunto", "Municipio", "Dirección Asignada", "Tipo de Tramite", "Tipo de Respuesta"]
+# Per-message overhead of the chat format (role and separators)
+MESSAGE_OVERHEAD = 4
+
+_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # No tiktoken, or its encoding file cannot be downloaded
+        return None
+
+
+def count_tokens(text):
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Roughly one token per short word or symbol, more for long words
+    return sum(1 + len(piece) // 6 for piece in _PIECE_PATTERN.findall(text))
+
+
+def message_tokens(messages):
+    return sum(count_tokens(message.content) + MESSAGE_OVERHEAD for message in messages)
+
+
+def compress_entry(entry):
+    """Message content for a history entry; PQRS tables shrink to their key campos."""
+    if not entry.rows:
+        return entry.content
+    values = dict(entry.rows)
+    fields = [f"{campo}: {values[campo]}" for campo in KEY_CAMPOS if values.get(campo)]
+    return "Clasificación anterior — " + "; ".join(fields)
+
+
+def build_context(entries, is_pqrs=False, budget=None, max_messages=None):
+    """Chat messages for the previous `entries`, oldest first, within the token budget."""
+    if is_pqrs:
+        return []
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    max_messages = CONTEXT_MAX_MESSAGES if max_messages is None else max_messages
+    selected = []
+    spent = 0
+    for entry in reversed(list(entries)[-max_messages:] if max_messages > 0 else []):
+        content = compress_entry(entry)
+        cost = count_tokens(content) + MESSAGE_OVERHEAD
+        if spent + cost > budget:
+            break
+        spent += cost
+        selected.append(HumanMessage(content=content) if entry.role == "user" else AIMessage(content=content))
+    selected.reverse()
+    return selected
+
+
+def to_pairs(messages):
+    """(role, content) pairs for context messages, e.g. to queue them as JSON."""
+    return [("user" if isinstance(message, HumanMessage) else "assistant", message.content) for message in messages]
+
+
+def from_pairs(pairs):
+    return [HumanMessage(content=content) if role == "user" else AIMessage(content=content) for role, content in pairs]
@@ -0,0 +1,184 @@
+"""Rule-based pre-extraction of Cédula, Teléfono, Correo and Fecha.
+
+These fields are fully pattern-matchable, so they are pulled from the raw
+PQRS text with compiled regexes instead of being generated by the model.
+The model is told which rows are already filled and leaves them out, and
+merge_prefilled() writes them back into its table afterwards.
+"""
+import re
+import unicodedata
+
+PREFILLED_CAMPOS = ["Cédula", "Teléfono", "Correo", "Fecha"]
+
+MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+_MES = "|".join(MESES)
+
+# Patterns run on accent-free, lowercased text (same length as the original)
+CEDULA_PATTERN = re.compile(
+    r'\b(?:c\.?\s?c\.?|cedula(?:\s+de\s+ciudadania)?|nit|t\.?\s?i\.?|c\.?\s?e\.?|'
+    r'cedula\s+de\s+extranjeria|tarjeta\s+de\s+identidad|documento(?:\s+de\s+identidad)?)'
+    r'\s*(?:no\.?|n[°o]\.?|num\.?|numero|#|:)?\s*'
+    r'(\d{1,3}(?:[.,\s]?\d{3}){1,3}(?:\s?-\s?\d)?)\b'
+)
+NIT_PREFIX = re.compile(r'^nit\b')
+PHONE_PATTERN = re.compile(
+    r'(?<!\d)(?<!\d\.)(?:\+?\s?57[\s.-]?)?'
+    r'(3\d{2}[\s.-]?\d{3}[\s.-]?\d{4}|60[1-8][\s.-]?\d{3}[\s.-]?\d{4})(?!\d)(?!\.\d)'
+)
+LEGACY_PHONE_PATTERN = re.compile(
+    r'\b(?:tel(?:efono)?|tel\.|fijo|pbx)\.?\s*(?:no\.?|:)?\s*(?:\(?\d\)?\s?)?(\d{3}[\s.-]?\d{4})(?!\d)'
+)
+EMAIL_PATTERN = re.compile(r'[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,}')
+DATE_PATTERNS = [
+    # 12 de marzo de 2024 / 12 de marzo del 2024
+    (re.compile(rf'\b(\d{{1,2}})\s+de\s+({_MES})\s+(?:de|del)\s+(\d{{4}})\b'), "dmy_text"),
+    # marzo 12 de 2024
+    (re.compile(rf'\b({_MES})\s+(\d{{1,2}})\s*(?:de|del|,)\s*(\d{{4}})\b'), "mdy_text"),
+    # 2024-03-12
+    (re.compile(r'\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b'), "ymd"),
+    # 12/03/2024 (Colombian day-first)
+    (re.compile(r'\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})\b'), "dmy"),
+]
+DATE_CUE = re.compile(r'\bfecha\b')
+
+_DAYS_IN_MONTH = [31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+
+# One-to-one accent folding for Latin-1 and Latin Extended-A, so offsets are preserved
+_FOLD_TABLE = {
+    code: unicodedata.normalize("NFKD", chr(code))[0]
+    for code in range(0x80, 0x250)
+    if unicodedata.normalize("NFKD", chr(code))[0] != chr(code)
+}
+
+
+def fold(text):
+    """Lowercase, accent-free copy of `text` with the same character offsets."""
+    return text.lower().translate(_FOLD_TABLE)
+
+
+def _iso_date(year, month, day):
+    if not (1900 <= year <= 2100 and 1 <= month <= 12 and 1 <= day <= _DAYS_IN_MONTH[month - 1]):
+        return None
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def _parse_date(match, kind):
+    groups = match.groups()
+    if kind == "dmy_text":
+        return _iso_date(int(groups[2]), MESES[groups[1]], int(groups[0]))
+    if kind == "mdy_text":
+        return _iso_date(int(groups[2]), MESES[groups[0]], int(groups[1]))
+    if kind == "ymd":
+        return _iso_date(int(groups[0]), int(groups[1]), int(groups[2]))
+    return _iso_date(int(groups[2]), int(groups[1]), int(groups[0]))
+
+
+def extract_cedula(folded, original):
+    for match in CEDULA_PATTERN.finditer(folded):
+        number = original[match.start(1):match.end(1)].strip()
+        digits = re.sub(r'\D', '', number)
+        if NIT_PREFIX.match(folded[match.start():]) and len(digits) >= 9:
+            return f"NIT {number}", match.span(1)
+        if 6 <= len(digits) <= 10:
+            return number, match.span(1)
+    return None, None
+
+
+def extract_telefono(folded, original, skip=None):
+    for pattern in (PHONE_PATTERN, LEGACY_PHONE_PATTERN):
+        for match in pattern.finditer(folded):
+            if skip and match.start(1) < skip[1] and skip[0] < match.end(1):
+                continue
+            return original[match.start(1):match.end(1)].strip()
+    return None
+
+
+def extract_correo(folded, original):
+    match = EMAIL_PATTERN.search(folded)
+    return original[match.start():match.end()].rstrip(".") if match else None
+
+
+def extract_fecha(folded):
+    """First valid date, preferring one that follows the word "fecha"."""
+    found = []
+    for pattern, kind in DATE_PATTERNS:
+        for match in pattern.finditer(folded):
+            date = _parse_date(match, kind)
+            if date:
+                found.append((match.start(), date))
+    if not found:
+        return None
+    cue = DATE_CUE.search(folded)
+    if cue:
+        after_cue = [item for item in found if item[0] > cue.end()]
+        if after_cue:
+            return min(after_cue)[1]
+    return min(found)[1]
+
+
+def extract_fields(text):
+    """Return {campo: value} for the pattern-matchable campos found in `text`."""
+    folded = fold(text)
+    cedula, cedula_span = extract_cedula(folded, text)
+    fields = {
+        "Cédula": cedula,
+        "Teléfono": extract_telefono(folded, text, skip=cedula_span),
+        "Correo": extract_correo(folded, text),
+        "Fecha": extract_fecha(folded),
+    }
+    return {campo: value for campo, value in fields.items() if value}
+
+
+def extract_fields_many(texts):
+    """Columnar extraction for batches: {campo: [value or None per text]}."""
+    columns = {campo: [] for campo in PREFILLED_CAMPOS}
+    for text in texts:
+        fields = extract_fields(text)
+        for campo in PREFILLED_CAMPOS:
+            columns[campo].append(fields.get(campo))
+    return columns
+
+
+def prefill_hint(fields):
+    """Instruction appended to the PQRS so the model skips the prefilled campos."""
+    if not fields:
+        return ""
+    listed = "; ".join(f"{campo}: {value}" for campo, value in fields.items())
+    return (
+        f"\n\n[Campos ya extraídos del texto ({listed}). "
+        f"No generes los campos {', '.join(fields)}; se completan automáticamente.]"
+    )
+
+
+def merge_prefilled(response_text, fields, campos_order):
+    """Write the prefilled fields into the model's table, replacing or inserting rows."""
+    if not fields or '|' not in response_text:
+        return response_text
+    lines = response_text.split("\n")
+    row_index = {}
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            campo = stripped[1:].split("|", 1)[0].strip()
+            row_index.setdefault(campo, index)
+    if not any(campo in row_index for campo in campos_order):
+        return response_text
+
+    for campo, value in fields.items():
+        row = f"| {campo} | {value} |"
+        if campo in row_index:
+            lines[row_index[campo]] = row
+            continue
+        # Insert after the closest preceding campo that is present
+        position = campos_order.index(campo)
+        previous = [row_index[c] for c in campos_order[:position] if c in row_index]
+        following = [row_index[c] for c in campos_order[position + 1:] if c in row_index]
+        insert_at = max(previous) + 1 if previous else min(following)
+        lines.insert(insert_at, row)
+        row_index = {c: i + (i >= insert_at) for c, i in row_index.items()}
+        row_index[campo] = insert_at
+    return "\n".join(lines)
@@ -0,0 +1,334 @@
+"""SQLite-backed job queue shared by the Streamlit front-end and pqrs_worker.
+
+With PQRS_BACKEND=queue the app does not call the model itself: it
+submits a job here and polls the tokens a worker appends while the answer
+streams. Any number of worker processes claim jobs from the same file, so
+no external broker is needed. When the model cascade escalates an answer,
+the worker marks where the large model's answer starts in the stream, so
+the app replaces what it has shown so far. The same database holds a
+fixed set of provider slots (PQRS_PROVIDER_CONCURRENCY): a worker must
+lease one for every model call, which caps concurrent requests across all
+processes.
+
+Claims and slot leases expire, so jobs held by a crashed worker are
+re-queued and its slots become free again. A worker renews its claim
+while the job runs, and every write it makes for the job is fenced by the
+claim's attempt number: once a claim has expired and the job was claimed
+again, the old worker can no longer append tokens, finish or fail it.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+QUEUE_PATH = os.getenv("PQRS_QUEUE_PATH", os.path.join(".cache", "pqrs_queue.sqlite3"))
+PROVIDER_CONCURRENCY = int(os.getenv("PQRS_PROVIDER_CONCURRENCY", "8"))
+# Longer than the HTTP read timeout, so a live call never loses its slot;
+# job claims are also renewed every third of it while the job runs
+LEASE_SECONDS = float(os.getenv("PQRS_QUEUE_LEASE", "300"))
+POLL_INTERVAL = float(os.getenv("PQRS_QUEUE_POLL_INTERVAL", "0.05"))
+JOB_TIMEOUT = float(os.getenv("PQRS_QUEUE_TIMEOUT", "300"))
+# Finished jobs and their tokens are purged after this many seconds
+RETENTION = float(os.getenv("PQRS_QUEUE_RETENTION", str(24 * 3600)))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL,
+    context TEXT NOT NULL,
+    temperature REAL NOT NULL,
+    fields TEXT NOT NULL DEFAULT '{}',
+    stream_start INTEGER NOT NULL DEFAULT 0,
+    notice TEXT,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    response TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_tokens (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    token TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE TABLE IF NOT EXISTS provider_slots (
+    slot INTEGER PRIMARY KEY,
+    holder TEXT,
+    lease_until REAL
+);
+"""
+
+Job = namedtuple("Job", ["id", "kind", "text", "context", "temperature", "fields", "attempts"])
+
+
+class JobFailed(Exception):
+    pass
+
+
+class LeaseLost(Exception):
+    """The worker's claim on a job expired and the job was re-queued."""
+
+
+class JobQueue:
+    def __init__(self, path=QUEUE_PATH, concurrency=None, lease=LEASE_SECONDS):
+        """`concurrency` (set by workers, not by the app) resizes the shared provider slots."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if "fields" not in columns:
+            # Queue files created before jobs carried document campos
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN fields TEXT NOT NULL DEFAULT '{}'")
+        if "stream_start" not in columns:
+            # ... or streamed escalated answers
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN stream_start INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN notice TEXT")
+        if concurrency is not None:
+            self.resize_slots(concurrency)
+
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes
+        # cannot both read the same free row and then claim it
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def resize_slots(self, concurrency):
+        """Make the shared limit `concurrency`; free slots above it are dropped."""
+        with self._lock:
+            self._transaction()
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO provider_slots (slot) VALUES (?)", [(i,) for i in range(concurrency)]
+                )
+                self._conn.execute(
+                    "DELETE FROM provider_slots WHERE slot >= ? AND holder IS NULL", (concurrency,)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # Front-end side
+
+    def submit(self, kind, text, context=(), temperature=0.3, fields=None):
+        """Queue a "pqrs" or "chat" job.
+
+        `context` is a list of (role, content) pairs and `fields` the campos
+        known from an uploaded document.
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, text, context, temperature, fields, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, text, json.dumps(list(context), ensure_ascii=False), temperature,
+                 json.dumps(fields or {}, ensure_ascii=False), QUEUED, time.time()),
+            )
+        return job_id
+
+    def poll(self, job_id, after_seq=-1):
+        """(new tokens, last seq, status, response, error, stream start, notice) for `job_id`.
+
+        `stream start` is the seq of the first token of the answer being
+        streamed (above 0 once an answer was escalated) and `notice` says why.
+        """
+        with self._lock:
+            # One read transaction, so the job row and its tokens agree
+            self._conn.execute("BEGIN")
+            try:
+                status, response, error, stream_start, notice = self._conn.execute(
+                    "SELECT status, response, error, stream_start, notice FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                rows = self._conn.execute(
+                    "SELECT seq, token FROM job_tokens WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after_seq)
+                ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        last_seq = rows[-1][0] if rows else after_seq
+        return [token for _, token in rows], last_seq, status, response, error, stream_start, notice
+
+    def stream(self, job_id, poll_interval=POLL_INTERVAL, timeout=JOB_TIMEOUT, on_restart=None):
+        """Yield the job's tokens as they arrive, until it is done (see result()).
+
+        When an escalated answer starts, `on_restart(notice)` is called before
+        its first token.
+        """
+        deadline = time.monotonic() + timeout
+        seq, restarted = -1, False
+        while True:
+            first = seq + 1
+            tokens, seq, status, response, error, stream_start, notice = self.poll(job_id, seq)
+            if notice is not None and not restarted:
+                # Seqs are contiguous, so the earlier answer ends at a known index
+                split = max(stream_start - first, 0)
+                yield from tokens[:split]
+                tokens = tokens[split:]
+                restarted = True
+                if on_restart is not None:
+                    on_restart(notice)
+            yield from tokens
+            if status == DONE:
+                return
+            if status == ERROR:
+                raise JobFailed(error)
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"El trabajo {job_id} no terminó en {timeout:.0f} s")
+            if not tokens:
+                time.sleep(poll_interval)
+
+    def result(self, job_id):
+        """Final (post-processed) response of a finished job."""
+        with self._lock:
+            return self._conn.execute("SELECT response FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+    # Worker side
+
+    def claim(self, worker):
+        """Claim the oldest queued job (re-queuing expired claims first), or return None."""
+        now = time.time()
+        with self._lock:
+            self._transaction()
+            try:
+                expired = [row[0] for row in self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? AND lease_until < ?", (RUNNING, now)
+                )]
+                for job_id in expired:
+                    # The answer restarts from scratch; drop the partial stream
+                    self._conn.execute("DELETE FROM job_tokens WHERE job_id = ?", (job_id,))
+                    self._conn.execute("UPDATE jobs SET status = ?, worker = NULL, stream_start = 0, notice = NULL "
+                                       "WHERE id = ?", (QUEUED, job_id))
+                row = self._conn.execute(
+                    "SELECT id, kind, text, context, temperature, fields, attempts FROM jobs "
+                    "WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1 "
+                        "WHERE id = ?", (RUNNING, worker, now + self.lease, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, kind, text, context, temperature, fields, attempts = row
+        return Job(job_id, kind, text, [tuple(pair) for pair in json.loads(context)], temperature,
+                   json.loads(fields), attempts + 1)
+
+    def _renew(self, job_id, attempt):
+        """Extend the claim `attempt` on `job_id`; False when it is no longer held."""
+        return self._conn.execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND attempts = ? AND status = ?",
+            (time.time() + self.lease, job_id, attempt, RUNNING),
+        ).rowcount == 1
+
+    def renew(self, job_id, attempt):
+        with self._lock:
+            return self._renew(job_id, attempt)
+
+    def append_tokens(self, job_id, attempt, first_seq, tokens):
+        """Append streamed tokens (renewing the claim); raise LeaseLost when the claim expired."""
+        with self._lock:
+            self._transaction()
+            try:
+                held = self._renew(job_id, attempt)
+                if held:
+                    self._conn.executemany(
+                        "INSERT INTO job_tokens (job_id, seq, token) VALUES (?, ?, ?)",
+                        [(job_id, first_seq + i, token) for i, token in enumerate(tokens)],
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if not held:
+            raise LeaseLost(job_id)
+
+    def restart_stream(self, job_id, attempt, first_seq, notice):
+        """Mark `first_seq` as the start of an escalated answer; raise LeaseLost when the claim expired."""
+        with self._lock:
+            held = self._conn.execute(
+                "UPDATE jobs SET stream_start = ?, notice = ?, lease_until = ? "
+                "WHERE id = ? AND attempts = ? AND status = ?",
+                (first_seq, notice, time.time() + self.lease, job_id, attempt, RUNNING),
+            ).rowcount == 1
+        if not held:
+            raise LeaseLost(job_id)
+
+    def finish(self, job_id, attempt, response):
+        """Store the final response; False when the claim expired (the job runs again elsewhere)."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, response = ?, finished_at = ? "
+                "WHERE id = ? AND attempts = ? AND status = ?",
+                (DONE, response, time.time(), job_id, attempt, RUNNING),
+            ).rowcount == 1
+
+    def fail(self, job_id, attempt, error):
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND attempts = ? AND status = ?",
+                (ERROR, error, time.time(), job_id, attempt, RUNNING),
+            ).rowcount == 1
+
+    def acquire_slot(self, holder):
+        """Lease a free provider slot for `holder`; return its number, or None when all are taken."""
+        now = time.time()
+        with self._lock:
+            self._transaction()
+            try:
+                row = self._conn.execute(
+                    "SELECT slot FROM provider_slots WHERE holder IS NULL OR lease_until < ? LIMIT 1", (now,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE provider_slots SET holder = ?, lease_until = ? WHERE slot = ?",
+                        (holder, now + self.lease, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return None if row is None else row[0]
+
+    def release_slot(self, slot, holder):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE provider_slots SET holder = NULL, lease_until = NULL WHERE slot = ? AND holder = ?",
+                (slot, holder),
+            )
+
+    def purge(self, retention=RETENTION):
+        """Delete finished jobs (and their tokens) older than `retention` seconds."""
+        cutoff = time.time() - retention
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM job_tokens WHERE job_id IN (SELECT id FROM jobs WHERE finished_at < ?)", (cutoff,)
+            )
+            return self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,)).rowcount
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            busy = self._conn.execute(
+                "SELECT COUNT(*) FROM provider_slots WHERE holder IS NOT NULL AND lease_until >= ?", (time.time(),)
+            ).fetchone()[0]
+        return {**{status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, ERROR)}, "busy_slots": busy}
@@ -0,0 +1,233 @@
+"""Process-wide ChatOpenAI clients backed by one pooled HTTP connection pool.
+
+Streamlit re-executes app.py on every interaction, but imported modules
+persist for the life of the process, so clients created here survive
+reruns and are shared by every session. Per-request callbacks such as
+StreamHandler are passed through the `config` of each call instead of
+being baked into the cached instance.
+
+Every HTTP response goes through a hook that feeds its rate-limit headers
+to the process-wide rate_limiter, and the OpenAI client's own retries are
+off by default: callers retry through rate_limiter.call_with_retries().
+
+The OpenAI SDK stops reading a stream at its `data: [DONE]` event and
+closes it, before the end of the chunked body has been read, which makes
+httpx drop the connection instead of pooling it. The transports below
+finish reading a stream that has reached [DONE] when it is closed.
+"""
+import asyncio
+import os
+import threading
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from rate_limiter import get_rate_limiter
+
+MAX_CONNECTIONS = int(os.getenv("PQRS_HTTP_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("PQRS_HTTP_MAX_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("PQRS_HTTP_KEEPALIVE_EXPIRY", "120"))
+CONNECT_TIMEOUT = float(os.getenv("PQRS_HTTP_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("PQRS_HTTP_READ_TIMEOUT", "120"))
+# Overrides the OpenAI endpoint, e.g. for a local OpenAI-compatible mock server
+BASE_URL = os.getenv("OPENAI_BASE_URL")
+
+SSE_DONE = b"data: [DONE]\n\n"
+
+_lock = threading.Lock()
+_http_clients = None
+_chat_models = {}
+
+
+def http_limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def http_timeout():
+    return httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+class DrainingStream(httpx.SyncByteStream):
+    """Response body that reads what is left of a finished SSE stream on close."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._chunks = None
+        self._done = False
+
+    def __iter__(self):
+        self._chunks = iter(self._stream)
+        for chunk in self._chunks:
+            self._done = chunk.endswith(SSE_DONE)
+            yield chunk
+
+    def close(self):
+        # After [DONE] only the end of the chunked body is left to read
+        if self._done:
+            for _ in self._chunks:
+                pass
+        self._stream.close()
+
+
+class AsyncDrainingStream(httpx.AsyncByteStream):
+    """Async DrainingStream."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._chunks = None
+        self._done = False
+
+    async def __aiter__(self):
+        self._chunks = self._stream.__aiter__()
+        async for chunk in self._chunks:
+            self._done = chunk.endswith(SSE_DONE)
+            yield chunk
+
+    async def aclose(self):
+        if self._done:
+            async for _ in self._chunks:
+                pass
+        await self._stream.aclose()
+
+
+class PoolingTransport(httpx.HTTPTransport):
+    def handle_request(self, request):
+        response = super().handle_request(request)
+        response.stream = DrainingStream(response.stream)
+        return response
+
+
+class AsyncPoolingTransport(httpx.AsyncBaseTransport):
+    """Async PoolingTransport with a connection pool per event loop.
+
+    Pooled connections belong to the loop that opened them, and batch runs
+    and benchmarks may call asyncio.run() more than once in a process.
+    """
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._loop = None
+        self._transport = None
+        self._closer = None
+
+    async def handle_async_request(self, request):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._release()
+            self._loop, self._transport = loop, httpx.AsyncHTTPTransport(**self._kwargs)
+            # asyncio.run() finalizes open async generators before closing the
+            # loop, which closes this pool while its loop can still run it
+            self._closer = close_on_shutdown(self._transport)
+            await self._closer.asend(None)
+        response = await self._transport.handle_async_request(request)
+        response.stream = AsyncDrainingStream(response.stream)
+        return response
+
+    async def aclose(self):
+        if self._transport is None:
+            return
+        if asyncio.get_running_loop() is self._loop:
+            transport, self._loop, self._transport = self._transport, None, None
+            await transport.aclose()
+        else:
+            self._release()
+
+    def _release(self):
+        """Close the current pool from outside its event loop (best effort)."""
+        transport, loop = self._transport, self._loop
+        self._loop, self._transport = None, None
+        if transport is None:
+            return
+        if loop.is_closed():
+            # Closing through the loop raises "Event loop is closed"
+            close_pool_sockets(transport)
+        else:
+            asyncio.run_coroutine_threadsafe(transport.aclose(), loop)
+
+
+async def close_on_shutdown(transport):
+    try:
+        yield
+    finally:
+        await transport.aclose()
+
+
+def close_pool_sockets(transport):
+    """Close the sockets pooled by an httpx transport whose event loop is gone."""
+    for connection in transport._pool.connections:
+        stream = getattr(getattr(connection, "_connection", None), "_network_stream", None)
+        if stream is not None:
+            sock = stream.get_extra_info("socket")
+            # asyncio hands out a TransportSocket wrapper without close()
+            getattr(sock, "_sock", sock).close()
+
+
+def observe_response(response):
+    get_rate_limiter().observe(response.status_code, response.headers)
+
+
+async def aobserve_response(response):
+    observe_response(response)
+
+
+def get_http_clients():
+    """Return the shared (sync, async) httpx clients, creating them once."""
+    global _http_clients
+    with _lock:
+        if _http_clients is None:
+            _http_clients = (
+                httpx.Client(transport=PoolingTransport(limits=http_limits()), timeout=http_timeout(),
+                             event_hooks={"response": [observe_response]}),
+                httpx.AsyncClient(transport=AsyncPoolingTransport(limits=http_limits()), timeout=http_timeout(),
+                                  event_hooks={"response": [aobserve_response]}),
+            )
+        return _http_clients
+
+
+def get_chat_model(model="gpt-4o", temperature=0.3, api_key=None, base_url=BASE_URL, max_retries=0, **kwargs):
+    """Return the cached ChatOpenAI for these settings.
+
+    Extra keyword arguments are forwarded to ChatOpenAI and must be hashable.
+    """
+    key = (model, temperature, api_key, base_url, max_retries, tuple(sorted(kwargs.items())))
+    with _lock:
+        chat_model = _chat_models.get(key)
+    if chat_model is not None:
+        return chat_model
+
+    http_client, http_async_client = get_http_clients()
+    chat_model = ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        api_key=api_key or os.getenv("OPENAI_API_KEY"),
+        base_url=base_url,
+        streaming=True,
+        # Token counts for streamed responses, used by call_metrics
+        stream_usage=True,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        max_retries=max_retries,
+        **kwargs,
+    )
+    with _lock:
+        return _chat_models.setdefault(key, chat_model)
+
+
+def close_clients():
+    """Close the pooled connections (tests and benchmarks)."""
+    global _http_clients
+    with _lock:
+        if _http_clients is not None:
+            _http_clients[0].close()
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                asyncio.run(_http_clients[1].aclose())
+            else:
+                loop.create_task(_http_clients[1].aclose())
+        _http_clients = None
+        _chat_models.clear()
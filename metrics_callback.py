@@ -0,0 +1,76 @@
+"""LangChain callback that times model calls for call_metrics.MetricsSink.
+
+Kept apart from call_metrics so that importing the sink does not load
+LangChain.
+"""
+import time
+
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+
+class MetricsCallback(BaseCallbackHandler):
+    """Times one model call and records it in `sink` when it ends or fails."""
+    def __init__(self, sink, source, model, retries=0, **fields):
+        self.sink = sink
+        self.fields = {"source": source, "model": model, "retries": retries, **fields}
+        self.start = None
+        self.first_token = None
+        self.tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.start = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.start = time.perf_counter()
+
+    def on_llm_new_token(self, token, **kwargs):
+        # The first chunk of a stream only carries the role
+        if not token:
+            return
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.tokens += 1
+
+    def on_llm_end(self, response, **kwargs):
+        end = time.perf_counter()
+        usage = token_usage(response)
+        latency = end - self.start
+        completion_tokens = usage.get("completion_tokens") or self.tokens
+        generation = end - self.first_token if self.first_token is not None else latency
+        tokens_per_s = completion_tokens / generation if completion_tokens and generation > 0 else None
+        self.sink.record({
+            **self.fields,
+            "status": "ok",
+            "ttft": round(self.first_token - self.start, 4) if self.first_token is not None else None,
+            "latency": round(latency, 4),
+            "tokens_per_s": round(tokens_per_s, 1) if tokens_per_s is not None else None,
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "cached_tokens": usage.get("cached_tokens"),
+            "completion_tokens": completion_tokens,
+        })
+
+    def on_llm_error(self, error, **kwargs):
+        latency = time.perf_counter() - self.start if self.start is not None else None
+        self.sink.record({
+            **self.fields,
+            "status": "error",
+            "latency": round(latency, 4) if latency is not None else None,
+            "error": f"{type(error).__name__}: {error}",
+        })
+
+
+def token_usage(response):
+    """Prompt, cached-prompt and completion token counts from an LLMResult, streamed or not."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return {"prompt_tokens": usage.get("prompt_tokens"),
+                "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens"),
+                "completion_tokens": usage.get("completion_tokens")}
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                return {"prompt_tokens": metadata.get("input_tokens"),
+                        "cached_tokens": (metadata.get("input_token_details") or {}).get("cache_read"),
+                        "completion_tokens": metadata.get("output_tokens")}
+    return {}
@@ -0,0 +1,114 @@
+"""Model cascade: a small model first, the large one only when its answer does not hold up.
+
+first_model() picks the model a request starts on: plain chat and simple
+PQRS (up to PQRS_CASCADE_SIMPLE_TOKENS tokens, so not multi-page oficios)
+go to PQRS_SMALL_MODEL, the rest straight to PQRS_MODEL. review()
+finalizes a PQRS answer and says whether the small model's answer must be
+re-run on the large one:
+
+- the table (or JSON) cannot be read, or a Campo is missing or empty
+  (OPTIONAL_CAMPOS may be blank or "No aplica");
+- Tipo de Tramite, Proceso especial or Atención Preferencial hold a value
+  that is not one of the template's options;
+- it is low-confidence: the local pre-classifier is at least
+  PQRS_CASCADE_AGREE_CONFIDENCE sure of a different Dirección or Tipo de
+  Tramite.
+
+Every call is recorded with its tier, and every escalation as an
+"escalated" event, so call_metrics reports per-tier latency and the
+escalation rate. PQRS_CASCADE=off sends everything to PQRS_MODEL.
+"""
+import os
+
+from pqrs_classifier import direccion_label, tramite_label
+from pqrs_pipeline import finalize_record, finalize_response
+from pqrs_record import ENUMS, FIELD_BY_CAMPO, parse_record
+from pqrs_table import CAMPOS
+from context_window import count_tokens
+from prompt_assembly import split_options
+from table_stream import TableStreamParser
+
+LARGE_MODEL = os.getenv("PQRS_MODEL", "gpt-4o")
+SMALL_MODEL = os.getenv("PQRS_SMALL_MODEL", "gpt-4o-mini")
+CASCADE = os.getenv("PQRS_CASCADE", "on") == "on"
+SIMPLE_TOKENS = int(os.getenv("PQRS_CASCADE_SIMPLE_TOKENS", "600"))
+AGREE_CONFIDENCE = float(os.getenv("PQRS_CASCADE_AGREE_CONFIDENCE", "0.6"))
+
+# Campos whose values must be options of the prompt template
+CHECKED_CAMPOS = ["Tipo de Tramite", "Proceso especial", "Atención Preferencial"]
+
+# Campos many PQRS have no value for: the template asks for Vereda and Predio
+# only when they apply, and lists no "none" option for Atención Preferencial
+OPTIONAL_CAMPOS = ["Teléfono", "Correo", "Vereda", "Predio", "Anexos", "Copia a", "Atención Preferencial"]
+BLANK_VALUES = {"", "no aplica"}
+
+# Tier name recorded with each call
+TIERS = {SMALL_MODEL: "small", LARGE_MODEL: "large"}
+
+
+def model_identity():
+    """Models that can produce an answer, for the response cache fingerprint."""
+    return f"{SMALL_MODEL}>{LARGE_MODEL}" if CASCADE else LARGE_MODEL
+
+
+def is_simple(prepared):
+    """Whether a request may start on the small model; `prepared` is None for plain chat."""
+    return prepared is None or count_tokens(prepared.text) <= SIMPLE_TOKENS
+
+
+def first_model(prepared):
+    return SMALL_MODEL if CASCADE and is_simple(prepared) else LARGE_MODEL
+
+
+def tier(model):
+    return TIERS.get(model, model)
+
+
+def answer_rows(response_text):
+    """(Campo, Valor) rows of a markdown answer, or None when it has no table."""
+    parser = TableStreamParser()
+    parser.feed(response_text)
+    parser.close()
+    return [tuple(row) for row in parser.rows] if parser.rows else None
+
+
+def _allowed(campo, value):
+    options = {option.casefold() for option in ENUMS[FIELD_BY_CAMPO[campo]]}
+    return all(option.strip().casefold() in options for option in split_options(value))
+
+
+def _blank(value):
+    return value.strip().casefold() in BLANK_VALUES
+
+
+def escalation_reason(rows, prepared):
+    """Why a PQRS answer should go to the large model (None when it can be kept)."""
+    if not rows:
+        return "sin tabla"
+    values = dict(rows)
+    missing = [campo for campo in CAMPOS if campo not in OPTIONAL_CAMPOS and not values.get(campo, "").strip()]
+    if missing:
+        return f"faltan campos: {', '.join(missing)}"
+    invalid = [campo for campo in CHECKED_CAMPOS
+               if not (campo in OPTIONAL_CAMPOS and _blank(values.get(campo, ""))) and not _allowed(campo, values[campo])]
+    if invalid:
+        return f"valores no permitidos en {', '.join(invalid)}"
+    prediction = prepared.prediction
+    if prediction is not None and prediction.confidence >= AGREE_CONFIDENCE:
+        if direccion_label(values["Dirección Asignada"]) != prediction.direccion:
+            return f"Dirección distinta de la preclasificación ({prediction.direccion})"
+        if tramite_label(values["Tipo de Tramite"]) != prediction.tipo_tramite:
+            return "Tipo de Tramite distinto de la preclasificación"
+    return None
+
+
+def review(text, prepared, structured):
+    """Finalize a model answer to a PQRS: (response_text, record or None, escalation reason or None)."""
+    if structured:
+        try:
+            record = finalize_record(parse_record(text), prepared)
+        except ValueError:
+            return text, None, "JSON inválido"
+        return record.to_markdown(), record, escalation_reason(record.to_rows(), prepared)
+    response_text = finalize_response(text, prepared)
+    return response_text, None, escalation_reason(answer_rows(response_text), prepared)
@@ -0,0 +1,284 @@
+"""Local pre-classifier for Dirección Asignada and Tipo de Tramite.
+
+Routine PQRS (olores ofensivos, solicitud de copias, tala de árboles...)
+always get the same Dirección and Tipo de Tramite. A TF-IDF model with one
+softmax (multinomial logistic regression) head per campo, written in
+NumPy, is trained on past classifications and answers those in-process;
+pqrs_pipeline.local_record() only calls it confident when both heads are
+above PQRS_CLASSIFIER_THRESHOLD, otherwise the model is called as before.
+
+Training data is either a JSONL/CSV with texto, direccion and tipo_tramite
+columns, or the input file of a batch run joined by id with its output
+(rows with status "ok"):
+
+    python pqrs_classifier.py train benchmarks/data/routine_pqrs.jsonl
+    python pqrs_classifier.py train pqrs.csv --labels resultados.csv
+    python pqrs_classifier.py predict "Solicito copia del expediente 123 de Girardot"
+
+The model is an uncompressed .npz (vocabulary, idf, and per head the
+classes, a terms x classes weight matrix and the biases), which loads in
+milliseconds without pickle.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import re
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from prompt_assembly import PARTS, split_options
+from prompt_retrieval import tokenize
+from regional_index import REGIONALES
+
+CLASSIFIER_PATH = os.getenv("PQRS_CLASSIFIER_PATH", os.path.join(".cache", "pqrs_classifier.npz"))
+# Both heads must be at least this confident for the PQRS to skip the model
+CLASSIFIER_THRESHOLD = float(os.getenv("PQRS_CLASSIFIER_THRESHOLD", "0.9"))
+
+HEADS = ["direccion", "tipo_tramite"]
+FORMAT_VERSION = 1
+# Regional offices are learnt as one class: which one follows from the
+# location (regional_index), not from the wording
+REGIONAL = "DR"
+
+DIRECCION_TITLES = {record.code: record.title for record in PARTS["direcciones"]}
+DIRECCION_CODE_PATTERN = re.compile(r'\b(' + "|".join(sorted(DIRECCION_TITLES, key=len, reverse=True)) + r')\b')
+
+Prediction = namedtuple("Prediction", ["direccion", "tipo_tramite", "confidence"])
+
+
+def direccion_label(value):
+    """Dirección code in a label or a Dirección Asignada value (None when there is none)."""
+    match = DIRECCION_CODE_PATTERN.search(value or "")
+    if match is None:
+        return None
+    return REGIONAL if match.group(1) in REGIONALES else match.group(1)
+
+
+def tramite_label(value):
+    """Canonical Tipo de Tramite label: its options, comma-separated (None when empty)."""
+    options = split_options(value or "")
+    return ", ".join(options) if options else None
+
+
+def features(text):
+    """Word stems and stem bigrams."""
+    stems = tokenize(text)
+    return stems + [f"{a} {b}" for a, b in zip(stems, stems[1:])]
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class PQRSClassifier:
+    def __init__(self, terms, idf, heads):
+        """`heads` maps each head name to (classes, weights [terms x classes], bias)."""
+        self.terms = list(terms)
+        self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+        self.idf = idf
+        self.heads = heads
+
+    def vectorize(self, text):
+        """(indices, values) of the L2-normalised sublinear TF-IDF vector."""
+        counts = Counter(i for i in map(self.vocabulary.get, features(text)) if i is not None)
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        indices = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        values = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts))) + 1
+        values *= self.idf[indices]
+        return indices, values / np.linalg.norm(values)
+
+    def probabilities(self, text, head):
+        indices, values = self.vectorize(text)
+        _, weights, bias = self.heads[head]
+        return _softmax(values @ weights[indices] + bias)
+
+    def predict(self, text):
+        labels, confidence = {}, 1.0
+        indices, values = self.vectorize(text)
+        for head, (classes, weights, bias) in self.heads.items():
+            probabilities = _softmax(values @ weights[indices] + bias)
+            best = int(probabilities.argmax())
+            labels[head] = str(classes[best])
+            confidence = min(confidence, float(probabilities[best]))
+        return Prediction(labels["direccion"], labels["tipo_tramite"], confidence)
+
+    def save(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {"version": np.array(FORMAT_VERSION), "terms": np.array(self.terms, dtype=str), "idf": self.idf}
+        for head, (classes, weights, bias) in self.heads.items():
+            arrays.update({f"{head}_classes": np.array(classes, dtype=str), f"{head}_weights": weights,
+                           f"{head}_bias": bias})
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["version"]) != FORMAT_VERSION:
+                raise ValueError(f"{path}: formato de modelo {int(data['version'])} no soportado")
+            heads = {head: (data[f"{head}_classes"].tolist(), data[f"{head}_weights"], data[f"{head}_bias"])
+                     for head in HEADS}
+            return cls(data["terms"].tolist(), data["idf"], heads)
+
+
+@lru_cache(maxsize=1)
+def get_classifier(path=CLASSIFIER_PATH):
+    """The trained classifier, or None when no model file exists."""
+    return PQRSClassifier.load(path) if os.path.exists(path) else None
+
+
+def predict(text):
+    """Prediction for `text`, or None when no model has been trained."""
+    classifier = get_classifier()
+    return classifier.predict(text) if classifier is not None else None
+
+
+def _fit_head(rows, targets, n_terms, n_classes, epochs, l2, learning_rate, batch_size, rng):
+    """Mini-batch gradient descent on the softmax cross-entropy.
+
+    Each batch only touches the weight rows of the terms it contains, so an
+    epoch costs in proportion to the non-zeros, not the vocabulary.
+    """
+    weights = np.zeros((n_terms, n_classes), dtype=np.float32)
+    bias = np.zeros(n_classes, dtype=np.float32)
+    for _ in range(epochs):
+        order = rng.permutation(len(rows))
+        for start in range(0, len(rows), batch_size):
+            batch = order[start:start + batch_size]
+            columns, inverse = np.unique(np.concatenate([rows[i][0] for i in batch]), return_inverse=True)
+            x = np.zeros((len(batch), len(columns)), dtype=np.float32)
+            offset = 0
+            for r, i in enumerate(batch):
+                size = len(rows[i][0])
+                x[r, inverse[offset:offset + size]] = rows[i][1]
+                offset += size
+            gradient = _softmax(x @ weights[columns] + bias)
+            gradient[np.arange(len(batch)), targets[batch]] -= 1
+            gradient /= len(batch)
+            weights[columns] -= learning_rate * (x.T @ gradient + l2 * weights[columns])
+            bias -= learning_rate * gradient.sum(axis=0)
+    return weights, bias
+
+
+def train(texts, labels, min_df=2, max_terms=50000, epochs=100, l2=1e-4, learning_rate=5.0, batch_size=64,
+          seed=0):
+    """Fit a classifier on `texts` and `labels` ({head: [label per text]})."""
+    documents = [set(features(text)) for text in texts]
+    df = Counter(term for document in documents for term in document)
+    terms = sorted((term for term, count in df.items() if count >= min_df), key=lambda t: (-df[t], t))[:max_terms]
+    terms.sort()
+    idf = np.array([math.log((1 + len(texts)) / (1 + df[term])) + 1 for term in terms], dtype=np.float32)
+    classifier = PQRSClassifier(terms, idf, {})
+    rows = [classifier.vectorize(text) for text in texts]
+
+    rng = np.random.default_rng(seed)
+    for head in HEADS:
+        classes = sorted(set(labels[head]))
+        index = {label: i for i, label in enumerate(classes)}
+        targets = np.array([index[label] for label in labels[head]])
+        weights, bias = _fit_head(rows, targets, len(terms), len(classes), epochs, l2, learning_rate, batch_size,
+                                  rng)
+        classifier.heads[head] = (classes, weights, bias)
+    return classifier
+
+
+def _read_rows(path):
+    if path.lower().endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if path.lower().endswith(".parquet"):
+        import pandas as pd
+
+        return pd.read_parquet(path).to_dict("records")
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def load_examples(path, labels_path=None, id_column="id", text_column="texto"):
+    """(text, direccion, tipo_tramite) examples, skipping rows without both labels.
+
+    Without `labels_path`, `path` holds texto, direccion and tipo_tramite
+    columns. With it, `path` is a batch_classify input and `labels_path`
+    its output, joined by id.
+    """
+    if labels_path is None:
+        pairs = [(row[text_column], row.get("direccion"), row.get("tipo_tramite")) for row in _read_rows(path)]
+    else:
+        from batch_classify import load_items
+
+        texts = dict(load_items(path, id_column, text_column))
+        pairs = [
+            (texts[str(row["id"])], row.get("Dirección Asignada"), row.get("Tipo de Tramite"))
+            for row in _read_rows(labels_path)
+            if row.get("status") == "ok" and str(row["id"]) in texts
+        ]
+    examples = []
+    for text, direccion, tramite in pairs:
+        direccion, tramite = direccion_label(direccion), tramite_label(tramite)
+        if direccion and tramite:
+            examples.append((text, direccion, tramite))
+    return examples
+
+
+def split_examples(examples, holdout, seed=0):
+    order = np.random.default_rng(seed).permutation(len(examples))
+    cut = int(round(len(examples) * (1 - holdout)))
+    return [examples[i] for i in order[:cut]], [examples[i] for i in order[cut:]]
+
+
+def train_examples(examples, **options):
+    texts = [text for text, _, _ in examples]
+    labels = {"direccion": [d for _, d, _ in examples], "tipo_tramite": [t for _, _, t in examples]}
+    return train(texts, labels, **options)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preclasificador local de PQRS")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="Entrenar a partir de clasificaciones anteriores")
+    train_parser.add_argument("input", help="JSONL/CSV con texto y etiquetas, o entrada de batch_classify")
+    train_parser.add_argument("--labels", help="Salida de batch_classify (.csv, .jsonl o .parquet)")
+    train_parser.add_argument("--id-column", default="id")
+    train_parser.add_argument("--text-column", default="texto")
+    train_parser.add_argument("--output", default=CLASSIFIER_PATH)
+    train_parser.add_argument("--min-df", type=int, default=2)
+    train_parser.add_argument("--epochs", type=int, default=100)
+    train_parser.add_argument("--holdout", type=float, default=0.2, help="Fracción para evaluar antes de guardar")
+    predict_parser = commands.add_parser("predict", help="Clasificar un texto")
+    predict_parser.add_argument("text")
+    predict_parser.add_argument("--model", default=CLASSIFIER_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "predict":
+        classifier = PQRSClassifier.load(args.model)
+        print(json.dumps(classifier.predict(args.text)._asdict(), ensure_ascii=False))
+        return
+
+    examples = load_examples(args.input, args.labels, args.id_column, args.text_column)
+    options = {"min_df": args.min_df, "epochs": args.epochs}
+    if args.holdout > 0:
+        fit, held_out = split_examples(examples, args.holdout)
+        classifier = train_examples(fit, **options)
+        confident = correct = 0
+        for text, direccion, tramite in held_out:
+            prediction = classifier.predict(text)
+            if prediction.confidence >= CLASSIFIER_THRESHOLD:
+                confident += 1
+                correct += (prediction.direccion, prediction.tipo_tramite) == (direccion, tramite)
+        print(f"Evaluación con {len(held_out)} PQRS: {confident} sobre el umbral {CLASSIFIER_THRESHOLD}, "
+              f"{correct} correctas")
+    classifier = train_examples(examples, **options)
+    classifier.save(args.output)
+    print(f"{len(examples)} PQRS, {len(classifier.terms)} términos -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
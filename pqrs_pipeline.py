@@ -0,0 +1,80 @@
+"""Local pre- and post-processing shared by every path that classifies a PQRS.
+
+prepare_pqrs() runs the deterministic passes (regional routing, field
+pre-extraction, pre-classification, prompt retrieval) before the model
+call, and finalize_response() / finalize_record() apply their results to
+the model's markdown or structured answer. When the pre-classifier is
+confident, local_record() answers without the model.
+"""
+import re
+from collections import namedtuple
+
+from field_extractors import extract_fields, merge_prefilled, prefill_hint
+from pqrs_classifier import CLASSIFIER_THRESHOLD, DIRECCION_TITLES, REGIONAL, predict
+from pqrs_record import FIELD_BY_CAMPO, JSON_INSTRUCTIONS, OUTPUT_MODE, PQRSRecord
+from prompt_assembly import split_options
+from pqrs_table import CAMPOS
+from prompt_retrieval import system_prompt_for
+from regional_index import apply_regional_routing, find_regional, resolve_direccion, routing_hint
+
+PreparedPQRS = namedtuple("PreparedPQRS", ["text", "system_prompt", "human_message", "routing", "fields",
+                                           "prediction"])
+
+ASUNTO_MAX_CHARS = 150
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+
+def prepare_pqrs(text, document_fields=None):
+    """`document_fields` are campos known from an uploaded document (folios, anexos)."""
+    routing = find_regional(text)
+    fields = {**extract_fields(text), **(document_fields or {})}
+    prediction = predict(text)
+    human_message = text
+    if routing is not None:
+        human_message += routing_hint(routing)
+    human_message += prefill_hint(fields)
+    system_prompt = system_prompt_for(text)
+    if OUTPUT_MODE == "json":
+        system_prompt += JSON_INSTRUCTIONS
+    return PreparedPQRS(text, system_prompt, human_message, routing, fields, prediction)
+
+
+def finalize_response(response_text, prepared):
+    response_text = apply_regional_routing(response_text, prepared.routing)
+    return merge_prefilled(response_text, prepared.fields, CAMPOS)
+
+
+def finalize_record(record, prepared):
+    """Same as finalize_response, for a structured PQRSRecord."""
+    record.direccion_asignada = resolve_direccion(record.direccion_asignada, prepared.routing)
+    for campo, value in prepared.fields.items():
+        setattr(record, FIELD_BY_CAMPO[campo], value)
+    return record
+
+
+def local_record(prepared, threshold=CLASSIFIER_THRESHOLD):
+    """PQRSRecord answered by the pre-classifier, or None when the model must be called.
+
+    Only Dirección Asignada, Tipo de Tramite and the locally extracted campos
+    are filled; the rest is left for the radicador.
+    """
+    prediction = prepared.prediction
+    if prediction is None or prediction.confidence < threshold:
+        return None
+    if prediction.direccion == REGIONAL:
+        # The regional office comes from the location; without one, ask the model
+        if prepared.routing is None:
+            return None
+        direccion = f"{prepared.routing.regional} ({prepared.routing.codigo})"
+    else:
+        direccion = f"{DIRECCION_TITLES[prediction.direccion]} ({prediction.direccion})"
+    asunto = _SENTENCE_END.split(prepared.text.strip(), maxsplit=1)[0][:ASUNTO_MAX_CHARS]
+    record = PQRSRecord(
+        asunto=asunto,
+        municipio=prepared.routing.municipio if prepared.routing is not None else "",
+        direccion_asignada=direccion,
+        tipo_tramite=split_options(prediction.tipo_tramite),
+        justificacion=f"Clasificación local (confianza {prediction.confidence:.0%})",
+        observaciones="Clasificado sin consultar el modelo; completar los campos vacíos",
+    )
+    return finalize_record(record, prepared)
@@ -0,0 +1,182 @@
+"""Typed PQRS records and the structured-output (JSON schema) engine.
+
+With PQRS_OUTPUT_MODE=json the model is asked for a JSON object that
+follows JSON_SCHEMA instead of a markdown table. The answer maps directly
+onto PQRSRecord, whose enum campos are validated against the option lists
+of the prompt template. Rendering and export read the record instead of
+scraping markdown, and streaming fills the table field by field from the
+partial JSON.
+"""
+import json
+import os
+import re
+from dataclasses import dataclass, field, fields
+
+from prompt_assembly import split_options
+from prompts import SYSTEM_PROMPT
+
+OUTPUT_MODE = os.getenv("PQRS_OUTPUT_MODE", "markdown")  # "markdown" or "json"
+
+# (attribute, Campo) in table order
+FIELD_CAMPOS = [
+    ("nombre", "Nombre"),
+    ("cedula", "Cédula"),
+    ("telefono", "Teléfono"),
+    ("correo", "Correo"),
+    ("municipio", "Municipio"),
+    ("asunto", "Asunto"),
+    ("direccion_asignada", "Dirección Asignada"),
+    ("justificacion", "Justificación"),
+    ("tipo_respuesta", "Tipo de Respuesta"),
+    ("tipo_remitente", "Tipo Remitente"),
+    ("fecha", "Fecha"),
+    ("proceso_especial", "Proceso especial"),
+    ("tipo_tramite", "Tipo de Tramite"),
+    ("departamento", "Departamento"),
+    ("vereda", "Vereda"),
+    ("predio", "Predio"),
+    ("medio_documento", "Medio de documento"),
+    ("numero_folios", "Numero de Folios"),
+    ("anexos", "Anexos"),
+    ("observaciones", "Observaciones"),
+    ("copia_a", "Copia a"),
+    ("quien_entrega", "Quien Entrega"),
+    ("atencion_preferencial", "Atención Preferencial"),
+]
+CAMPO_BY_FIELD = dict(FIELD_CAMPOS)
+FIELD_BY_CAMPO = {campo: name for name, campo in FIELD_CAMPOS}
+
+
+def template_options(campo, system_prompt=SYSTEM_PROMPT):
+    """Options listed for `campo` in the prompt's table template."""
+    match = re.search(rf'^\| {re.escape(campo)}\s*\| \[(.*?)\]\s*\|?\s*$', system_prompt, re.MULTILINE)
+    return split_options(match.group(1)) if match else []
+
+
+ENUMS = {
+    "tipo_respuesta": template_options("Tipo de Respuesta"),
+    "tipo_remitente": template_options("Tipo Remitente"),
+    "proceso_especial": template_options("Proceso especial"),
+    "tipo_tramite": template_options("Tipo de Tramite"),
+    "quien_entrega": template_options("Quien Entrega"),
+    # The template has no "none" option, but most PQRS need one
+    "atencion_preferencial": ["No Aplica"] + template_options("Atención Preferencial"),
+}
+MULTI_VALUED = {"tipo_tramite"}
+
+
+@dataclass(slots=True)
+class PQRSRecord:
+    nombre: str = ""
+    cedula: str = ""
+    telefono: str = ""
+    correo: str = ""
+    municipio: str = ""
+    asunto: str = ""
+    direccion_asignada: str = ""
+    justificacion: str = ""
+    tipo_respuesta: str = ""
+    tipo_remitente: str = ""
+    fecha: str = ""
+    proceso_especial: str = ""
+    tipo_tramite: list = field(default_factory=list)
+    departamento: str = ""
+    vereda: str = ""
+    predio: str = ""
+    medio_documento: str = "Oficio"
+    numero_folios: str = "1"
+    anexos: str = "VACIO"
+    observaciones: str = ""
+    copia_a: str = "VACIO"
+    quien_entrega: str = ""
+    atencion_preferencial: str = ""
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a record from the model's JSON object (unknown keys are ignored)."""
+        values = {}
+        for item in fields(cls):
+            if item.name not in data or data[item.name] is None:
+                continue
+            value = data[item.name]
+            if item.name in MULTI_VALUED:
+                values[item.name] = [str(v) for v in value] if isinstance(value, list) else [str(value)]
+            else:
+                values[item.name] = str(value)
+        return cls(**values)
+
+    def value(self, name):
+        value = getattr(self, name)
+        return ", ".join(value) if isinstance(value, list) else value
+
+    def to_rows(self):
+        """(Campo, Valor) pairs in table order, for rendering."""
+        return [(campo, self.value(name)) for name, campo in FIELD_CAMPOS]
+
+    def to_dict(self):
+        """{Campo: Valor}, the same shape export and batch rows use."""
+        return {campo: self.value(name) for name, campo in FIELD_CAMPOS}
+
+    def to_markdown(self):
+        """The record as the markdown table the prompt template describes."""
+        lines = ["| Campo | Valor |", "|---|---|"]
+        lines += [f"| {campo} | {valor.replace('|', '/')} |" for campo, valor in self.to_rows()]
+        return "\n".join(lines)
+
+    def validate(self):
+        """Return a list of enum violations (empty when the record is valid)."""
+        errors = []
+        for name, options in ENUMS.items():
+            values = getattr(self, name)
+            for value in values if isinstance(values, list) else [values]:
+                if value not in options:
+                    errors.append(f"{CAMPO_BY_FIELD[name]}: valor no permitido {value!r}")
+        return errors
+
+
+def _json_schema():
+    properties = {}
+    for name, _ in FIELD_CAMPOS:
+        if name in MULTI_VALUED:
+            properties[name] = {"type": "array", "items": {"type": "string", "enum": ENUMS[name]}}
+        elif name in ENUMS:
+            properties[name] = {"type": "string", "enum": ENUMS[name]}
+        else:
+            properties[name] = {"type": "string"}
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": [name for name, _ in FIELD_CAMPOS],
+        "additionalProperties": False,
+    }
+
+
+JSON_SCHEMA = _json_schema()
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "pqrs_record", "strict": True, "schema": JSON_SCHEMA},
+}
+JSON_INSTRUCTIONS = (
+    "\n\nResponde únicamente con un objeto JSON que siga el esquema pqrs_record, en lugar de la tabla "
+    "markdown. Cada propiedad corresponde a un Campo de la tabla, en el mismo orden; usa los mismos "
+    "criterios y valores descritos arriba."
+)
+
+
+def bind_structured(chat_model):
+    """Bind the strict JSON schema response format to a chat model."""
+    return chat_model.bind(response_format=RESPONSE_FORMAT)
+
+
+def parse_record(text):
+    """Parse a complete JSON answer into a PQRSRecord."""
+    return PQRSRecord.from_dict(json.loads(text))
+
+
+def parse_partial_record(text):
+    """Properties of a streamed, still incomplete JSON answer (possibly empty)."""
+    # Imported here: the export store and the app's first render use this module without LangChain
+    from langchain_core.utils.json import parse_partial_json
+
+    data = parse_partial_json(text) if text.strip() else None
+    return data if isinstance(data, dict) else {}
@@ -0,0 +1,515 @@
+"""Append-only store of classified PQRS, indexed search and streaming export to CSV, XLSX and Parquet.
+
+Each classified PQRS is stored once, when it is answered, as one row with
+a column per Campo, so exporting never re-parses chat markdown. append()
+only queues the row: a background thread writes queued rows in batches
+of WRITE_BATCH_ROWS, one transaction each, and reads wait for the queue
+so a session always finds its own PQRS.
+
+Search combines B-tree indexes on Cédula (digits only), Municipio
+(accent- and case-insensitive), Dirección Asignada (its code), every
+Tipo de Tramite option (a side table with a row per option, filled by an
+insert trigger) and Fecha (parsed to an ISO date) with an FTS5
+index over the PQRS text, Nombre, Asunto, Justificación and
+Observaciones. Results come newest first in pages of SEARCH_PAGE_ROWS,
+each one starting below the last id of the previous page, so a page
+costs the same however deep it is.
+
+Exports read the store in chunks of EXPORT_CHUNK_ROWS rows and stream
+each chunk to the output file: a CSV writer, one Parquet row group, or
+rows of an XLSX sheet written straight into the zip archive. Memory stays
+bounded by the chunk size however many rows are exported.
+
+    python pqrs_store.py export pqrs.parquet --since 2026-01-01 --until 2026-03-31
+    python pqrs_store.py search --municipio Soacha --direccion DRSOA --desde 2026-09-01
+"""
+import argparse
+import atexit
+import csv
+import io
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zipfile
+from collections import namedtuple
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from field_extractors import extract_fecha, fold
+from prompt_assembly import PARTS, split_options
+from pqrs_record import FIELD_BY_CAMPO, FIELD_CAMPOS
+
+STORE_PATH = os.getenv("PQRS_STORE_PATH", os.path.join(".cache", "pqrs_records.sqlite3"))
+EXPORT_CHUNK_ROWS = int(os.getenv("PQRS_EXPORT_CHUNK_ROWS", "1000"))
+WRITE_BATCH_ROWS = int(os.getenv("PQRS_STORE_WRITE_BATCH_ROWS", "500"))
+SEARCH_PAGE_ROWS = int(os.getenv("PQRS_SEARCH_PAGE_ROWS", "50"))
+# Counts of matching records stop here, so a broad search stays fast
+SEARCH_COUNT_CAP = int(os.getenv("PQRS_SEARCH_COUNT_CAP", "10000"))
+
+META_COLUMNS = ["id", "registrado", "sesion", "origen", "texto"]
+EXPORT_COLUMNS = META_COLUMNS + [campo for _, campo in FIELD_CAMPOS]
+SEARCH_COLUMNS = ["id", "registrado", "Fecha", "Cédula", "Nombre", "Municipio", "Dirección Asignada",
+                  "Tipo de Tramite", "Asunto"]
+
+DIRECCION_TITLES = {record.code: record.title for record in PARTS["direcciones"]}
+_DIRECCION_CODE = re.compile(r'\b(' + "|".join(sorted(DIRECCION_TITLES, key=len, reverse=True)) + r')\b')
+
+# texto: words to find (all of them) in the text, Nombre, Asunto, Justificación or
+# Observaciones; desde/hasta: Fecha range, inclusive, as dates or ISO strings
+SearchFilters = namedtuple(
+    "SearchFilters",
+    ["texto", "cedula", "municipio", "direccion", "tramite", "desde", "hasta"],
+    defaults=(None,) * 7,
+)
+
+# Normalized copies of the filtered campos, (column, campo); tramite_keys
+# is a JSON list of the options, one row each in records_tramites
+KEY_COLUMNS = [
+    ("cedula_key", "Cédula"),
+    ("municipio_key", "Municipio"),
+    ("direccion_key", "Dirección Asignada"),
+    ("tramite_keys", "Tipo de Tramite"),
+    ("fecha_key", "Fecha"),
+]
+FTS_COLUMNS = ["texto", "nombre", "asunto", "justificacion", "observaciones"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    session TEXT,
+    source TEXT NOT NULL,
+    texto TEXT NOT NULL,
+    {campos}
+);
+CREATE INDEX IF NOT EXISTS records_created_at ON records (created_at);
+CREATE INDEX IF NOT EXISTS records_session ON records (session, created_at);
+""".format(campos=",\n    ".join(f"{name} TEXT NOT NULL DEFAULT ''"
+                                   for name in [name for name, _ in FIELD_CAMPOS] + [c for c, _ in KEY_COLUMNS]))
+
+# The store is append-only, so the external-content FTS table only needs an insert trigger
+_SEARCH_SCHEMA = """
+CREATE INDEX IF NOT EXISTS records_cedula ON records (cedula_key);
+CREATE INDEX IF NOT EXISTS records_municipio ON records (municipio_key);
+CREATE INDEX IF NOT EXISTS records_direccion ON records (direccion_key);
+-- Indexed only the first Tipo de Tramite option, before records_tramites
+DROP INDEX IF EXISTS records_tramite;
+CREATE INDEX IF NOT EXISTS records_fecha ON records (fecha_key);
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    {columns}, content='records', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS records_fts_insert AFTER INSERT ON records BEGIN
+    INSERT INTO records_fts (rowid, {columns}) VALUES (new.id, {new_columns});
+END;
+CREATE TABLE IF NOT EXISTS records_tramites (
+    tramite_key TEXT NOT NULL,
+    record_id INTEGER NOT NULL,
+    PRIMARY KEY (tramite_key, record_id)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS records_tramites_insert AFTER INSERT ON records BEGIN
+    INSERT OR IGNORE INTO records_tramites SELECT value, new.id FROM json_each(nullif(new.tramite_keys, ''));
+END;
+CREATE TABLE IF NOT EXISTS records_fecha_ids (
+    fecha TEXT PRIMARY KEY,
+    min_id INTEGER NOT NULL,
+    max_id INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS records_fecha_ids_insert AFTER INSERT ON records BEGIN
+    INSERT INTO records_fecha_ids VALUES (new.fecha_key, new.id, new.id)
+    ON CONFLICT (fecha) DO UPDATE SET min_id = min(min_id, excluded.min_id), max_id = max(max_id, excluded.max_id);
+END;
+""".format(columns=", ".join(FTS_COLUMNS), new_columns=", ".join(f"new.{c}" for c in FTS_COLUMNS))
+
+_SELECT = "SELECT id, created_at, session, source, texto, {} FROM records".format(
+    ", ".join(name for name, _ in FIELD_CAMPOS)
+)
+_INSERT = "INSERT INTO records (created_at, session, source, texto, {}) VALUES ({})".format(
+    ", ".join([name for name, _ in FIELD_CAMPOS] + [c for c, _ in KEY_COLUMNS]),
+    ", ".join("?" * (4 + len(FIELD_CAMPOS) + len(KEY_COLUMNS))),
+)
+_SEARCH_SELECT = "SELECT r.id, r.created_at, r.fecha, r.cedula, r.nombre, r.municipio, r.direccion_asignada, " \
+                 "r.tipo_tramite, r.asunto"
+
+
+def _fold(text):
+    return " ".join(fold(text or "").split())
+
+
+def _direccion_key(value):
+    """Code of a Dirección Asignada value, by its code or its title ('' when neither is there)."""
+    match = _DIRECCION_CODE.search(value or "")
+    if match:
+        return match.group(1)
+    folded = _fold(value)
+    return next((code for code, title in DIRECCION_TITLES.items() if _fold(title) == folded), "")
+
+
+def search_keys(values):
+    """Values of KEY_COLUMNS for {Campo: Valor}, normalized like the search filters."""
+    tramites = [_fold(tramite) for tramite in split_options(values.get("Tipo de Tramite") or "")]
+    return (
+        re.sub(r"\D", "", values.get("Cédula") or ""),
+        _fold(values.get("Municipio")),
+        _direccion_key(values.get("Dirección Asignada")),
+        json.dumps([tramite for tramite in tramites if tramite], ensure_ascii=False),
+        extract_fecha(fold(values.get("Fecha") or "")) or "",
+    )
+
+
+def _match_expression(texto):
+    """FTS5 query finding every word of `texto`; each is quoted, so no FTS syntax leaks through."""
+    words = re.findall(r"\w+", texto or "")
+    return " ".join(f'"{word}"' for word in words) or None
+
+
+class RecordStore:
+    def __init__(self, path=STORE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        existing = {row[0] for row in self._conn.execute("SELECT name FROM sqlite_master")}
+        self._conn.executescript(_SCHEMA)
+        self._add_search_keys()
+        self._conn.executescript(_SEARCH_SCHEMA)
+        # Records stored before search existed
+        if "records_fts" not in existing:
+            self._conn.execute("INSERT INTO records_fts (records_fts) VALUES ('rebuild')")
+        if "records_fecha_ids" not in existing:
+            self._conn.execute("INSERT OR REPLACE INTO records_fecha_ids "
+                               "SELECT fecha_key, MIN(id), MAX(id) FROM records GROUP BY fecha_key")
+        if "records_tramites" not in existing:
+            self._conn.execute("INSERT OR IGNORE INTO records_tramites "
+                               "SELECT j.value, r.id FROM records r, json_each(nullif(r.tramite_keys, '')) j")
+        self._pending = queue.Queue()
+        self._writer = None
+        atexit.register(self.flush)
+
+    def _add_search_keys(self):
+        """Add and fill KEY_COLUMNS in a store created before search existed."""
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(records)")}
+        if all(column in existing for column, _ in KEY_COLUMNS):
+            return
+        campos = [campo for _, campo in KEY_COLUMNS]
+        names = ", ".join(FIELD_BY_CAMPO[campo] for campo in campos)
+        with self._conn:
+            self._conn.execute("BEGIN")
+            for column, _ in KEY_COLUMNS:
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE records ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+            rows = self._conn.execute(f"SELECT id, {names} FROM records").fetchall()
+            self._conn.executemany(
+                "UPDATE records SET {} WHERE id = ?".format(", ".join(f"{column} = ?" for column, _ in KEY_COLUMNS)),
+                [(*search_keys(dict(zip(campos, row[1:]))), row[0]) for row in rows],
+            )
+
+    def append(self, values, texto, session=None, source="app"):
+        """Queue one classified PQRS for the writer; `values` is {Campo: Valor} (missing campos stay empty)."""
+        row = [time.time(), session, source, texto] + [values.get(campo) or "" for _, campo in FIELD_CAMPOS]
+        self._pending.put(row + list(search_keys(values)))
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_pending, name="pqrs-store-writer", daemon=True)
+                self._writer.start()
+
+    def _write_pending(self):
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < WRITE_BATCH_ROWS:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._lock, self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany(_INSERT, batch)
+            except Exception as exc:
+                # The writer must outlive a bad batch, or flush() would wait forever
+                print(f"pqrs_store: {len(batch)} PQRS not stored: {exc}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+
+    def flush(self):
+        """Wait until every appended PQRS is written."""
+        self._pending.join()
+
+    @staticmethod
+    def _where(session, since, until):
+        clauses, params = [], []
+        if session is not None:
+            clauses.append("session = ?")
+            params.append(session)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count(self, session=None, since=None, until=None):
+        self.flush()
+        where, params = self._where(session, since, until)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM records{where}", params).fetchone()[0]
+
+    def chunks(self, session=None, since=None, until=None, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Yield lists of at most `chunk_rows` export rows (EXPORT_COLUMNS order), oldest first.
+
+        Pages by id rather than holding a cursor open, so appends from other
+        threads are never blocked by a slow download.
+        """
+        self.flush()
+        where, params = self._where(session, since, until)
+        where += " AND id > ?" if where else " WHERE id > ?"
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"{_SELECT}{where} ORDER BY id LIMIT ?", params + [last_id, chunk_rows]
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [(row[0], _timestamp(row[1]), row[2] or "", *row[3:]) for row in rows]
+
+    def _search_query(self, filters):
+        """(FROM clause, id column, WHERE clauses, params) for `filters`.
+
+        The FTS table drives text searches, and records_tramites the others
+        filtered by Tipo de Tramite, so pages follow its primary key.
+
+        A Fecha range also bounds the ids, from the first and last id of each
+        Fecha, so neither the FTS table nor an index walks past newer records.
+        """
+        clauses, params = [], []
+        match = _match_expression(filters.texto)
+        tramite = _fold(filters.tramite)
+        if match:
+            source, id_column = "records_fts f JOIN records r ON r.id = f.rowid", "f.rowid"
+            clauses.append("records_fts MATCH ?")
+            params.append(match)
+            if tramite:
+                clauses.append("r.id IN (SELECT record_id FROM records_tramites WHERE tramite_key = ?)")
+                params.append(tramite)
+        elif tramite:
+            source, id_column = "records_tramites t JOIN records r ON r.id = t.record_id", "t.record_id"
+            clauses.append("t.tramite_key = ?")
+            params.append(tramite)
+        else:
+            source, id_column = "records r", "r.id"
+        keys = search_keys({
+            "Cédula": filters.cedula,
+            "Municipio": filters.municipio,
+            "Dirección Asignada": filters.direccion,
+        })
+        # Cédula, Municipio and Dirección match their key column
+        for (column, _), key in zip(KEY_COLUMNS[:3], keys):
+            if key:
+                clauses.append(f"r.{column} = ?")
+                params.append(key)
+        if filters.desde or filters.hasta:
+            desde, hasta = str(filters.desde or "0"), str(filters.hasta or "9")
+            clauses.append("r.fecha_key BETWEEN ? AND ?")
+            params += [desde, hasta]
+            first, last = self._conn.execute(
+                "SELECT MIN(min_id), MAX(max_id) FROM records_fecha_ids WHERE fecha BETWEEN ? AND ?", (desde, hasta)
+            ).fetchone()
+            clauses.append(f"{id_column} BETWEEN ? AND ?")
+            params += [first or 0, last or 0]
+        return source, id_column, clauses, params
+
+    def search(self, filters, before=None, limit=SEARCH_PAGE_ROWS):
+        """One page of records matching `filters` (SEARCH_COLUMNS order), newest first.
+
+        Pass the id of the last row as `before` for the next page.
+        """
+        self.flush()
+        with self._lock:
+            source, id_column, clauses, params = self._search_query(filters)
+            if before is not None:
+                clauses.append(f"{id_column} < ?")
+                params.append(before)
+            where = " WHERE " + " AND ".join(clauses) if clauses else ""
+            rows = self._conn.execute(
+                f"{_SEARCH_SELECT} FROM {source}{where} ORDER BY {id_column} DESC LIMIT ?", params + [limit]
+            ).fetchall()
+        return [(row[0], _timestamp(row[1]), *row[2:]) for row in rows]
+
+    def search_count(self, filters, cap=SEARCH_COUNT_CAP):
+        """Number of records matching `filters`, counted up to `cap`."""
+        self.flush()
+        with self._lock:
+            source, _, clauses, params = self._search_query(filters)
+            where = " WHERE " + " AND ".join(clauses) if clauses else ""
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {source}{where} LIMIT ?)", params + [cap]
+            ).fetchone()[0]
+
+
+def _timestamp(created_at):
+    return datetime.fromtimestamp(created_at).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def write_csv(chunks, f):
+    text = io.TextIOWrapper(f, encoding="utf-8-sig", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in chunks:
+        writer.writerows(chunk)
+    text.detach()
+
+
+def write_parquet(chunks, f):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([("id", pa.int64())] + [(column, pa.string()) for column in EXPORT_COLUMNS[1:]])
+    with pq.ParquetWriter(f, schema) as writer:
+        for chunk in chunks:
+            # One row group per chunk
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays([pa.array(c) for c in columns], schema=schema))
+
+
+# Minimal SpreadsheetML parts: one sheet with inline strings, so rows can be
+# streamed into the archive without a shared-strings table
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="PQRS" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+# Excel's limit per cell; characters XML 1.0 cannot carry
+XLSX_MAX_CELL_CHARS = 32767
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, int):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            text = escape(_XML_ILLEGAL.sub("", str(value))[:XLSX_MAX_CELL_CHARS])
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+
+def write_xlsx(chunks, f):
+    with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(EXPORT_COLUMNS).encode("utf-8"))
+            for chunk in chunks:
+                sheet.write("".join(_xlsx_row(row) for row in chunk).encode("utf-8"))
+            sheet.write(b'</sheetData></worksheet>')
+
+
+# format: (writer, MIME type)
+EXPORT_FORMATS = {
+    "csv": (write_csv, "text/csv"),
+    "xlsx": (write_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": (write_parquet, "application/vnd.apache.parquet"),
+}
+
+
+def export(store, fmt, f, session=None, since=None, until=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Stream the matching records to the binary file `f` in format `fmt`."""
+    writer, _ = EXPORT_FORMATS[fmt]
+    writer(store.chunks(session, since, until, chunk_rows), f)
+
+
+def _day_start(text):
+    return datetime.strptime(text, "%Y-%m-%d").timestamp()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportación de PQRS clasificadas")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Exportar a .csv, .xlsx o .parquet")
+    export_parser.add_argument("output")
+    export_parser.add_argument("--since", help="Fecha inicial AAAA-MM-DD (incluida)")
+    export_parser.add_argument("--until", help="Fecha final AAAA-MM-DD (incluida)")
+    export_parser.add_argument("--session", help="Solo los registros de esta sesión")
+    export_parser.add_argument("--store", default=STORE_PATH)
+    search_parser = commands.add_parser("search", help="Buscar PQRS clasificadas")
+    search_parser.add_argument("texto", nargs="?", help="Palabras del texto, Nombre, Asunto u Observaciones")
+    search_parser.add_argument("--cedula")
+    search_parser.add_argument("--municipio")
+    search_parser.add_argument("--direccion", help="Código o nombre de la Dirección Asignada")
+    search_parser.add_argument("--tramite", help="Tipo de Tramite")
+    search_parser.add_argument("--desde", help="Fecha del PQRS inicial AAAA-MM-DD (incluida)")
+    search_parser.add_argument("--hasta", help="Fecha del PQRS final AAAA-MM-DD (incluida)")
+    search_parser.add_argument("--limit", type=int, default=SEARCH_PAGE_ROWS)
+    search_parser.add_argument("--store", default=STORE_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "search":
+        filters = SearchFilters(args.texto, args.cedula, args.municipio, args.direccion, args.tramite,
+                                args.desde, args.hasta)
+        store = RecordStore(args.store)
+        writer = csv.writer(sys.stdout, delimiter="\t")
+        writer.writerow(SEARCH_COLUMNS)
+        writer.writerows(store.search(filters, limit=args.limit))
+        count = store.search_count(filters)
+        print(f"{'más de ' if count >= SEARCH_COUNT_CAP else ''}{count} PQRS", file=sys.stderr)
+        return
+    fmt = os.path.splitext(args.output)[1].lower().lstrip(".")
+    if fmt not in EXPORT_FORMATS:
+        parser.error(f"formato no soportado: {fmt!r} (use {', '.join(EXPORT_FORMATS)})")
+    since = _day_start(args.since) if args.since else None
+    until = _day_start(args.until) + 24 * 3600 if args.until else None
+    store = RecordStore(args.store)
+    with open(args.output, "wb") as f:
+        export(store, fmt, f, args.session, since, until)
+    print(f"{store.count(args.session, since, until)} PQRS -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
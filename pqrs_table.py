@@ -0,0 +1,50 @@
+from table_stream import TableStreamParser
+
+# Campos of the PQRS table, in the order the system prompt asks for them
+CAMPOS = [
+    "Nombre",
+    "Cédula",
+    "Teléfono",
+    "Correo",
+    "Municipio",
+    "Asunto",
+    "Dirección Asignada",
+    "Justificación",
+    "Tipo de Respuesta",
+    "Tipo Remitente",
+    "Fecha",
+    "Proceso especial",
+    "Tipo de Tramite",
+    "Departamento",
+    "Vereda",
+    "Predio",
+    "Medio de documento",
+    "Numero de Folios",
+    "Anexos",
+    "Observaciones",
+    "Copia a",
+    "Quien Entrega",
+    "Atención Preferencial",
+]
+
+
+def extract_table_data(markdown_text):
+    """Extract the (Campo, Valor) table from markdown as a DataFrame, and the text around it.
+
+    Parsed with TableStreamParser, like streamed answers, so rows without a
+    trailing pipe are kept.
+    """
+    import pandas as pd
+
+    parser = TableStreamParser()
+    parser.feed(markdown_text)
+    parser.close()
+    if not parser.rows:
+        return None, None
+    return pd.DataFrame(parser.rows, columns=['Campo', 'Valor']), parser.other_text
+
+
+def table_to_record(df):
+    """Map an extracted table onto the CAMPOS columns (missing campos are empty)."""
+    values = dict(zip(df['Campo'], df['Valor']))
+    return {campo: values.get(campo, "") for campo in CAMPOS}
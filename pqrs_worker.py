@@ -0,0 +1,231 @@
+"""Worker service that answers the jobs the Streamlit app queues.
+
+Run one or more of these next to the app started with PQRS_BACKEND=queue:
+
+    python pqrs_worker.py --concurrency 8
+    python pqrs_worker.py --processes 4 --concurrency 8
+
+Each process runs `concurrency` asyncio tasks that claim jobs from the
+shared SQLite queue (job_queue.py), run the same local passes and prompt
+as the app, stream the tokens back through the queue and store the
+post-processed answer. Every model call holds one of the queue's provider
+slots, so PQRS_PROVIDER_CONCURRENCY caps requests across all processes,
+and all of them share the response cache and the metrics file. Within a
+process the calls also queue behind rate_limiter, which retries 429s and
+provider errors until the first token has been streamed. Requests go
+through the model cascade (model_cascade.py): the small model's answer
+streams like any other, and when it is escalated the large model's answer
+follows it in the stream, marked as its replacement (JobQueue.restart_stream).
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from call_metrics import MetricsSink, record_cache_hit, record_escalation, record_local_answer
+from context_window import from_pairs, message_tokens
+from job_queue import PROVIDER_CONCURRENCY, JobQueue, LeaseLost
+from llm_client import get_chat_model
+from metrics_callback import MetricsCallback
+from model_cascade import LARGE_MODEL, first_model, model_identity, review, tier
+from pqrs_pipeline import local_record, prepare_pqrs
+from pqrs_record import OUTPUT_MODE, bind_structured
+from prompt_assembly import STATIC_PROMPT
+from prompt_retrieval import prompt_cache_identity
+from rate_limiter import COMPLETION_ESTIMATE, acall_with_retries, get_rate_limiter
+from response_cache import ResponseCache, prompt_fingerprint
+
+# Streamed tokens are written to the queue in batches at most this often
+FLUSH_INTERVAL = float(os.getenv("PQRS_WORKER_FLUSH_INTERVAL", "0.05"))
+IDLE_SLEEP = 0.2
+PURGE_EVERY = 3600
+
+
+class Worker:
+    def __init__(self, queue, cache, metrics, name, limiter=None):
+        self.queue = queue
+        self.cache = cache
+        self.metrics = metrics
+        self.name = name
+        self.limiter = limiter or get_rate_limiter()
+
+    async def acquire_slot(self, holder):
+        while True:
+            slot = await asyncio.to_thread(self.queue.acquire_slot, holder)
+            if slot is not None:
+                return slot
+            await asyncio.sleep(IDLE_SLEEP / 4)
+
+    async def answer(self, job, holder):
+        """Run the model for `job`, streaming tokens to the queue; return the final response."""
+        is_pqrs = job.kind == "pqrs"
+        fingerprint = prompt_fingerprint(prompt_cache_identity(), model_identity(), job.temperature, job.fields)
+        if is_pqrs and self.cache is not None:
+            lookup_start = time.perf_counter()
+            cached = await asyncio.to_thread(self.cache.get, job.text, fingerprint)
+            if cached is not None:
+                record_cache_hit(self.metrics, "worker", model_identity(), time.perf_counter() - lookup_start)
+                return cached
+
+        local_start = time.perf_counter()
+        prepared = prepare_pqrs(job.text, job.fields) if is_pqrs else None
+        record = local_record(prepared) if prepared else None
+        if record is not None:
+            record_local_answer(self.metrics, "worker", time.perf_counter() - local_start)
+            return record.to_markdown()
+        structured = prepared is not None and OUTPUT_MODE == "json"
+        messages = [
+            SystemMessage(content=prepared.system_prompt if prepared else STATIC_PROMPT),
+            *from_pairs(job.context),
+            HumanMessage(content=prepared.human_message if prepared else job.text),
+        ]
+
+        async def ask(model, first_seq):
+            """(answer, seq after its last token) of `model`, streamed from `first_seq` on."""
+            chat_model = get_chat_model(model, job.temperature)
+            if structured:
+                chat_model = bind_structured(chat_model)
+            streamed = []
+
+            async def call(attempt):
+                retried = int(job.attempts > 1 or attempt > 0)
+                callbacks = [MetricsCallback(self.metrics, "worker", model, retried, pqrs=is_pqrs, tier=tier(model))]
+                return await self.stream(job, chat_model, messages, callbacks, holder, streamed, first_seq)
+
+            # Tokens already in the queue cannot be taken back, so only retry before the first one
+            text = await acall_with_retries(call, message_tokens(messages) + COMPLETION_ESTIMATE, self.limiter,
+                                            can_retry=lambda exc: not streamed)
+            return text, first_seq + len(streamed)
+
+        model = first_model(prepared)
+        text, seq = await ask(model, 0)
+        if prepared is None:
+            return text
+        response_text, record, reason = review(text, prepared, structured)
+        if reason is not None and model != LARGE_MODEL:
+            record_escalation(self.metrics, "worker", model, reason)
+            # The app replaces the small model's answer with the one that follows
+            await asyncio.to_thread(self.queue.restart_stream, job.id, job.attempts, seq,
+                                    f"Respuesta revisada con {LARGE_MODEL}: {reason}")
+            text, seq = await ask(LARGE_MODEL, seq)
+            response_text, record, reason = review(text, prepared, structured)
+        if structured and record is None:
+            raise ValueError(f"Respuesta del modelo no válida: {reason}")
+        if is_pqrs and self.cache is not None:
+            await asyncio.to_thread(self.cache.put, job.text, fingerprint, response_text)
+        return response_text
+
+    async def stream(self, job, chat_model, messages, callbacks, holder, streamed, first_seq=0):
+        """One model call for `job`, appending its tokens to `streamed` and to the queue from `first_seq` on."""
+        text, pending, seq, last_flush = "", [], first_seq, time.monotonic()
+        slot = await self.acquire_slot(holder)
+        try:
+            async for chunk in chat_model.astream(messages, config={"callbacks": callbacks}):
+                if not chunk.content:
+                    continue
+                text += chunk.content
+                streamed.append(chunk.content)
+                pending.append(chunk.content)
+                if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                    await asyncio.to_thread(self.queue.append_tokens, job.id, job.attempts, seq, pending)
+                    seq, pending, last_flush = seq + len(pending), [], time.monotonic()
+        finally:
+            await asyncio.to_thread(self.queue.release_slot, slot, holder)
+        if pending:
+            await asyncio.to_thread(self.queue.append_tokens, job.id, job.attempts, seq, pending)
+        return text
+
+    async def keep_lease(self, job):
+        """Renew the claim on `job` until it is lost (rate-limit waits and retries can outlast one lease)."""
+        while True:
+            await asyncio.sleep(self.queue.lease / 3)
+            if not await asyncio.to_thread(self.queue.renew, job.id, job.attempts):
+                return
+
+    async def run_task(self, index, stop):
+        holder = f"{self.name}/{index}"
+        while not stop.is_set():
+            job = await asyncio.to_thread(self.queue.claim, holder)
+            if job is None:
+                await asyncio.sleep(IDLE_SLEEP)
+                continue
+            answer = asyncio.create_task(self.answer(job, holder))
+            heartbeat = asyncio.create_task(self.keep_lease(job))
+            await asyncio.wait([answer, heartbeat], return_when=asyncio.FIRST_COMPLETED)
+            heartbeat.cancel()
+            if not answer.done():
+                # Re-queued and maybe claimed by another worker: stop calling the model for it
+                answer.cancel()
+                await asyncio.gather(answer, return_exceptions=True)
+                print(f"{job.id}: lease lost, abandoned", file=sys.stderr)
+                continue
+            try:
+                response_text = answer.result()
+            except LeaseLost:
+                print(f"{job.id}: lease lost, abandoned", file=sys.stderr)
+            except Exception as exc:
+                await asyncio.to_thread(self.queue.fail, job.id, job.attempts, f"{type(exc).__name__}: {exc}")
+                print(f"{job.id}: error {exc}", file=sys.stderr)
+            else:
+                await asyncio.to_thread(self.queue.finish, job.id, job.attempts, response_text)
+
+    async def run(self, concurrency, stop=None):
+        stop = stop or asyncio.Event()
+        tasks = [asyncio.create_task(self.run_task(i, stop)) for i in range(concurrency)]
+        while not stop.is_set():
+            removed = await asyncio.to_thread(self.queue.purge)
+            if removed:
+                print(f"{self.name}: purged {removed} finished jobs", file=sys.stderr)
+            try:
+                await asyncio.wait_for(stop.wait(), PURGE_EVERY)
+            except asyncio.TimeoutError:
+                pass
+        await asyncio.gather(*tasks)
+
+
+def serve(concurrency, use_cache=True):
+    load_dotenv()
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    worker = Worker(JobQueue(concurrency=PROVIDER_CONCURRENCY), ResponseCache() if use_cache else None, MetricsSink(), name)
+    print(f"{name}: {concurrency} tasks", file=sys.stderr)
+    try:
+        asyncio.run(worker.run(concurrency))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio de trabajadores para PQRS_BACKEND=queue")
+    parser.add_argument("--concurrency", type=int, default=8, help="Tareas asyncio por proceso")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de respuestas")
+    args = parser.parse_args(argv)
+
+    if args.processes == 1:
+        serve(args.concurrency, not args.no_cache)
+        return
+    processes = [
+        multiprocessing.Process(target=serve, args=(args.concurrency, not args.no_cache))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    # Stopping the parent (e.g. from a process manager) stops every worker
+    signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes])
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
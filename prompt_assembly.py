@@ -0,0 +1,137 @@
+"""Canonical, versioned layout of the system prompt.
+
+Provider prompt caches reuse the longest previously seen prefix of a
+request (OpenAI: from 1024 tokens, in 128-token steps), so every byte of
+the static part of the prompt must be identical on every call, in every
+session and process, and nothing that varies per request may come before
+it. This module splits SYSTEM_PROMPT into its parts once and reassembles
+them in a fixed order:
+
+  1. frozen instructions (role and table template)
+  2. the Direcciones catalog
+  3. the Tipo de Tramite options
+
+Text is canonicalized (NFC, "\n" line ends, no trailing blanks) and
+PROMPT_ID names the result: PROMPT_VERSION plus a hash of the bytes.
+Anything dynamic (retrieved Direcciones, JSON instructions, routing and
+prefill hints, history) goes after the static sections or in later
+messages.
+"""
+import hashlib
+import re
+import unicodedata
+from collections import namedtuple
+
+from prompts import SYSTEM_PROMPT
+
+# Bump when the wording or order of the static sections changes on purpose
+PROMPT_VERSION = "1"
+
+Record = namedtuple("Record", ["kind", "code", "title", "text"])
+
+DIRECCION_PATTERN = re.compile(r'^(\d+)\. (.+?) \((\w+)\):\s*$')
+TRAMITE_ROW_PATTERN = re.compile(r'^\| Tipo de Tramite\s*\| \[(.*)\] \|\s*$', re.MULTILINE)
+TRAMITE_ROW_REFERENCE = (
+    "| Tipo de Tramite              | [Uno o más de los Tipos de Trámite listados al final, separados por coma] |"
+)
+CATALOG_HEADING = "## Direcciones CAR y sus Competencias:"
+REGIONAL_INTRO = (
+    "Cada Dirección Regional adicionalmente puede especializarse en aspectos particulares "
+    "según su territorio específico:"
+)
+TRAMITES_HEADING = "## Tipos de Trámite (valores permitidos para Tipo de Tramite):"
+
+
+def split_options(text):
+    """Split a comma-separated option list from the template, respecting parentheses."""
+    items, current, depth = [], "", 0
+    for ch in text:
+        if ch == "," and depth == 0:
+            items.append(current)
+            current = ""
+            continue
+        depth = max(0, depth + (ch == "(") - (ch == ")"))
+        current += ch
+    items.append(current)
+
+    options = []
+    for item in (item.strip() for item in items):
+        # "Dp, de oficio Permisivos" is a single option with a stray comma
+        if options and len(options[-1]) <= 2:
+            options[-1] = f"{options[-1]}, {item}"
+        elif item:
+            options.append(item)
+    return options
+
+
+def split_prompt(system_prompt=SYSTEM_PROMPT):
+    """Split the prompt into header, Dirección records, instructions and trámite records."""
+    lines = system_prompt.split("\n")
+    header, direcciones, current = [], [], None
+    for index, line in enumerate(lines):
+        match = DIRECCION_PATTERN.match(line.strip())
+        if match:
+            current = [match.group(3), match.group(2), [line.strip()]]
+            direcciones.append(current)
+        elif line.startswith("When receiving a PQRS"):
+            instructions = "\n".join(lines[index:])
+            break
+        elif current is None:
+            header.append(line)
+        elif line.strip().startswith("•"):
+            current[2].append(line.strip())
+
+    tramites = split_options(TRAMITE_ROW_PATTERN.search(instructions).group(1))
+    return {
+        "header": "\n".join(line for line in header if not line.startswith("##")).strip(),
+        "direcciones": [Record("direccion", code, title, "\n".join(text)) for code, title, text in direcciones],
+        "tramites": [Record("tramite", None, tramite, tramite) for tramite in tramites],
+        "instructions": instructions,
+    }
+
+
+PARTS = split_prompt()
+
+
+def canonicalize(text):
+    """NFC text with "\n" line ends, no trailing blanks and at most one blank line in a row."""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    return re.sub(r"\n{3,}", "\n\n", text).strip() + "\n"
+
+
+def frozen_instructions():
+    """Role and table template; the trámite options are listed in their own section."""
+    instructions = TRAMITE_ROW_PATTERN.sub(lambda _: TRAMITE_ROW_REFERENCE, PARTS["instructions"], count=1)
+    return f"{PARTS['header']}\n\n{instructions}"
+
+
+def catalog_section(records, heading=CATALOG_HEADING):
+    blocks = [heading]
+    for record in records:
+        if record.title.startswith("Dirección Regional ") and REGIONAL_INTRO not in blocks:
+            blocks.append(REGIONAL_INTRO)
+        blocks.append(record.text)
+    return "\n\n".join(blocks)
+
+
+def tramites_section(records):
+    return TRAMITES_HEADING + "\n" + "\n".join(f"- {record.text}" for record in records)
+
+
+def assemble(static_sections, dynamic_sections=()):
+    """Canonical prompt: static sections first, then the per-request ones."""
+    return canonicalize("\n\n".join([*static_sections, *dynamic_sections]))
+
+
+STATIC_PROMPT = assemble([
+    frozen_instructions(),
+    catalog_section(PARTS["direcciones"]),
+    tramites_section(PARTS["tramites"]),
+])
+PROMPT_ID = f"v{PROMPT_VERSION}-{hashlib.sha256(STATIC_PROMPT.encode('utf-8')).hexdigest()[:12]}"
+
+
+def prompt_id(text):
+    """PROMPT_ID-style name for any assembled prompt, for logs and checks."""
+    return f"v{PROMPT_VERSION}-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]}"
@@ -0,0 +1,127 @@
+"""Retrieval stage that slims the system prompt down to the Direcciones relevant to a PQRS.
+
+The Dirección and Tipo de Trámite records split from SYSTEM_PROMPT by
+prompt_assembly are indexed with BM25 over a NumPy term-frequency matrix,
+fully offline. With PQRS_PROMPT_MODE=retrieval each PQRS is sent with only
+the top-k candidate Direcciones and the list of Direcciones Regionales
+used for location routing. Trimming the trámite list as well
+(PQRS_TOP_K_TRAMITES) is opt-in: trámite names are short and lexical
+recall on them is much lower than on Direcciones.
+"""
+import os
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+from prompt_assembly import PARTS, STATIC_PROMPT, assemble, catalog_section, frozen_instructions, tramites_section
+
+PROMPT_MODE = os.getenv("PQRS_PROMPT_MODE", "full")  # "full" or "retrieval"
+TOP_K_DIRECCIONES = int(os.getenv("PQRS_TOP_K_DIRECCIONES", "6"))
+TOP_K_TRAMITES = int(os.getenv("PQRS_TOP_K_TRAMITES", "0"))  # 0 keeps the full list
+
+STOPWORDS = set("""
+a al con de del el en la las lo los para por que se su sus un una y o e u
+sobre entre como mas segun ante bajo este esta estos estas ese esa
+""".split())
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    """Lowercase, accent-free word stems (6-char prefixes) without stopwords."""
+    return [word[:6] for word in re.findall(r'[a-z0-9]+', normalize(text))
+            if len(word) > 2 and word not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a dense NumPy term-frequency matrix."""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        tokenized = [tokenize(document) for document in documents]
+        self.vocabulary = {term: i for i, term in enumerate(sorted({t for doc in tokenized for t in doc}))}
+        self.tf = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, doc in enumerate(tokenized):
+            for term, count in Counter(doc).items():
+                self.tf[row, self.vocabulary[term]] = count
+        lengths = self.tf.sum(axis=1)
+        df = (self.tf > 0).sum(axis=0)
+        self.idf = np.log(1 + (len(documents) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Precompute the length-normalised denominator term of BM25
+        self.norm = (k1 * (1 - b + b * lengths / max(lengths.mean(), 1)))[:, None].astype(np.float32)
+        self.k1 = k1
+
+    def query_vector(self, text):
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for term in tokenize(text):
+            index = self.vocabulary.get(term)
+            if index is not None:
+                vector[index] = 1.0
+        return vector
+
+    def scores(self, text):
+        tf = self.tf
+        weights = tf * (self.k1 + 1) / (tf + self.norm)
+        return weights @ (self.idf * self.query_vector(text))
+
+    def top_k(self, text, k):
+        scores = self.scores(text)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [int(i) for i in order if scores[i] > 0]
+
+
+REGIONALES = [record for record in PARTS["direcciones"] if record.title.startswith("Dirección Regional ")]
+# Regional offices are always listed (briefly) for location routing, so only
+# the central Direcciones compete in retrieval
+CENTRALES = [record for record in PARTS["direcciones"] if record not in REGIONALES and record.code != "DR"]
+DIRECCION_INDEX = BM25Index([record.text for record in CENTRALES])
+TRAMITE_INDEX = BM25Index([record.text for record in PARTS["tramites"]])
+
+
+def candidate_direcciones(pqrs_text, k=TOP_K_DIRECCIONES):
+    return [CENTRALES[i] for i in DIRECCION_INDEX.top_k(pqrs_text, k)]
+
+
+def candidate_tramites(pqrs_text, k=TOP_K_TRAMITES):
+    return [PARTS["tramites"][i] for i in TRAMITE_INDEX.top_k(pqrs_text, k)]
+
+
+def build_slim_prompt(pqrs_text, k=TOP_K_DIRECCIONES, k_tramites=TOP_K_TRAMITES):
+    """System prompt restricted to the records relevant to `pqrs_text`.
+
+    The sections shared by every PQRS come first, so they still form a
+    cacheable prefix; the candidates (and a trimmed trámite list) follow.
+    """
+    direcciones = candidate_direcciones(pqrs_text, k)
+    # The general regional competencies (18) always accompany the regional list
+    general = [record for record in PARTS["direcciones"] if record.code == "DR"]
+    regionales = "\n".join(f"• {record.code}: {record.title}" for record in REGIONALES)
+    static = [
+        frozen_instructions(),
+        "## Direcciones Regionales (asignar según el municipio, vereda o predio):\n" + regionales,
+    ]
+    dynamic = [catalog_section(direcciones + general, "## Direcciones CAR candidatas para esta PQRS:")]
+    if k_tramites:
+        tramites = candidate_tramites(pqrs_text, k_tramites) or PARTS["tramites"][:k_tramites]
+        dynamic.append(tramites_section(tramites))
+    else:
+        static.append(tramites_section(PARTS["tramites"]))
+    return assemble(static, dynamic)
+
+
+def system_prompt_for(pqrs_text):
+    """System prompt to send with a PQRS classification, according to PQRS_PROMPT_MODE."""
+    if PROMPT_MODE == "retrieval":
+        return build_slim_prompt(pqrs_text)
+    return STATIC_PROMPT
+
+
+def prompt_cache_identity():
+    """Prompt identity for cache keys; the slim prompt itself is a function of the PQRS text."""
+    if PROMPT_MODE == "retrieval":
+        return f"{STATIC_PROMPT}\x00retrieval:{TOP_K_DIRECCIONES}:{TOP_K_TRAMITES}"
+    return STATIC_PROMPT
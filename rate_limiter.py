@@ -0,0 +1,337 @@
+"""Process-wide rate limiting, retries and circuit breaking for model calls.
+
+Every model call of the process (all Streamlit sessions, the worker's
+tasks, a batch run) first reserves one request and its estimated tokens
+from the shared RateLimiter: two token buckets, for requests and tokens
+per minute. Reservations may overdraw the buckets, so callers queue in
+FIFO order and each one knows its position and ETA while it waits.
+
+The limits follow the provider: llm_client hands every HTTP response to
+observe(), which takes the x-ratelimit-* headers as the real limits and
+remaining budget (PQRS_RPM_LIMIT and PQRS_TPM_LIMIT set them before the
+first response; by default there is no limit until the provider reports
+one). A 429 pauses every caller for its Retry-After; one that does not
+report the remaining budget also halves the pace (once per pause), which
+then recovers by PACE_RECOVERY per successful response.
+
+call_with_retries() retries 429s, 5xx and connection errors with
+exponential backoff and full jitter. The CircuitBreaker opens after
+PQRS_BREAKER_FAILURES consecutive provider failures (429s do not count),
+fails calls fast for PQRS_BREAKER_COOLDOWN seconds and then lets a single
+trial call through.
+"""
+import asyncio
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+
+# 0 leaves the limit to the provider's headers
+RPM_LIMIT = float(os.getenv("PQRS_RPM_LIMIT", "0"))
+TPM_LIMIT = float(os.getenv("PQRS_TPM_LIMIT", "0"))
+MAX_RETRIES = int(os.getenv("PQRS_MAX_RETRIES", "4"))
+BREAKER_FAILURES = int(os.getenv("PQRS_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("PQRS_BREAKER_COOLDOWN", "30"))
+# Completion tokens reserved for each call, on top of its prompt
+COMPLETION_ESTIMATE = int(os.getenv("PQRS_COMPLETION_ESTIMATE", "700"))
+# Share of the limits the pace never drops below, and its recovery per success
+MIN_PACE = 0.1
+PACE_RECOVERY = 0.05
+
+RETRYABLE_STATUS = {408, 409, 429}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_SECONDS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+Reservation = namedtuple("Reservation", ["id", "ready_at", "tokens"])
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit breaker is open."""
+
+    def __init__(self, retry_in):
+        super().__init__(f"circuit breaker open, retry in {retry_in:.0f} s")
+        self.retry_in = retry_in
+
+
+def status_code(exc):
+    code = getattr(exc, "status_code", None)
+    if code is None and getattr(exc, "response", None) is not None:
+        code = getattr(exc.response, "status_code", None)
+    return code
+
+
+def is_retryable(exc):
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS or code >= 500
+    return isinstance(exc, (asyncio.TimeoutError, ConnectionError)) or type(exc).__name__ in (
+        "APIConnectionError",
+        "APITimeoutError",
+    )
+
+
+def is_provider_failure(exc):
+    """Whether `exc` means the provider is down, as opposed to busy (429) or refusing the request (4xx)."""
+    code = status_code(exc)
+    return code >= 500 if code is not None else is_retryable(exc)
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def parse_duration(value):
+    """Seconds in an OpenAI reset header ("20ms", "1.5s", "6m0s"); None when missing."""
+    parts = _DURATION_PART.findall(value or "")
+    return sum(float(number) * _SECONDS[unit] for number, unit in parts) if parts else None
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(headers):
+    """Seconds a 429 asks to wait (retry-after-ms, then retry-after); None when it does not say."""
+    milliseconds = _number(headers.get("retry-after-ms"))
+    return milliseconds / 1000 if milliseconds is not None else _number(headers.get("retry-after"))
+
+
+class TokenBucket:
+    """`limit` units per minute, refilled continuously; reservations may overdraw it."""
+
+    def __init__(self, limit, now):
+        self.limit = limit
+        self.level = limit
+        self.updated = now
+
+    def refill(self, now, pace=1.0):
+        self.level = min(self.limit, self.level + (now - self.updated) * self.limit * pace / 60)
+        self.updated = now
+
+    def reserve(self, amount, now, pace=1.0):
+        """Take `amount`; return the seconds until the bucket has covered it."""
+        self.refill(now, pace)
+        self.level -= amount
+        return max(0.0, -self.level * 60 / (self.limit * pace))
+
+
+class CircuitBreaker:
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError while open; after the cooldown let one trial call through."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+            if self.trial:
+                raise CircuitOpenError(self.cooldown)
+            self.trial = True
+
+    def record_success(self):
+        """The provider answered (a 429 or a 4xx also proves it is up)."""
+        with self._lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive += 1
+            if self.trial or self.consecutive >= self.failures:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() < self.opened_at + self.cooldown else "half_open"
+
+
+class RateLimiter:
+    def __init__(self, rpm=RPM_LIMIT, tpm=TPM_LIMIT, breaker=None):
+        now = time.monotonic()
+        # None until a limit is configured or reported
+        self.requests = TokenBucket(rpm, now) if rpm else None
+        self.tokens = TokenBucket(tpm, now) if tpm else None
+        self.breaker = breaker or CircuitBreaker()
+        self.pace = 1.0
+        self.paused_until = 0.0
+        self.pending = {}
+        self.rate_limited = 0
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=0):
+        """Queue one call that will use about `tokens` tokens."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.paused_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now, self.pace))
+            if self.tokens is not None and tokens:
+                wait = max(wait, self.tokens.reserve(tokens, now, self.pace))
+            reservation = Reservation(next(self._ids), now + wait, tokens)
+            self.pending[reservation.id] = reservation.ready_at
+            return reservation
+
+    def position(self, reservation):
+        """(1-based place in the queue, seconds left) for a pending reservation."""
+        with self._lock:
+            ahead = sum(1 for ready_at in self.pending.values() if ready_at < reservation.ready_at)
+            eta = max(reservation.ready_at, self.paused_until) - time.monotonic()
+            return ahead + 1, max(0.0, eta)
+
+    def release(self, reservation):
+        with self._lock:
+            self.pending.pop(reservation.id, None)
+
+    def wait(self, reservation, on_wait=None, interval=1.0):
+        """Block until `reservation` may call, reporting (position, eta) to `on_wait` meanwhile."""
+        try:
+            while True:
+                position, eta = self.position(reservation)
+                if eta <= 0:
+                    return
+                if on_wait is not None:
+                    on_wait(position, eta)
+                time.sleep(min(interval, eta))
+        finally:
+            self.release(reservation)
+
+    async def await_turn(self, reservation, interval=1.0):
+        try:
+            while True:
+                _, eta = self.position(reservation)
+                if eta <= 0:
+                    return
+                await asyncio.sleep(min(interval, eta))
+        finally:
+            self.release(reservation)
+
+    def observe(self, status, headers):
+        """Adapt to one provider response: its x-ratelimit-* headers and, for a 429, its Retry-After."""
+        with self._lock:
+            now = time.monotonic()
+            resets = []
+            reported = False
+            for kind in ("requests", "tokens"):
+                limit = _number(headers.get(f"x-ratelimit-limit-{kind}"))
+                remaining = _number(headers.get(f"x-ratelimit-remaining-{kind}"))
+                bucket = getattr(self, kind)
+                if bucket is None:
+                    if not limit:
+                        continue
+                    bucket = TokenBucket(limit, now)
+                    setattr(self, kind, bucket)
+                bucket.refill(now, self.pace)
+                if limit:
+                    bucket.limit = limit
+                if remaining is not None:
+                    reported = True
+                    # Other processes share the same key, so the provider may know of fewer left
+                    bucket.level = min(bucket.level, remaining)
+                    if remaining < 1:
+                        resets.append(parse_duration(headers.get(f"x-ratelimit-reset-{kind}")) or 0.0)
+            if status == 429:
+                self.rate_limited += 1
+                # Without headers saying what is left, slow down (once per burst of 429s)
+                if not reported and now >= self.paused_until:
+                    self.pace = max(MIN_PACE, self.pace / 2)
+                pause = retry_after(headers)
+                if pause is None:
+                    pause = max(resets, default=1.0)
+                self.paused_until = max(self.paused_until, now + pause)
+            elif status < 400:
+                self.pace = min(1.0, self.pace + PACE_RECOVERY)
+
+    def status(self):
+        with self._lock:
+            return {
+                "queued": len(self.pending),
+                "pace": self.pace,
+                "rate_limited": self.rate_limited,
+                "paused_for": max(0.0, self.paused_until - time.monotonic()),
+                "rpm": self.requests.limit if self.requests is not None else None,
+                "tpm": self.tokens.limit if self.tokens is not None else None,
+                "breaker": self.breaker.state(),
+            }
+
+
+_lock = threading.Lock()
+_limiter = None
+
+
+def get_rate_limiter():
+    """The limiter shared by every model call of this process."""
+    global _limiter
+    with _lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
+
+
+def _record_outcome(breaker, exc):
+    if is_provider_failure(exc):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def call_with_retries(call, tokens=0, limiter=None, max_retries=MAX_RETRIES, on_wait=None, can_retry=None):
+    """Return `call(attempt)`, run in turn with the rate limit and retried on provider errors.
+
+    `on_wait(position, eta, attempt)` is called while the call is queued.
+    `can_retry(exc)` may refuse a retry, e.g. once part of an answer was streamed.
+    """
+    limiter = limiter or get_rate_limiter()
+    for attempt in range(max_retries + 1):
+        report = None
+        if on_wait is not None:
+            report = lambda position, eta: on_wait(position, eta, attempt)  # noqa: E731
+        limiter.wait(limiter.reserve(tokens), report)
+        limiter.breaker.before_call()
+        try:
+            result = call(attempt)
+        except Exception as exc:
+            _record_outcome(limiter.breaker, exc)
+            if attempt == max_retries or not is_retryable(exc) or (can_retry is not None and not can_retry(exc)):
+                raise
+            time.sleep(backoff_delay(attempt))
+        else:
+            limiter.breaker.record_success()
+            return result
+
+
+async def acall_with_retries(call, tokens=0, limiter=None, max_retries=MAX_RETRIES, can_retry=None):
+    """call_with_retries() for a coroutine function `call(attempt)`."""
+    limiter = limiter or get_rate_limiter()
+    for attempt in range(max_retries + 1):
+        await limiter.await_turn(limiter.reserve(tokens))
+        limiter.breaker.before_call()
+        try:
+            result = await call(attempt)
+        except Exception as exc:
+            _record_outcome(limiter.breaker, exc)
+            if attempt == max_retries or not is_retryable(exc) or (can_retry is not None and not can_retry(exc)):
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+        else:
+            limiter.breaker.record_success()
+            return result
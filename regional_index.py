@@ -0,0 +1,235 @@
+"""Deterministic municipio → Dirección Regional routing.
+
+The CAR jurisdiction is a static table, so routing a PQRS to its regional
+office does not need the model. This module builds an accent- and
+case-insensitive index of the municipios (and, optionally, veredas) of each
+Dirección Regional once at import, and scans the PQRS text for them before
+the model is called. A match is injected into the request as a routing
+hint and enforced on the model's Dirección Asignada afterwards.
+
+Municipios of Sabana Centro and Bajo Magdalena are not listed: the prompt
+has no Dirección Regional for them, so those PQRS are left to the model.
+"""
+import csv
+import difflib
+import os
+import re
+import unicodedata
+from collections import namedtuple
+
+# Optional CSV (columns: vereda, municipio) to extend the index with veredas
+VEREDAS_PATH = os.getenv("PQRS_VEREDAS_PATH")
+FUZZY_CUTOFF = float(os.getenv("PQRS_REGIONAL_FUZZY_CUTOFF", "0.85"))
+
+REGIONALES = {
+    "DRAG": "Dirección Regional Almeidas y Guatavita",
+    "DRAM": "Dirección Regional Alto Magdalena",
+    "DRBC": "Dirección Regional Bogotá la Calera",
+    "DRCH": "Dirección Regional Chiquinquirá",
+    "DRGU": "Dirección Regional Gualivá",
+    "DRMC": "Dirección Regional Magdalena Centro",
+    "DRRN": "Dirección Regional Rio Negro",
+    "DRSO": "Dirección Regional Sabana Occidente",
+    "DRSOA": "Dirección Regional Soacha",
+    "DRSU": "Dirección Regional Sumapaz",
+    "DRTE": "Dirección Regional Tequendama",
+    "DRUB": "Dirección Regional Ubaté",
+}
+
+MUNICIPIOS = {
+    "DRAG": ["Chocontá", "Guatavita", "Machetá", "Manta", "Sesquilé", "Suesca", "Tibirita", "Villapinzón"],
+    "DRAM": ["Agua de Dios", "Girardot", "Guataquí", "Jerusalén", "Nariño", "Nilo", "Ricaurte", "Tocaima"],
+    "DRBC": ["Bogotá", "La Calera"],
+    "DRCH": ["Buenavista", "Caldas", "Chiquinquirá", "Ráquira", "Saboyá", "San Miguel de Sema"],
+    "DRGU": ["Albán", "La Peña", "La Vega", "Nimaima", "Nocaima", "Quebradanegra", "San Francisco",
+             "Sasaima", "Supatá", "Útica", "Vergara", "Villeta"],
+    "DRMC": ["Beltrán", "Bituima", "Chaguaní", "Guayabal de Síquima", "Pulí", "San Juan de Rioseco", "Vianí"],
+    "DRRN": ["El Peñón", "La Palma", "Pacho", "Paime", "San Cayetano", "Topaipí", "Villagómez", "Yacopí"],
+    "DRSO": ["Bojacá", "El Rosal", "Facatativá", "Funza", "Madrid", "Mosquera", "Subachoque", "Zipacón"],
+    "DRSOA": ["Soacha", "Sibaté"],
+    "DRSU": ["Arbeláez", "Cabrera", "Fusagasugá", "Granada", "Pandi", "Pasca", "San Bernardo", "Silvania",
+             "Tibacuy", "Venecia"],
+    "DRTE": ["Anapoima", "Anolaima", "Apulo", "Cachipay", "El Colegio", "La Mesa", "Quipile",
+             "San Antonio del Tequendama", "Tena", "Viotá"],
+    "DRUB": ["Carmen de Carupa", "Cucunubá", "Fúquene", "Guachetá", "Lenguazaque", "Simijacá", "Susa",
+             "Sutatausa", "Tausa", "Ubaté"],
+}
+
+ALIASES = {
+    "Mesitas del Colegio": "El Colegio",
+    "Villa de San Diego de Ubaté": "Ubaté",
+    "Quebrada Negra": "Quebradanegra",
+    "Fusa": "Fusagasugá",
+    "Faca": "Facatativá",
+}
+
+# Names that are also common words, surnames or other places: they only count
+# when the text marks them as a location ("municipio de La Mesa", "Caldas, Boyacá")
+AMBIGUOUS = {
+    "bogota", "caldas", "granada", "madrid", "la mesa", "la palma", "la vega", "la pena", "el colegio",
+    "cabrera", "narino", "venecia", "buenavista", "manta", "tena", "susa", "pasca", "san francisco",
+    "san bernardo", "el rosal", "el penon", "ricaurte", "vergara", "jerusalen", "alban", "beltran",
+    "san cayetano", "fusa", "faca", "nilo",
+}
+CUE_WORDS = {"municipio", "mpio", "alcaldia", "vereda", "corregimiento", "inspeccion", "jurisdiccion",
+             "ubicado", "ubicada", "ubicados", "ubicadas", "localizado", "localizada", "casco", "urbano"}
+TRAILING_CUES = {"cundinamarca", "boyaca", "cund"}
+EXCLUDED_PREFIXES = {"rio", "sabana", "cuenca"}
+CUE_WINDOW = 4
+
+RegionalMatch = namedtuple("RegionalMatch", ["municipio", "codigo", "regional", "via"])
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    return re.findall(r'[a-z0-9]+', normalize(text))
+
+
+def _build_index():
+    index = {}
+    for codigo, municipios in MUNICIPIOS.items():
+        for municipio in municipios:
+            index[municipio] = index[normalize(municipio)] = RegionalMatch(
+                municipio, codigo, REGIONALES[codigo], "municipio"
+            )
+    for alias, municipio in ALIASES.items():
+        index[alias] = index[normalize(alias)] = index[normalize(municipio)]._replace(via="alias")
+    return index
+
+
+def _load_veredas(path, municipios):
+    """Map vereda names to a regional, dropping names shared by different regionals."""
+    veredas = {}
+    if not path or not os.path.exists(path):
+        return veredas
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            match = municipios.get(normalize(row["municipio"]))
+            if match is None:
+                continue
+            key = normalize(row["vereda"])
+            if key in veredas and veredas[key] is not None and veredas[key].codigo != match.codigo:
+                veredas[key] = None
+            elif key not in veredas:
+                veredas[key] = match._replace(via=f"vereda {row['vereda']}")
+    return {key: match for key, match in veredas.items() if match is not None}
+
+
+# Built once per process
+INDEX = _build_index()
+VEREDAS = _load_veredas(VEREDAS_PATH, INDEX)
+NORMALIZED_NAMES = sorted({key for key in INDEX if key == normalize(key)})
+MAX_WORDS = max(len(name.split()) for name in NORMALIZED_NAMES)
+
+
+def lookup_municipio(name):
+    """Regional for a municipio name (exact, then accent/case-insensitive), or None."""
+    return INDEX.get(name) or INDEX.get(normalize(name).strip())
+
+
+def fuzzy_lookup(name):
+    """Closest municipio name for misspellings such as 'Fusagasuga' or 'Zipacom'."""
+    candidates = difflib.get_close_matches(normalize(name), NORMALIZED_NAMES, n=1, cutoff=FUZZY_CUTOFF)
+    if not candidates:
+        return None
+    return INDEX[candidates[0]]._replace(via="fuzzy")
+
+
+def _has_cue(words, start, end):
+    window = words[max(0, start - CUE_WINDOW):start]
+    return bool(CUE_WORDS.intersection(window)) or (end < len(words) and words[end] in TRAILING_CUES)
+
+
+def scan_locations(text):
+    """Yield (match, has_cue) for every municipio or vereda mentioned in `text`."""
+    words = tokenize(text)
+    position = 0
+    while position < len(words):
+        for size in range(min(MAX_WORDS, len(words) - position), 0, -1):
+            name = " ".join(words[position:position + size])
+            match = INDEX.get(name)
+            if match is None and position and words[position - 1] == "vereda":
+                match = VEREDAS.get(name)
+            if match is None:
+                continue
+            has_cue = _has_cue(words, position, position + size)
+            excluded = position and words[position - 1] in EXCLUDED_PREFIXES
+            if not excluded and (has_cue or name not in AMBIGUOUS):
+                yield match, has_cue
+                position += size - 1
+                break
+        else:
+            # Misspelled municipio right after an explicit "municipio de"
+            if position >= 2 and words[position - 2] == "municipio" and words[position - 1] == "de":
+                for size in range(min(MAX_WORDS, len(words) - position), 0, -1):
+                    match = fuzzy_lookup(" ".join(words[position:position + size]))
+                    if match is not None:
+                        yield match, True
+                        position += size - 1
+                        break
+        position += 1
+
+
+def find_regional(text):
+    """Return the RegionalMatch the PQRS points to, or None when absent or ambiguous.
+
+    Mentions marked as locations weigh double; when two regionals tie the
+    decision is left to the model.
+    """
+    scores, first = {}, {}
+    for match, has_cue in scan_locations(text):
+        scores[match.codigo] = scores.get(match.codigo, 0) + (2 if has_cue else 1)
+        first.setdefault(match.codigo, match)
+    if not scores:
+        return None
+    ranked = sorted(scores.items(), key=lambda item: -item[1])
+    if len(ranked) > 1 and ranked[0][1] == ranked[1][1]:
+        return None
+    return first[ranked[0][0]]
+
+
+def routing_hint(match):
+    """Text appended to the PQRS so the model uses the deterministic routing."""
+    return (
+        f"\n\n[Enrutamiento territorial: {match.municipio} pertenece a la jurisdicción de la "
+        f"{match.regional} ({match.codigo}). Si el asunto corresponde a una Dirección Regional, "
+        f"asigna esta.]"
+    )
+
+
+DIRECCION_ROW_PATTERN = re.compile(r'^(\|\s*Dirección Asignada\s*\|)([^|\n]*)(\|?)', re.MULTILINE)
+REGIONAL_CODE_PATTERN = re.compile(r'\b(' + "|".join(sorted(REGIONALES, key=len, reverse=True)) + r')\b')
+
+
+def resolve_direccion(assigned, match):
+    """The Dirección Asignada to keep, given the model's value and the deterministic match.
+
+    Assignments to central Direcciones are left alone: the PQRS may be about
+    something no regional office handles.
+    """
+    if match is None:
+        return assigned
+    code = REGIONAL_CODE_PATTERN.search(assigned)
+    if code is None and "regional" not in normalize(assigned):
+        return assigned
+    if code is not None and code.group(1) == match.codigo:
+        return assigned
+    return f"{match.regional} ({match.codigo})"
+
+
+def apply_regional_routing(response_text, match):
+    """Override a regional Dirección Asignada in a markdown table that contradicts `match`."""
+    if match is None:
+        return response_text
+
+    def replace(row):
+        value = resolve_direccion(row.group(2).strip(), match)
+        if value == row.group(2).strip():
+            return row.group(0)
+        return f"{row.group(1)} {value} {row.group(3)}"
+
+    return DIRECCION_ROW_PATTERN.sub(replace, response_text, count=1)
@@ -0,0 +1,234 @@
+"""Persistent cache of model responses for repeated PQRS.
+
+Exact repeats are looked up by a key built from the normalized PQRS text
+and a fingerprint of the prompt, model and temperature. A second, optional
+tier stores a MinHash signature of every cached PQRS (banded for LSH) so a
+near-duplicate can be reported as "probable duplicado" without a model call.
+"""
+import array
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+
+CACHE_PATH = os.getenv("PQRS_CACHE_PATH", os.path.join(".cache", "pqrs_responses.sqlite3"))
+CACHE_TTL = float(os.getenv("PQRS_CACHE_TTL", str(30 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("PQRS_CACHE_MAX_ENTRIES", "50000"))
+CACHE_MAX_BYTES = int(os.getenv("PQRS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("PQRS_NEAR_DUPLICATE_THRESHOLD", "0.75"))
+
+# MinHash layout: NUM_PERM hash functions split into BANDS bands for LSH
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 2
+EVICT_EVERY = 100
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed coefficients so signatures are comparable across processes
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8], "big") % _MERSENNE_PRIME | 1,
+     int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8], "big") % _MERSENNE_PRIME)
+    for i in range(NUM_PERM)
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    response TEXT NOT NULL,
+    radicado TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    signature BLOB
+);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at);
+CREATE TABLE IF NOT EXISTS minhash_bands (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    key TEXT NOT NULL REFERENCES responses (key) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS minhash_bands_lookup ON minhash_bands (band, bucket);
+CREATE INDEX IF NOT EXISTS minhash_bands_key ON minhash_bands (key);
+"""
+
+
+def normalize_text(text):
+    """Case-, accent- and whitespace-insensitive form of a PQRS text."""
+    text = re.sub(r'^\s*pqrs\s*:', '', text, flags=re.IGNORECASE)
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.split())
+
+
+def prompt_fingerprint(system_prompt, model, temperature, document_fields=None):
+    """Hash of everything besides the PQRS text that determines the answer.
+
+    `document_fields` are the campos read from the uploaded files (Numero de
+    Folios, Anexos): the same oficio uploaded with other anexos is answered anew.
+    """
+    identity = f"{model}\x00{temperature}\x00{system_prompt}"
+    if document_fields:
+        identity += "\x00" + json.dumps(document_fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def cache_key(text, fingerprint):
+    return hashlib.sha256(f"{fingerprint}\x00{normalize_text(text)}".encode()).hexdigest()
+
+
+def minhash_signature(normalized_text):
+    words = re.findall(r'\w+', normalized_text)
+    shingles = {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_SIZE]).encode())
+        for i in range(max(1, len(words) - SHINGLE_SIZE + 1))
+    }
+    return [
+        min(((a * shingle + b) % _MERSENNE_PRIME) & _MAX_HASH for shingle in shingles)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_buckets(signature):
+    return [
+        (band, zlib.crc32(array.array("I", signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]).tobytes()))
+        for band in range(BANDS)
+    ]
+
+
+def signature_similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL + LRU eviction and size limits."""
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES,
+                 max_bytes=CACHE_MAX_BYTES, near_duplicates=True):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.near_duplicates = near_duplicates
+        self.stats = {"hits": 0, "misses": 0, "near_duplicates": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, text, fingerprint):
+        """Return the cached response for an exact (normalized) repeat, or None."""
+        key = cache_key(text, fingerprint)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._expire(now)
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self.stats["hits"] += 1
+            return row[0]
+
+    def put(self, text, fingerprint, response, radicado=None):
+        key = cache_key(text, fingerprint)
+        now = time.time()
+        signature = minhash_signature(normalize_text(text)) if self.near_duplicates else None
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._expire(now)
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.execute(
+                "INSERT INTO responses (key, fingerprint, response, radicado, size, created_at, last_access, signature)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, fingerprint, response, radicado, len(response.encode()), now, now,
+                 array.array("I", signature).tobytes() if signature else None),
+            )
+            if signature:
+                self._conn.executemany(
+                    "INSERT INTO minhash_bands (band, bucket, key) VALUES (?, ?, ?)",
+                    [(band, bucket, key) for band, bucket in band_buckets(signature)],
+                )
+            self._conn.execute("COMMIT")
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict(now)
+
+    def find_near_duplicate(self, text, threshold=NEAR_DUPLICATE_THRESHOLD):
+        """Return (radicado, similarity, created_at) of the closest cached PQRS above `threshold`.
+
+        radicado is None for PQRS cached without one, such as those typed in the app.
+        """
+        if not self.near_duplicates:
+            return None
+        signature = minhash_signature(normalize_text(text))
+        oldest = time.time() - self.ttl
+        best = None
+        with self._lock:
+            candidates = set()
+            for band, bucket in band_buckets(signature):
+                candidates.update(
+                    row[0] for row in self._conn.execute(
+                        "SELECT key FROM minhash_bands WHERE band = ? AND bucket = ?", (band, bucket)
+                    )
+                )
+            for key in candidates:
+                row = self._conn.execute(
+                    "SELECT radicado, created_at, signature FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or row[2] is None or row[1] < oldest:
+                    continue
+                similarity = signature_similarity(signature, array.array("I", row[2]))
+                if similarity >= threshold and (best is None or similarity > best[1]):
+                    best = (row[0], similarity, row[1])
+            if best is not None:
+                self.stats["near_duplicates"] += 1
+        return best
+
+    def evict(self):
+        with self._lock:
+            self._evict(time.time())
+
+    def _evict(self, now):
+        """Drop expired entries, then least-recently-used ones until within limits."""
+        self._expire(now)
+        count, size = self._size()
+        while count > self.max_entries or size > self.max_bytes:
+            batch = max(count - self.max_entries, count // 10, 1)
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (batch,),
+            )
+            self.stats["evictions"] += min(batch, count)
+            count, size = self._size()
+
+    def _expire(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+
+    def _size(self):
+        return self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+
+    def metrics(self):
+        """Hit/miss counters for this process plus the current size of the cache."""
+        with self._lock:
+            entries, size = self._size()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return dict(self.stats, entries=entries, bytes=size,
+                    hit_rate=self.stats["hits"] / lookups if lookups else 0.0)
@@ -0,0 +1,125 @@
+import os
+import re
+import time
+
+# Render throttle for streamed answers: refresh the UI after this many new
+# table rows or this many seconds, whichever comes first.
+RENDER_EVERY_ROWS = int(os.getenv("PQRS_STREAM_RENDER_ROWS", "1"))
+RENDER_INTERVAL = float(os.getenv("PQRS_STREAM_RENDER_INTERVAL", "0.25"))
+
+# Matches separator rows such as |------|:-----:|
+SEPARATOR_PATTERN = re.compile(r'^\|?[\s:\-|]+\|?$')
+
+BEFORE_TABLE = "before"
+HEADER = "header"
+ROWS = "rows"
+AFTER_TABLE = "after"
+
+
+def parse_row(line):
+    """Split a `| Campo | Valor |` line into (campo, valor).
+
+    The trailing pipe is optional and any pipe inside the value is kept,
+    since the Campo column never contains one.
+    """
+    body = line.strip()[1:]
+    if body.endswith('|'):
+        body = body[:-1]
+    campo, sep, valor = body.partition('|')
+    if not sep:
+        return None
+    return campo.strip(), valor.strip()
+
+
+class TableStreamParser:
+    """State machine that consumes streamed tokens and emits completed table rows."""
+
+    def __init__(self):
+        self.state = BEFORE_TABLE
+        self.rows = []
+        self.pre_table = []
+        self.post_table = []
+        self._line = ""
+
+    def feed(self, token):
+        """Consume a token and return the rows it completed."""
+        self._line += token
+        if '\n' not in token:
+            return []
+        *lines, self._line = self._line.split('\n')
+        completed = []
+        for line in lines:
+            row = self._consume_line(line)
+            if row is not None:
+                completed.append(row)
+        return completed
+
+    def close(self):
+        """Flush the last (unterminated) line and return the rows it completed."""
+        line, self._line = self._line, ""
+        row = self._consume_line(line) if line else None
+        return [row] if row is not None else []
+
+    def _consume_line(self, line):
+        stripped = line.strip()
+        if stripped.startswith('|') and self.state != AFTER_TABLE:
+            if self.state == BEFORE_TABLE:
+                # First pipe line is the `| Campo | Valor |` header
+                self.state = HEADER
+                return None
+            if SEPARATOR_PATTERN.match(stripped):
+                self.state = ROWS
+                return None
+            self.state = ROWS
+            row = parse_row(stripped)
+            if row is not None:
+                self.rows.append(row)
+            return row
+
+        if self.state == BEFORE_TABLE:
+            self.pre_table.append(line)
+        elif stripped or self.post_table:
+            self.state = AFTER_TABLE
+            self.post_table.append(line)
+        return None
+
+    @property
+    def has_table(self):
+        return self.state != BEFORE_TABLE
+
+    @property
+    def other_text(self):
+        """Non-table text before and after the table."""
+        pre_table = "\n".join(self.pre_table).strip()
+        post_table = "\n".join(self.post_table).strip()
+        return f"{pre_table}\n\n{post_table}".strip()
+
+    @property
+    def pending_text(self):
+        """Text of the line currently being streamed."""
+        return self._line
+
+
+class RenderThrottle:
+    """Decide when a streamed answer should be re-rendered."""
+
+    def __init__(self, every_rows=RENDER_EVERY_ROWS, interval=RENDER_INTERVAL, clock=time.monotonic):
+        self.every_rows = max(1, every_rows)
+        self.interval = interval
+        self.clock = clock
+        self._pending_rows = 0
+        self._last_render = None
+
+    def should_render(self, new_rows=0):
+        self._pending_rows += new_rows
+        now = self.clock()
+        if self._last_render is None or self._pending_rows >= self.every_rows:
+            return self._mark(now)
+        if now - self._last_render >= self.interval:
+            return self._mark(now)
+        return False
+
+    def _mark(self, now):
+        self._pending_rows = 0
+        self._last_render = now
+        return True